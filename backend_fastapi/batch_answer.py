@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dotenv import load_dotenv
+from rag_engine import get_rag_chain, abatch_answer, BATCH_CONCURRENCY
+
+load_dotenv()
+
+def read_questions(path):
+    """
+    A .json file holds a list of questions (strings or {"question": ...}
+    objects); anything else is one question per line, with blank lines and
+    # comments skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".json"):
+            items = json.load(f)
+            return [item["question"] if isinstance(item, dict) else item for item in items]
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+async def run(questions, concurrency, out):
+    rag_chain = get_rag_chain()
+    start = time.perf_counter()
+    answered = failed = cached = 0
+    async for result in abatch_answer(rag_chain, questions, concurrency):
+        if "error" in result:
+            failed += 1
+        else:
+            answered += 1
+            cached += result["cached"]
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{answered} answered ({cached} from cache), {failed} failed in {elapsed:.1f}s "
+          f"({len(questions) / elapsed:.2f} questions/sec)", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer a file of questions in one batch (same path as POST /chat/batch). "
+                    "Writes one NDJSON line per question, in completion order."
+    )
+    parser.add_argument("questions_file", help=".txt (one per line) or .json (list)")
+    parser.add_argument("-o", "--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="LLM calls in flight at once")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions_file)
+    if not questions:
+        sys.exit("No questions found.")
+    print(f"Answering {len(questions)} questions (concurrency {args.concurrency})...", file=sys.stderr)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        asyncio.run(run(questions, args.concurrency, out))
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
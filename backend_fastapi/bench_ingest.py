@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+from dotenv import load_dotenv
+from bench_retrieval import HashingEmbeddings, iter_synthetic_products, rss_mb, peak_rss_mb, git_commit
+
+load_dotenv()
+
+MODES = ["stream", "list"]
+
+def write_catalog(workdir, n, seed):
+    """
+    Writes the same n synthetic products as sample_data.jsonl (what
+    sync_products exports now) and as one JSON array (the old export).
+    """
+    jsonl_path = os.path.join(workdir, "sample_data.jsonl")
+    array_path = os.path.join(workdir, "sample_data.json")
+    rng = np.random.default_rng([seed, n])
+    with open(jsonl_path, "w") as jsonl, open(array_path, "w") as array:
+        array.write("[")
+        for i, product in enumerate(iter_synthetic_products(n, rng)):
+            line = json.dumps(product)
+            jsonl.write(line + "\n")
+            array.write(("," if i else "") + line)
+        array.write("]")
+    return jsonl_path, array_path
+
+def run_case(workdir, backend, mode, batch_size, embeddings_kind):
+    # Runs in a fresh (spawned) process so peak RSS belongs to this case alone
+    from rag_engine import CatalogDocuments, get_embeddings, product_document
+    from rag_common.index_sync import sync_documents
+    from rag_common.vector_store import open_vectorstore
+
+    embeddings = get_embeddings() if embeddings_kind == "model" else HashingEmbeddings()
+    index_dir = os.path.join(workdir, f"index_{backend}_{mode}")
+    shutil.rmtree(index_dir, ignore_errors=True)
+    vectorstore = open_vectorstore(backend, index_dir, embeddings)
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    if mode == "stream":
+        # What ingest does now: read line by line, embed and upsert per batch
+        documents = CatalogDocuments(os.path.join(workdir, "sample_data.jsonl"))
+        counts = sync_documents(vectorstore, documents, batch_size=batch_size)
+    else:
+        # The old path: load the whole array, build every Document, one write
+        with open(os.path.join(workdir, "sample_data.json"), "r") as f:
+            documents = [product_document(p) for p in json.load(f)]
+        counts = sync_documents(vectorstore, documents, batch_size=len(documents))
+    seconds = time.perf_counter() - start
+
+    docs = counts["added"] + counts["updated"] + counts["unchanged"]
+    peak = peak_rss_mb()
+    return {
+        "docs": docs,
+        "seconds": round(seconds, 2),
+        "docs_per_sec": round(docs / seconds, 1),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak,
+        "peak_over_baseline_mb": round(peak - rss_before, 1) if peak is not None and rss_before is not None else None,
+    }
+
+def print_table(report):
+    print(f"{'backend':>8} {'docs':>7} {'mode':>7} {'batch':>6} {'seconds':>8} {'docs/s':>8} "
+          f"{'base MB':>8} {'peak MB':>8} {'+peak MB':>9}")
+    for case in report["results"]:
+        if "error" in case:
+            print(f"{case['backend']:>8} {case['size']:>7} {case['mode']:>7} skipped ({case['error']})")
+            continue
+        print(f"{case['backend']:>8} {case['size']:>7} {case['mode']:>7} {case['batch_size']:>6} "
+              f"{case['seconds']:>8.1f} {case['docs_per_sec']:>8.1f} {case['rss_before_mb'] or 0:>8.1f} "
+              f"{case['peak_rss_mb'] or 0:>8.1f} {case['peak_over_baseline_mb'] or 0:>9.1f}")
+
+def main(sizes, backends, modes, batch_size, embeddings_kind, seed, output):
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "embeddings": embeddings_kind,
+            "seed": seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": [],
+    }
+
+    for n in sizes:
+        workdir = tempfile.mkdtemp(prefix=f"bench_ingest_{n}_")
+        try:
+            print(f"Writing a {n}-product catalog...")
+            write_catalog(workdir, n, seed)
+            for backend in backends:
+                for mode in modes:
+                    print(f"Ingesting {n} products into {backend} ({mode})...")
+                    case = {"backend": backend, "size": n, "mode": mode,
+                            "batch_size": batch_size if mode == "stream" else n}
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                        try:
+                            case.update(pool.submit(run_case, workdir, backend, mode, batch_size, embeddings_kind).result())
+                        except Exception as e:
+                            # e.g. a missing backend, or Chroma rejecting one oversized batch (list mode)
+                            case["error"] = str(e)[:120]
+                    report["results"].append(case)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_table(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest throughput and peak memory on a synthetic catalog: the streaming "
+                    "batched ingest against loading the whole catalog and embedding it in one call."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--batch-size", type=int, default=int(os.environ.get("INGEST_BATCH_SIZE", 256)))
+    parser.add_argument("--embeddings", choices=["model", "hash"], default="model",
+                        help="the real embedding model, or feature hashing for quick runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="bench_ingest.json", help="JSON report")
+    args = parser.parse_args()
+    main(args.sizes, args.backends, args.modes, args.batch_size, args.embeddings, args.seed, args.output)
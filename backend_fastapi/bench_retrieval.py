@@ -0,0 +1,409 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+from dotenv import load_dotenv
+from rag_engine import GENDERS, CATEGORIES, get_embeddings, product_document
+from rag_common.answer_cache import normalize_question
+from rag_common.query_filters import parse_filters, build_where
+from rag_common.product_snapshot import ProductSnapshot, format_live_fields
+from rag_common.hybrid_search import BM25Index, HybridSearch, tokenize
+from rag_common.vector_store import open_vectorstore
+from rag_common.retrieval_cache import IndexVersion, RetrievalCache
+from rag_common.context_builder import ContextBuilder
+from rag_common.llm_provider import FakeChatModel
+
+load_dotenv()
+
+# Attribute values for the synthetic catalog (Product.material/size/color are free text)
+MATERIALS = ["Cotton", "Merino Wool", "Cashmere", "Linen", "Acrylic", "Polyester", "Bamboo", "Alpaca"]
+COLORS = ["Black", "White", "Navy", "Grey", "Beige", "Red", "Green", "Brown", "Pink", "Blue"]
+SIZES = ["S", "M", "L", "XL", "S, M, L", "M, L, XL", "All Size"]
+STYLES = ["Classic", "Essential", "Relaxed", "Slim", "Cable Knit", "Ribbed", "Oversized", "Cropped", "Heritage", "Everyday"]
+FEATURES = [
+    "Breathable and easy to layer",
+    "Soft hand feel that keeps its shape",
+    "Warm enough for cold evenings",
+    "Machine washable",
+    "Finished with ribbed cuffs and hem",
+    "Lightweight for travel",
+]
+DIM = 384  # all-MiniLM-L6-v2
+BATCH = 5000  # under Chroma's max batch size
+RETRIEVERS = ["vector", "bm25", "hybrid", "hybrid_cached", "pipeline"]
+
+class HashingEmbeddings:
+    """
+    Feature-hashed bag of words. No model to load, so large catalogs run in
+    seconds, but vector recall then only reflects word overlap.
+    """
+    def __init__(self, dim=DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+class PrecomputedEmbeddings:
+    """
+    Hands the store vectors embedded up front, so indexing time excludes the model.
+    """
+    def __init__(self, texts, vectors):
+        self.rows = {text: i for i, text in enumerate(texts)}
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[self.rows[t]].tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def iter_synthetic_products(n, rng):
+    """
+    n products shaped like sample_data.jsonl (the Product model's fields),
+    generated one at a time.
+    """
+    for i in range(n):
+        gender = GENDERS[rng.integers(len(GENDERS))]
+        category = CATEGORIES[rng.integers(len(CATEGORIES))]
+        material = MATERIALS[rng.integers(len(MATERIALS))]
+        color = COLORS[rng.integers(len(COLORS))]
+        style = STYLES[rng.integers(len(STYLES))]
+        yield {
+            "id": i + 1,
+            "name": f"{style} {material} {category} {i + 1:06d}",
+            "description": f"{style} {category.lower()} in {material.lower()}. {FEATURES[rng.integers(len(FEATURES))]}",
+            "price": float(rng.integers(10, 150)) + 0.99,
+            "stock": int(rng.integers(0, 40)),
+            "attributes": {
+                "gender": gender, "category": category, "material": material,
+                "size": SIZES[rng.integers(len(SIZES))], "color": color,
+            },
+        }
+
+def synthetic_products(n, rng):
+    return list(iter_synthetic_products(n, rng))
+
+def _genders_for(gender):
+    # Same rule as parse_filters: Unisex items fit either gender
+    return {gender} if gender == "Unisex" else {gender, "Unisex"}
+
+def labeled_queries(products, count, rng):
+    """
+    `count` queries with the ids of every product that answers them:
+    - name: a product's exact name (one relevant product)
+    - attribute: "women's navy cashmere cardigan"
+    - price: "polo in grey under $40" (exercises the price pre-filter)
+    - question: "what size and color is the <name>?", a chat-style question
+      whose extra words are also the documents' field labels
+    """
+    queries = []
+    for q in range(count):
+        p = products[rng.integers(len(products))]
+        a = p["attributes"]
+        kind = ("name", "attribute", "price", "question")[q % 4]
+        if kind == "name":
+            question, relevant = p["name"], [p["id"]]
+        elif kind == "question":
+            question, relevant = f"what size and color is the {p['name']}?", [p["id"]]
+        elif kind == "attribute":
+            question = f"{a['gender'].lower()}'s {a['color'].lower()} {a['material'].lower()} {a['category'].lower()}"
+            genders = _genders_for(a["gender"])
+            relevant = [
+                o["id"] for o in products
+                if o["attributes"]["category"] == a["category"] and o["attributes"]["color"] == a["color"]
+                and o["attributes"]["material"] == a["material"] and o["attributes"]["gender"] in genders
+            ]
+        else:
+            limit = int(p["price"]) + 1
+            question = f"{a['category'].lower()} in {a['color'].lower()} under ${limit}"
+            relevant = [
+                o["id"] for o in products
+                if o["attributes"]["category"] == a["category"] and o["attributes"]["color"] == a["color"]
+                and o["price"] <= limit
+            ]
+        queries.append({"kind": kind, "question": question, "relevant_ids": relevant})
+    return queries
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2**20 if sys.platform == "darwin" else peak / 1024, 1)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def score(results, relevant_ids, k):
+    """
+    recall@k (out of min(k, relevant), so a query with 50 relevant products
+    can still score 1.0) and the reciprocal rank of the first relevant hit.
+    """
+    relevant = set(relevant_ids)
+    ranked = [doc.metadata.get("id") for doc in results[:k]]
+    found = len(relevant.intersection(ranked))
+    first = next((rank for rank, doc_id in enumerate(ranked, 1) if doc_id in relevant), None)
+    return found / min(k, len(relevant)), 1.0 / first if first else 0.0
+
+def summarize(latencies, scores, kinds):
+    summary = {
+        "recall": round(float(np.mean([s[0] for s in scores])), 4),
+        "mrr": round(float(np.mean([s[1] for s in scores])), 4),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "by_kind": {},
+    }
+    for kind in sorted(set(kinds)):
+        picked = [s for s, k in zip(scores, kinds) if k == kind]
+        summary["by_kind"][kind] = {
+            "recall": round(float(np.mean([s[0] for s in picked])), 4),
+            "mrr": round(float(np.mean([s[1] for s in picked])), 4),
+        }
+    return summary
+
+def run_case(workdir, backend, k):
+    """
+    One (catalog size, backend) measurement. Runs in its own process so
+    resident memory is not shared with other cases.
+    """
+    with open(os.path.join(workdir, "products.json")) as f:
+        products = json.load(f)
+    with open(os.path.join(workdir, "queries.json")) as f:
+        queries = json.load(f)
+    doc_vectors = np.load(os.path.join(workdir, "doc_vectors.npy"))
+    query_vectors = np.load(os.path.join(workdir, "query_vectors.npy"))
+    documents = [product_document(p) for p in products]
+    rss_before = rss_mb()
+
+    # 1. Index (embeddings were computed once per catalog, in the parent)
+    store = open_vectorstore(
+        backend, os.path.join(workdir, backend),
+        PrecomputedEmbeddings([d.page_content for d in documents], doc_vectors),
+    )
+    start = time.perf_counter()
+    for i in range(0, len(documents), BATCH):
+        batch = documents[i:i + BATCH]
+        store.add_documents(documents=batch, ids=[str(d.metadata["id"]) for d in batch])
+    index_seconds = time.perf_counter() - start
+
+    bm25_index = BM25Index()
+    start = time.perf_counter()
+    bm25_index.replace_all(documents)
+    bm25_seconds = time.perf_counter() - start
+    rss_after = rss_mb()
+
+    # 2. Query side, wired like rag_engine: filters -> where, hybrid search,
+    # retrieval cache, context budget. The LLM is FakeChatModel.
+    snapshot = ProductSnapshot(lambda: {p["id"]: {"price": p["price"], "stock": p["stock"]} for p in products})
+    hybrid = HybridSearch(bm25_index)
+    cache = RetrievalCache(IndexVersion(), max_size=len(queries) * 2, normalize=normalize_question)
+    context_builder = ContextBuilder(
+        live_fields=lambda doc: format_live_fields(snapshot.get(doc.metadata.get("id")) or {"price": 0, "stock": 0})
+    )
+    llm = FakeChatModel()
+
+    def prepare(item, vector):
+        where, has_candidates = build_where(parse_filters(item["question"], GENDERS, CATEGORIES), snapshot)
+
+        def vector_search(n, where):
+            return store.similarity_search_by_vector(vector, k=n, filter=where)
+
+        return where, has_candidates, vector_search
+
+    def cached_search(item, where, vector_search):
+        docs = cache.get(item["question"], where, k)
+        if docs is None:
+            docs = hybrid.search(vector_search, item["question"], k, where)
+            cache.put(item["question"], where, k, docs)
+        return docs
+
+    def answer(item, where, vector_search):
+        docs = hybrid.search(vector_search, item["question"], k, where)
+        context = context_builder.build(docs)
+        llm.invoke(f"Context:\n{context}\n\nQuestion: {item['question']}")
+        return docs
+
+    retrievers = {
+        "vector": lambda item, where, vector_search: vector_search(k, where),
+        "bm25": lambda item, where, vector_search: bm25_index.search(item["question"], k, where),
+        "hybrid": lambda item, where, vector_search: hybrid.search(vector_search, item["question"], k, where),
+        "hybrid_cached": cached_search,
+        "pipeline": answer,
+    }
+
+    prepared = [prepare(item, vector) for item, vector in zip(queries, query_vectors.tolist())]
+    for item, (where, has_candidates, vector_search) in zip(queries, prepared):
+        if has_candidates:
+            cached_search(item, where, vector_search)  # warm the cache
+
+    kinds = [item["kind"] for item in queries]
+    results = {}
+    for name, retrieve in retrievers.items():
+        latencies, scores = [], []
+        for item, (where, has_candidates, vector_search) in zip(queries, prepared):
+            start = time.perf_counter()
+            docs = retrieve(item, where, vector_search) if has_candidates else []
+            latencies.append((time.perf_counter() - start) * 1000)
+            scores.append(score(docs, item["relevant_ids"], k))
+        results[name] = summarize(latencies, scores, kinds)
+
+    return {
+        "index_seconds": round(index_seconds, 3),
+        "index_docs_per_sec": round(len(documents) / index_seconds, 1),
+        "bm25_seconds": round(bm25_seconds, 3),
+        "rss_mb": rss_after,
+        "index_rss_mb": round(rss_after - rss_before, 1) if rss_after is not None and rss_before is not None else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "retrievers": results,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_table(report):
+    k = report["meta"]["k"]
+    print(f"{'backend':>8} {'docs':>7} {'retriever':>14} {'recall@' + str(k):>9} {'mrr':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ingest/s':>9} {'rss MB':>7}")
+    for case in report["results"]:
+        if "error" in case:
+            print(f"{case['backend']:>8} {case['size']:>7} skipped ({case['error']})")
+            continue
+        for name, r in case["retrievers"].items():
+            print(f"{case['backend']:>8} {case['size']:>7} {name:>14} {r['recall']:>9.3f} {r['mrr']:>6.3f} "
+                  f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+                  f"{case['ingest_docs_per_sec']:>9.1f} {case['rss_mb'] or 0:>7.1f}")
+
+def print_comparison(report, baseline):
+    """
+    Differences against an earlier JSON report, per backend/size/retriever.
+    """
+    old = {
+        (case["backend"], case["size"], name): r
+        for case in baseline["results"] if "retrievers" in case
+        for name, r in case["retrievers"].items()
+    }
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('created')}):")
+    print(f"{'backend':>8} {'docs':>7} {'retriever':>14} {'d recall':>9} {'d mrr':>7} {'d p95 ms':>9}")
+    for case in report["results"]:
+        for name, r in case.get("retrievers", {}).items():
+            before = old.get((case["backend"], case["size"], name))
+            if before is None:
+                continue
+            print(f"{case['backend']:>8} {case['size']:>7} {name:>14} {r['recall'] - before['recall']:>+9.3f} "
+                  f"{r['mrr'] - before['mrr']:>+7.3f} {r['p95_ms'] - before['p95_ms']:>+9.3f}")
+
+def main(sizes, backends, queries, k, embeddings_kind, seed, output, compare):
+    embeddings = get_embeddings() if embeddings_kind == "model" else HashingEmbeddings()
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "embeddings": embeddings_kind,
+            "k": k,
+            "queries": queries,
+            "seed": seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": [],
+    }
+
+    for n in sizes:
+        rng = np.random.default_rng([seed, n])
+        products = synthetic_products(n, rng)
+        labeled = labeled_queries(products, queries, rng)
+        texts = [product_document(p).page_content for p in products]
+
+        print(f"Embedding {n} products ({embeddings_kind})...")
+        start = time.perf_counter()
+        doc_vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        embed_seconds = time.perf_counter() - start
+        query_vectors = np.asarray(embeddings.embed_documents([q["question"] for q in labeled]), dtype=np.float32)
+
+        workdir = tempfile.mkdtemp(prefix=f"bench_retrieval_{n}_")
+        try:
+            with open(os.path.join(workdir, "products.json"), "w") as f:
+                json.dump(products, f)
+            with open(os.path.join(workdir, "queries.json"), "w") as f:
+                json.dump(labeled, f)
+            np.save(os.path.join(workdir, "doc_vectors.npy"), doc_vectors)
+            np.save(os.path.join(workdir, "query_vectors.npy"), query_vectors)
+
+            for backend in backends:
+                print(f"Benchmarking {backend} with {n} products...")
+                case = {"backend": backend, "size": n, "embed_seconds": round(embed_seconds, 3),
+                        "embed_docs_per_sec": round(n / embed_seconds, 1)}
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    try:
+                        case.update(pool.submit(run_case, workdir, backend, k).result())
+                    except ImportError as e:
+                        case["error"] = str(e)
+                if "index_seconds" in case:
+                    # End to end: embedding plus indexing
+                    case["ingest_docs_per_sec"] = round(n / (embed_seconds + case["index_seconds"]), 1)
+                report["results"].append(case)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_table(report)
+    if compare:
+        with open(compare, "r") as f:
+            print_comparison(report, json.load(f))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Retrieval quality (recall@k, MRR), latency, ingest throughput and memory "
+                    "per retriever and vector store, on synthetic catalogs. The LLM is stubbed."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    parser.add_argument("--queries", type=int, default=300, help="labeled queries per catalog")
+    parser.add_argument("-k", type=int, default=6)
+    parser.add_argument("--embeddings", choices=["model", "hash"], default="model",
+                        help="the real embedding model, or feature hashing for quick runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="bench_retrieval.json", help="JSON report")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    args = parser.parse_args()
+    main(args.sizes, args.backends, args.queries, args.k, args.embeddings, args.seed, args.output, args.compare)
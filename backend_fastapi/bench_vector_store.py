@@ -0,0 +1,96 @@
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Modules shared with the Django app live in ../rag_common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag_common.vector_store import open_vectorstore
+
+GENDERS = ["Men", "Women", "Unisex"]
+CATEGORIES = ["Sweater", "Cardigan", "Inner", "Polo"]
+DIM = 384  # all-MiniLM-L6-v2 / bge-small
+BATCH = 5000  # under Chroma's max batch size
+
+class PrecomputedEmbeddings:
+    """
+    Hands back synthetic vectors so the benchmark measures the store, not the model.
+    """
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(t.split()[1])].tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def synthetic_catalog(n, rng):
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    documents = [
+        Document(
+            page_content=f"product {i}",
+            metadata={"id": i, "name": f"product {i}", "gender": GENDERS[i % 3], "category": CATEGORIES[i % 4]},
+        )
+        for i in range(n)
+    ]
+    return vectors, documents
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def bench(backend, n, queries, rng):
+    vectors, documents = synthetic_catalog(n, rng)
+    directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        store = open_vectorstore(backend, directory, PrecomputedEmbeddings(vectors))
+
+        start = time.perf_counter()
+        for i in range(0, n, BATCH):
+            batch = documents[i:i + BATCH]
+            store.add_documents(documents=batch, ids=[str(d.metadata["id"]) for d in batch])
+        ingest_seconds = time.perf_counter() - start
+
+        where = {"$and": [{"gender": {"$in": ["Women", "Unisex"]}}, {"category": "Cardigan"}]}
+        results = {}
+        for label, filter in (("unfiltered", None), ("filtered", where)):
+            latencies = []
+            for _ in range(queries):
+                query = rng.standard_normal(DIM).astype(np.float32).tolist()
+                start = time.perf_counter()
+                store.similarity_search_by_vector(query, k=6, filter=filter)
+                latencies.append((time.perf_counter() - start) * 1000)
+            results[label] = latencies
+        return ingest_seconds, results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main(sizes, queries, backends):
+    rng = np.random.default_rng(0)
+    print(f"{'backend':>8} {'docs':>7} {'ingest s':>9} {'query':>11} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7}")
+    for n in sizes:
+        for backend in backends:
+            try:
+                ingest_seconds, results = bench(backend, n, queries, rng)
+            except ImportError as e:
+                print(f"{backend:>8} {n:>7} skipped ({e})")
+                continue
+            for label, latencies in results.items():
+                print(f"{backend:>8} {n:>7} {ingest_seconds:>9.2f} {label:>11} "
+                      f"{statistics.mean(latencies):>8.3f} {percentile(latencies, 50):>7.3f} "
+                      f"{percentile(latencies, 95):>7.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query latency of the Chroma and NumPy vector stores.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    args = parser.parse_args()
+    main(args.sizes, args.queries, args.backends)
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from bench_retrieval import git_commit
+
+load_dotenv()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# How to start each app under gunicorn, and the line each worker logs once its chain is built
+TARGETS = {
+    "backend": {
+        "cwd": HERE,
+        "app": "main:app",
+        "preload_env": "PRELOAD_MODEL",
+        "warmup_env": "WARMUP_ON_STARTUP",
+        "ready": "RAG Chain initialized successfully",
+    },
+    "django": {
+        "cwd": os.path.join(os.path.dirname(HERE), "frontend_django"),
+        "app": "chatbot_project.wsgi:application",
+        "preload_env": "AI_PRELOAD_MODEL",
+        "warmup_env": "AI_WARMUP_ON_STARTUP",
+        "ready": "RAG chain built in",
+    },
+}
+MODES = ["separate", "preload"]
+
+def memory_mb(pid):
+    """
+    RSS, PSS and USS of one process. RSS counts shared pages in full in
+    every process that maps them, so it barely moves when workers share the
+    model; PSS splits shared pages between the processes and USS is what
+    the process alone holds (what killing it would free).
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_mb": round(fields["Rss"] / 1024, 1),
+        "pss_mb": round(fields["Pss"] / 1024, 1),
+        "uss_mb": round((fields["Private_Clean"] + fields["Private_Dirty"]) / 1024, 1),
+    }
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+def run_case(target, workers, mode, timeout):
+    spec = TARGETS[target]
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    env[spec["preload_env"]] = "True" if mode == "preload" else "False"
+    env[spec["warmup_env"]] = "True"
+    sock = os.path.join(tempfile.gettempdir(), f"bench_workers_{os.getpid()}.sock")
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+           "--bind", f"unix:{sock}", spec["app"]]
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=spec["cwd"], env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+    ready = []
+    log = []
+
+    def read_output():
+        for line in proc.stdout:
+            log.append(line)
+            # Workers share the pipe, so two workers' lines can end up on one
+            ready.extend([time.perf_counter()] * line.count(spec["ready"]))
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    try:
+        while len(ready) < workers:
+            if proc.poll() is not None or time.perf_counter() - start > timeout:
+                raise RuntimeError(f"{len(ready)}/{workers} workers ready; last output: {''.join(log[-3:]).strip()[:200]}")
+            time.sleep(0.2)
+        # Let the last worker finish whatever follows its log line
+        time.sleep(1.0)
+        master = memory_mb(proc.pid)
+        per_worker = [memory_mb(pid) for pid in children(proc.pid)]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def mean(key):
+        return round(sum(w[key] for w in per_worker) / len(per_worker), 1)
+
+    return {
+        "ready_seconds": round(ready[-1] - start, 1),
+        "master": master,
+        "worker_rss_mb": mean("rss_mb"),
+        "worker_pss_mb": mean("pss_mb"),
+        "worker_uss_mb": mean("uss_mb"),
+        "total_pss_mb": round(master["pss_mb"] + sum(w["pss_mb"] for w in per_worker), 1),
+    }
+
+def print_table(report):
+    print(f"{'target':>8} {'workers':>7} {'mode':>9} {'ready s':>8} {'RSS/wkr':>8} {'PSS/wkr':>8} "
+          f"{'USS/wkr':>8} {'total PSS':>10}")
+    for case in report["results"]:
+        if "error" in case:
+            print(f"{case['target']:>8} {case['workers']:>7} {case['mode']:>9} failed ({case['error']})")
+            continue
+        print(f"{case['target']:>8} {case['workers']:>7} {case['mode']:>9} {case['ready_seconds']:>8.1f} "
+              f"{case['worker_rss_mb']:>8.1f} {case['worker_pss_mb']:>8.1f} {case['worker_uss_mb']:>8.1f} "
+              f"{case['total_pss_mb']:>10.1f}")
+
+def main(targets, worker_counts, modes, timeout, output):
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": [],
+    }
+
+    for target in targets:
+        for workers in worker_counts:
+            for mode in modes:
+                print(f"Starting {target} with {workers} workers ({mode})...")
+                case = {"target": target, "workers": workers, "mode": mode}
+                try:
+                    case.update(run_case(target, workers, mode, timeout))
+                except Exception as e:
+                    case["error"] = str(e)[:200]
+                report["results"].append(case)
+
+    print()
+    print_table(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-worker memory under gunicorn once every worker has built its chain: "
+                    "each worker loading its own embedding model against the model preloaded "
+                    "in the master and shared copy-on-write. Linux only (reads /proc)."
+    )
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=["backend"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for all workers")
+    parser.add_argument("-o", "--output", default="bench_workers.json", help="JSON report")
+    args = parser.parse_args()
+    main(args.targets, args.workers, args.modes, args.timeout, args.output)
@@ -0,0 +1,66 @@
+import argparse
+import json
+from dotenv import load_dotenv
+from rag_engine import get_embeddings, get_vectorstore
+from rag_common.index_sync import indexed_documents
+from rag_common.hybrid_search import BM25Index, HybridSearch
+
+load_dotenv()
+
+def default_eval_set(documents):
+    """
+    Without an eval file, each product's name is a query whose only
+    relevant result is that product (the exact lexical hits BM25 is for).
+    """
+    return [
+        {"question": doc.metadata["name"], "relevant_ids": [doc.metadata["id"]]}
+        for doc in documents if doc.metadata.get("name")
+    ]
+
+def recall_at_k(results, relevant_ids):
+    found = {doc.metadata.get("id") for doc in results}
+    return len(found & set(relevant_ids)) / len(relevant_ids)
+
+def evaluate(eval_set, k):
+    embeddings = get_embeddings()
+    vectorstore = get_vectorstore(embeddings)
+    documents = indexed_documents(vectorstore)
+    bm25_index = BM25Index()
+    bm25_index.replace_all(documents)
+    hybrid = HybridSearch(bm25_index)
+
+    if eval_set is None:
+        eval_set = default_eval_set(documents)
+    print(f"Evaluating {len(eval_set)} queries against {len(documents)} documents (k={k})")
+
+    recall = {"vector": 0.0, "bm25": 0.0, "hybrid": 0.0}
+    for item in eval_set:
+        embedding = embeddings.embed_query(item["question"])
+
+        def vector_search(n, where):
+            return vectorstore.similarity_search_by_vector(embedding, k=n, filter=where)
+
+        vector_docs = hybrid._timed("vector", vector_search, k, None)
+        bm25_docs = hybrid._timed("bm25", bm25_index.search, item["question"], k, None)
+        hybrid_docs = hybrid.search(vector_search, item["question"], k)
+
+        recall["vector"] += recall_at_k(vector_docs, item["relevant_ids"])
+        recall["bm25"] += recall_at_k(bm25_docs, item["relevant_ids"])
+        recall["hybrid"] += recall_at_k(hybrid_docs, item["relevant_ids"])
+
+    stats = hybrid.stats()
+    print(f"{'retriever':>10} {'recall@' + str(k):>10} {'mean ms':>9}")
+    for leg in ("vector", "bm25", "hybrid"):
+        print(f"{leg:>10} {recall[leg] / max(len(eval_set), 1):>10.3f} {stats[f'{leg}_mean_ms']:>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare vector, BM25 and hybrid retrieval recall@k.")
+    parser.add_argument("--eval-file", help='JSON list of {"question": ..., "relevant_ids": [...]}')
+    parser.add_argument("-k", type=int, default=6)
+    args = parser.parse_args()
+
+    eval_set = None
+    if args.eval_file:
+        with open(args.eval_file, 'r') as f:
+            eval_set = json.load(f)
+    evaluate(eval_set, args.k)
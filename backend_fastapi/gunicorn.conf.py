@@ -0,0 +1,12 @@
+import os
+
+# gunicorn -c gunicorn.conf.py main:app
+# Like `uvicorn main:app --workers N`, but uvicorn starts each worker as a
+# fresh process, so nothing loaded beforehand is shared. gunicorn forks them.
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# PRELOAD_MODEL=True: import main (which loads the embedding model) once in
+# the master, then fork the workers from it so they share the weights
+preload_app = os.environ.get("PRELOAD_MODEL", "False") == "True"
@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only hold within one process
+    fcntl = None
+
+POINTER_FILE = "CURRENT"
+MANIFEST_FILE = "versions.json"
+
+
+class IndexBusy(Exception):
+    """Another process or thread is already building an index version."""
+
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            raise IndexBusy("an index build is already running")
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _Build:
+    __slots__ = ("name", "path", "publish", "docs")
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.publish = True  # set False to throw the build away (e.g. nothing changed)
+        self.docs = None  # document count, recorded in the manifest
+
+
+class IndexSnapshots:
+    """
+    Blue/green versions of the vector index under `root`:
+
+        root/CURRENT         name of the live version (replaced atomically)
+        root/versions.json   created/retired time and doc count per version
+        root/v<timestamp>/   one complete Chroma or NumPy index each
+
+    build() copies the live version into a fresh directory for the caller
+    to write to; on success it becomes live by rewriting CURRENT, so
+    readers switch from one complete index to the next and never see a
+    half-written one. Only one build runs at a time across processes.
+
+    Retired versions are kept for restore(): the `keep` most recent always,
+    older ones until `drain_seconds` after they stopped being live, so
+    requests (and workers) still reading them can finish.
+
+    `legacy_dir` is a pre-snapshot index (the old flat chroma_db); it is
+    served until the first build and used as that build's starting point.
+    """
+
+    def __init__(self, root, legacy_dir=None, keep=3, drain_seconds=300):
+        self.root = root
+        self.legacy_dir = legacy_dir
+        self.keep = keep
+        self.drain_seconds = drain_seconds
+        self._build_lock = threading.Lock()
+        self._pointer_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    # --- reading ---
+
+    def current_name(self):
+        try:
+            with open(self._path(POINTER_FILE), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current(self):
+        """
+        Directory of the live index, or None if there is none yet.
+        """
+        name = self.current_name()
+        if name is not None:
+            return self._path(name)
+        if self.legacy_dir and os.path.exists(self.legacy_dir):
+            return self.legacy_dir
+        return None
+
+    def _manifest(self):
+        try:
+            with open(self._path(MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def versions(self):
+        current = self.current_name()
+        return [
+            {"name": name, **info, "current": name == current}
+            for name, info in sorted(self._manifest().items(), reverse=True)
+            if os.path.isdir(self._path(name))
+        ]
+
+    # --- writing ---
+
+    def _write(self, filename, text):
+        tmp = f"{self._path(filename)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self._path(filename))
+
+    @contextmanager
+    def _pointer(self):
+        # Short lock around CURRENT + versions.json updates
+        with self._pointer_lock, _file_lock(self._path(".pointer.lock")):
+            yield
+
+    def _activate(self, name, docs=None):
+        # Caller holds the pointer lock
+        now = time.time()
+        manifest = self._manifest()
+        previous = self.current_name()
+        if previous in manifest:
+            manifest[previous]["retired"] = now
+        entry = manifest.setdefault(name, {"created": now})
+        entry["retired"] = None
+        if docs is not None:
+            entry["docs"] = docs
+        self._write(MANIFEST_FILE, json.dumps(manifest, indent=2))
+        self._write(POINTER_FILE, name)
+
+    @contextmanager
+    def build(self):
+        """
+        Yields a build with `.path` seeded from the live version. The build
+        goes live when the block exits cleanly, unless `.publish` was set to
+        False; on error or discard the directory is removed. Raises
+        IndexBusy if another build holds the lock.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            raise IndexBusy("an index build is already running")
+        try:
+            with _file_lock(self._path(".build.lock"), blocking=False):
+                name = f"v{time.time_ns()}"
+                build = _Build(name, self._path(name))
+                source = self.current()
+                if source is not None:
+                    shutil.copytree(source, build.path)
+                else:
+                    os.makedirs(build.path)
+                try:
+                    yield build
+                except BaseException:
+                    shutil.rmtree(build.path, ignore_errors=True)
+                    raise
+                if not build.publish:
+                    shutil.rmtree(build.path, ignore_errors=True)
+                    return
+                with self._pointer():
+                    self._activate(name, build.docs)
+        finally:
+            self._build_lock.release()
+        self.gc()
+
+    def restore(self, name):
+        """
+        Makes an earlier version live again, straight away (no rebuild).
+        """
+        if name not in self._manifest() or not os.path.isdir(self._path(name)):
+            raise KeyError(f"Unknown index version: {name}")
+        with self._pointer():
+            if self.current_name() != name:
+                self._activate(name)
+
+    def gc(self):
+        """
+        Deletes retired versions beyond the `keep` newest once they have
+        been out of service for `drain_seconds`. Returns the deleted names.
+        """
+        deleted = []
+        with self._pointer():
+            manifest = self._manifest()
+            current = self.current_name()
+            retired = sorted((n for n in manifest if n != current), reverse=True)
+            now = time.time()
+            for name in retired[self.keep:]:
+                retired_at = manifest[name].get("retired")
+                if retired_at is not None and now - retired_at < self.drain_seconds:
+                    continue
+                shutil.rmtree(self._path(name), ignore_errors=True)
+                if not os.path.exists(self._path(name)):
+                    del manifest[name]
+                    deleted.append(name)
+            if deleted:
+                self._write(MANIFEST_FILE, json.dumps(manifest, indent=2))
+        return deleted
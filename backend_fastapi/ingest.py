@@ -1,67 +1,44 @@
-import json
-import os
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.documents import Document
+import argparse
 from dotenv import load_dotenv
+from rag_engine import DATA_FILE, INDEX_ROOT, VECTOR_BACKEND, load_documents, get_ingest_embeddings, sync_index, restore_index, index_snapshots
+from rag_common.index_sync import format_counts
+from rag_common.embedding_cache import format_cache_stats
 
 load_dotenv()
 
-DATA_FILE = os.path.join(os.path.dirname(__file__), "sample_data.json")
-PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "chroma_db")
-
 def ingest_data():
-    print(f"Loading data from {DATA_FILE}...")
-    
-    with open(DATA_FILE, 'r') as f:
-        products = json.load(f)
-
-    documents = []
-    for product in products:
-        content = f"Product Name: {product['name']}. \nDescription: {product['description']}. \n" \
-                  f"Material: {product['attributes']['material']}. \n" \
-                  f"Size: {product['attributes']['size']}. \n" \
-                  f"Color: {product['attributes']['color']}. \n" \
-                  f"Price: ${product['price']}."
-        
-        metadata = {
-            "id": product['id'],
-            "name": product['name'],
-            "price": product['price'],
-            "stock": product['stock']
-        }
-        
-        doc = Document(page_content=content, metadata=metadata)
-        documents.append(doc)
-
+    documents = load_documents(DATA_FILE)
     print(f"Prepared {len(documents)} documents.")
 
-    # Uses a small, fast, local model (CPU friendly)
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    
-    # Initialize Chroma Manager
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY, 
-        embedding_function=embeddings
-    )
+    # Uses a small, fast, local model (CPU friendly), behind the on-disk
+    # embedding cache so only never-seen text is run through the model
+    embeddings = get_ingest_embeddings()
+
+    # Upsert new/changed products and delete removed ones in a fresh copy of
+    # the live index (Chroma unless VECTOR_BACKEND=numpy), then switch
+    # running servers over to it in one step.
+    print(f"Syncing embeddings with the {VECTOR_BACKEND} index...")
+    counts = sync_index(documents, embeddings)
+    print(f"Index synced: {format_counts(counts)}.")
+    print(format_cache_stats(embeddings.stats()))
 
-    print("Clearing existing collection (avoiding file locks)...")
-    try:
-        # Instead of deleting the folder (locked on Windows), we delete the collection contents
-        vectorstore.delete_collection() 
-        # Re-initialize to create a fresh empty collection
-        vectorstore = Chroma(
-            persist_directory=PERSIST_DIRECTORY, 
-            embedding_function=embeddings
-        )
-    except Exception as e:
-        print(f"Warning during cleanup: {e}")
+    print(f"Success! Live index version: {index_snapshots.current_name() or 'legacy'} in {INDEX_ROOT}")
 
-    print("Creating embeddings and storing in ChromaDB...")
-    # Add documents to the fresh collection
-    vectorstore.add_documents(documents=documents)
-    
-    print(f"Success! Vector DB created at {PERSIST_DIRECTORY}")
+def list_versions():
+    for version in index_snapshots.versions():
+        marker = "*" if version["current"] else " "
+        print(f"{marker} {version['name']}  docs={version.get('docs', '?')}")
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Sync the vector index with sample_data.jsonl.")
+    parser.add_argument("--list", action="store_true", help="list index versions (* = live)")
+    parser.add_argument("--restore", metavar="VERSION", help="make an earlier index version live again")
+    args = parser.parse_args()
+
+    if args.list:
+        list_versions()
+    elif args.restore:
+        restore_index(args.restore)
+        print(f"Index version {args.restore} is live.")
+    else:
+        ingest_data()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "What sweaters do you have?",
+    "List all products",
+    "Do you have cardigans for women?",
+    "What material is the polo made of?",
+    "Which products come in size XL?",
+]
+
+def ask(url, question):
+    body = json.dumps({"question": question}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+def run(url, clients, requests_per_client, unique):
+    """
+    Fires clients * requests_per_client questions with `clients` in flight at once.
+    With unique=True every question gets a suffix so the answer cache never hits.
+    """
+    jobs = []
+    for i in range(clients * requests_per_client):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        if unique:
+            question = f"{question} (#{i})"
+        jobs.append(question)
+
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(ask, url, q) for q in jobs]
+        for f in futures:
+            try:
+                latencies.append(f.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return {
+        "clients": clients,
+        "requests": len(jobs),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_s": round(statistics.median(latencies), 3) if latencies else 0.0,
+        "p95_s": round(pct(0.95), 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for the /chat endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:9000/chat")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=5, help="Requests per client")
+    parser.add_argument("--unique", action="store_true", help="Defeat the answer cache")
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for clients in args.clients:
+        r = run(args.url, clients, args.requests, args.unique)
+        print(f"{r['clients']:>8} {r['requests']:>9} {r['errors']:>7} "
+              f"{r['throughput_rps']:>8} {r['p50_s']:>8} {r['p95_s']:>8}")
@@ -1,90 +1,383 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-from models import QueryRequest, QueryResponse
-from contextlib import asynccontextmanager
-from models import QueryRequest, QueryResponse
-from rag_engine import get_rag_chain, rebuild_index
+from models import QueryRequest, QueryResponse, BatchRequest
+from rag_engine import get_rag_chain, rebuild_index, aanswer_question, astream_answer, abatch_answer, answer_cache, query_batcher, product_snapshot, hybrid_search, retrieval_cache, context_builder, intent_router, llm_stats, conversation_memory, tracer, index_snapshots, restore_index, INDEX_ROOT, startup_profile, preload_model
+from rag_common.ingest_jobs import IngestJobs
+import asyncio
+import json
 import logging
+import os
+import time
+import uuid
 
 # Setup Logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variable for the chain
+# Global variable for the chain, and the index version it reads
 rag_chain = None
+chain_version = None
+
+# How often each worker checks whether another process switched the index version
+INDEX_POLL_SECONDS = float(os.environ.get("INDEX_POLL_SECONDS", 2))
+
+# Upper bound on questions per /chat/batch request
+MAX_BATCH_QUESTIONS = int(os.environ.get("MAX_BATCH_QUESTIONS", 1000))
+
+# Load the embedding model and chain at worker boot instead of on the first
+# chat request (or POST /refresh). Off by default so workers boot fast.
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "False") == "True"
+
+# Load the embedding model when this module is imported. Under
+# `gunicorn --preload` (see gunicorn.conf.py) that is once, in the master,
+# and every forked worker shares the weights. The chain itself is still
+# built per worker, on warm-up or the first request.
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "False") == "True"
+if PRELOAD_MODEL:
+    preload_model()
+
+# Concurrent first requests wait for one chain build instead of starting their own
+chain_lock = asyncio.Lock()
+
+def load_chain():
+    """
+    Builds the chain on the live index version and swaps it in. Requests
+    already running finish on the chain they started with.
+    """
+    global rag_chain, chain_version
+    version = index_snapshots.current_name()
+    with startup_profile.step("chain_build"):
+        chain = get_rag_chain()
+    rag_chain, chain_version = chain, version
+    product_snapshot.refresh()
+    intent_router.refresh()
+    answer_cache.clear()
+    return chain
+
+def run_ingest(job):
+    # Runs on the ingest worker thread: sync the index, then serve it
+    counts = rebuild_index(progress=job.progress)
+    logger.info(f"Index sync complete: {counts}")
+    job.phase = "reloading"
+    load_chain()
+    logger.info(f"RAG Chain reloaded after ingest (index version {chain_version}).")
+    return counts
+
+# One ingest at a time across workers; job state is shared on disk so any worker can answer a poll
+ingest_jobs = IngestJobs(
+    run_ingest,
+    state_dir=os.environ.get("INGEST_JOBS_DIR", os.path.join(INDEX_ROOT, "jobs")),
+)
+
+async def watch_index():
+    # Another worker or ingest.py may flip the index; rebuild the chain off the
+    # request path and swap it in, then clean up versions that have drained
+    while True:
+        await asyncio.sleep(INDEX_POLL_SECONDS)
+        try:
+            # Nothing to switch until the first request has loaded a chain
+            if rag_chain is not None and index_snapshots.current_name() != chain_version:
+                await asyncio.to_thread(load_chain)
+                logger.info(f"Switched to index version {chain_version}.")
+                await asyncio.to_thread(index_snapshots.gc)
+        except Exception as e:
+            logger.error(f"Failed to switch index version: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Load the RAG chain
-    global rag_chain
-    try:
-        rag_chain = get_rag_chain()
-        logger.info("RAG Chain initialized successfully.")
-    except Exception as e:
-        logger.error(f"Failed to initialize RAG Chain: {e}")
-        logger.warning("Did you run 'python ingest.py' first?")
+    # Startup: Load the RAG chain now only if asked to; otherwise the first
+    # chat request loads it
+    if WARMUP_ON_STARTUP:
+        try:
+            load_chain()
+            logger.info(f"RAG Chain initialized successfully (index version {chain_version or 'legacy'}).")
+            logger.info(startup_profile.report())
+        except Exception as e:
+            logger.error(f"Failed to initialize RAG Chain: {e}")
+            logger.warning("Did you run 'python ingest.py' first?")
+    else:
+        logger.info(f"RAG Chain will load on the first request. {startup_profile.report()}")
+    watcher = asyncio.create_task(watch_index())
     yield
-    # Shutdown logic if needed
+    watcher.cancel()
 
 app = FastAPI(title="Product RAG API", lifespan=lifespan)
 
+@app.middleware("http")
+async def request_id_header(request: Request, call_next):
+    # Callers (e.g. the Django app) may pass their own X-Request-ID so one
+    # ID follows the request through both services' logs and traces
+    request.state.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request.state.request_id
+    return response
+
+def session_for(request):
+    # Only clients that keep a conversation get memory. Stateless calls would
+    # otherwise each open a session that fills the LRU and evicts real ones.
+    if request.session_id:
+        return request.session_id
+    return uuid.uuid4().hex if request.new_session else None
+
+async def ensure_chain():
+    if not rag_chain:
+        # Lazy load, off the event loop so other endpoints keep answering
+        async with chain_lock:
+            if not rag_chain:
+                try:
+                    await asyncio.to_thread(load_chain)
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"RAG Engine not ready. Run ingest.py first. Error: {e}")
+                logger.info(startup_profile.report())
+    return rag_chain
+
 @app.post("/chat", response_model=QueryResponse)
-async def chat(request: QueryRequest):
+async def chat(request: QueryRequest, http_request: Request):
     """
     Receives a question, queries the Vector DB, and generates an answer using LLM.
     """
-    global rag_chain
-    if not rag_chain:
-        # Try to initialize again (lazy load)
-        try:
-            rag_chain = get_rag_chain()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"RAG Engine not ready. Run ingest.py first. Error: {e}")
+    chain = await ensure_chain()
+    request_id = http_request.state.request_id
+    logger.info(f"[{request_id}] Received question: {request.question}")
+    session_id = session_for(request)
 
-    logger.info(f"Received question: {request.question}")
-    
     try:
-        # Invoke the chain
-        response_text = rag_chain.invoke(request.question)
-        return QueryResponse(answer=response_text)
+        # Invoke the chain (cached answers skip retrieval and the LLM)
+        with tracer.request(request_id, "/chat", request.question) as trace:
+            result = await aanswer_question(chain, request.question, session_id)
+        logger.info(f"[{request_id}] {trace.summary()}")
+        return QueryResponse(answer=result["answer"], sources=result["sources"], session_id=session_id)
     except Exception as e:
-        logger.error(f"Error processing request: {e}")
+        logger.error(f"[{request_id}] Error processing request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(request: QueryRequest, http_request: Request):
+    """
+    Same as /chat, but streams newline-delimited JSON events:
+    {"type": "token", "text": ...} as tokens arrive, then
+    {"type": "sources", "sources": [product ids], "session_id": ...} at the end
+    (session_id is null unless the request had one or set new_session).
+    """
+    chain = await ensure_chain()
+    request_id = http_request.state.request_id
+    logger.info(f"[{request_id}] Received question (stream): {request.question}")
+    session_id = session_for(request)
+
+    async def events():
+        start = time.perf_counter()
+        first_token = None
+        # Started here, not in the endpoint, so the trace covers the whole stream
+        trace = tracer.start(request_id, "/chat/stream", request.question)
+        error, cancelled = None, False
+        try:
+            async for event in astream_answer(chain, request.question, session_id):
+                if first_token is None and event["type"] == "token":
+                    first_token = time.perf_counter() - start
+                if event["type"] == "sources":
+                    event["session_id"] = session_id
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            error = e
+            logger.error(f"[{request_id}] Error while streaming: {e}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        except BaseException:
+            # CancelledError or GeneratorExit: the client disconnected
+            cancelled = True
+            raise
+        finally:
+            tracer.finish(trace, error, cancelled)
+            total = time.perf_counter() - start
+            ttft = f"{first_token:.3f}s" if first_token is not None else "n/a"
+            status = "cancelled" if cancelled else "failed" if error is not None else "finished"
+            logger.info(f"[{request_id}] Stream {status}: time to first token {ttft}, total {total:.3f}s ({trace.summary()})")
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchRequest):
+    """
+    Answers a list of independent questions (no session memory) for offline
+    evaluation and FAQ precomputation. Streams one NDJSON line per question
+    in completion order, tagged with its position in the input:
+    {"index", "question", "answer", "sources", "route", "cached"}, or
+    {"index", "question", "error"} if that question failed.
+    """
+    chain = await ensure_chain()
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions given.")
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch.")
+    logger.info(f"Received batch of {len(request.questions)} questions")
+
+    async def results():
+        start = time.perf_counter()
+        answered = failed = 0
+        try:
+            async for result in abatch_answer(chain, request.questions, request.concurrency):
+                if "error" in result:
+                    failed += 1
+                else:
+                    answered += 1
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            logger.error(f"Batch failed: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        logger.info(f"Batch finished: {answered} answered, {failed} failed in {time.perf_counter() - start:.3f}s")
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.get("/")
 def health_check():
     return {"status": "running", "rag_ready": rag_chain is not None}
 
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Answer cache hit/miss ratio and total LLM latency saved.
+    """
+    return answer_cache.stats()
+
+@app.get("/embeddings/stats")
+def embedding_stats():
+    """
+    Query embedding batcher: batch sizes, queue wait and per-batch latency.
+    """
+    return query_batcher.stats()
+
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    """
+    Hybrid retrieval: mean latency of the vector leg, the BM25 leg and the
+    fused search, plus the hit rate of the retrieval cache in front of them.
+    """
+    stats = hybrid_search.stats()
+    stats["cache"] = retrieval_cache.stats()
+    return stats
+
+@app.get("/context/stats")
+def context_stats():
+    """
+    Prompt size: mean prompt/context tokens and how many tokens the budget saved.
+    """
+    return context_builder.stats()
+
+@app.get("/router/stats")
+def router_stats():
+    """
+    Intent router: requests and mean latency per route (list, attribute, open).
+    """
+    return intent_router.stats()
+
+@app.get("/memory/stats")
+def memory_stats():
+    """
+    Conversation memory: live sessions, stored turns, condensed follow-ups, evictions.
+    """
+    return conversation_memory.stats()
+
+@app.get("/llm/stats")
+def get_llm_stats():
+    """
+    LLM calls: primary wins, hedged/fallback calls, timeouts and p95 latency.
+    """
+    return llm_stats() or {"ready": False}
+
+@app.get("/startup")
+def startup_report():
+    """
+    Cold-start breakdown for this worker: import, embedding library import,
+    model load, index open, BM25 build, LLM client and chain build times.
+    """
+    return {"chain_loaded": rag_chain is not None, "steps": startup_profile.stats(), "report": startup_profile.report()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Per-stage latency histograms (route, cache, embed, queue, retrieve,
+    vector_search, context, llm_first_token, llm, total) and request counts,
+    in the Prometheus text format. Per worker process.
+    """
+    return PlainTextResponse(tracer.prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/slowest")
+def slowest_traces(n: int = 10):
+    """
+    The slowest of the recent /chat requests, with their stage breakdown.
+    """
+    return tracer.slowest(n)
+
 @app.post("/refresh")
 async def refresh_chain():
     """
     Forces a reload of the RAG chain. Call this after running ingest.py.
     """
-    global rag_chain
     try:
-        rag_chain = get_rag_chain()
+        # Loads the model, opens the index and rebuilds BM25; keep it off the event loop
+        await asyncio.to_thread(load_chain)
         logger.info("RAG Chain re-initialized successfully via /refresh.")
         return {"status": "success", "message": "RAG Chain reloaded."}
     except Exception as e:
         logger.error(f"Failed to refresh RAG Chain: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to refresh: {e}")
 
-@app.post("/ingest")
-async def ingest_endpoint():
+@app.post("/ingest", status_code=202)
+def ingest_endpoint():
+    """
+    Starts syncing the vector database with sample_data.jsonl (only new or
+    changed products are embedded) into a new index version in the
+    background, and returns the job id straight away. Poll GET /ingest/{id}
+    for progress; the RAG chain is reloaded when the job finishes.
+    Triggers on any worker while a job is waiting to start join that job,
+    and jobs run one at a time across workers.
+    """
+    job, coalesced = ingest_jobs.submit()
+    logger.info(f"Ingest job {job['id']} {'joined' if coalesced else 'queued'}.")
+    return {"job_id": job["id"], "status": job["status"], "coalesced": coalesced}
+
+@app.get("/ingest")
+def list_ingest_jobs():
     """
-    Triggers a full rebuild of the vector database from sample_data.json,
-    then automatically reloads the RAG chain.
+    Recent ingest jobs accepted by this worker, newest first.
     """
-    global rag_chain
+    return {"jobs": ingest_jobs.recent()}
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    """
+    Status of an ingest job: phase, documents embedded so far out of the
+    total, docs/sec, ETA, and the sync counts (or error) once finished.
+    """
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job: {job_id}")
+    return job
+
+@app.get("/index/versions")
+def list_index_versions():
+    """
+    Index versions, newest first: created/retired time, document count and
+    which one is live. Retired versions can be restored.
+    """
+    return {"current": index_snapshots.current_name(), "serving": chain_version, "versions": index_snapshots.versions()}
+
+@app.post("/index/versions/{name}/restore")
+async def restore_index_version(name: str):
+    """
+    Makes an earlier index version live again, immediately in this worker
+    and within INDEX_POLL_SECONDS in the others. No re-embedding.
+    """
+    try:
+        # Waits on the index pointer lock, which a gc() in another worker may hold
+        await asyncio.to_thread(restore_index, name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     try:
-        # 1. Rebuild Index (In-Process)
-        rebuild_index()
-        logger.info("Index rebuild complete.")
-        
-        # 2. Reload Chain
-        rag_chain = get_rag_chain()
-        logger.info("RAG Chain reloaded after ingest.")
-        return {"status": "success", "message": "Ingestion and Refresh Complete."}
+        await asyncio.to_thread(load_chain)
     except Exception as e:
-        logger.error(f"Ingestion failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+        logger.error(f"Failed to reload after restore: {e}")
+        raise HTTPException(status_code=500, detail=f"Restored {name}, but reloading failed: {e}")
+    logger.info(f"Index version {name} restored.")
+    return {"status": "success", "current": name}
@@ -3,7 +3,18 @@ from typing import Optional
 
 class QueryRequest(BaseModel):
     question: str
+    # Pass back the session_id from a previous response to ask follow-ups
+    session_id: Optional[str] = None
+    # Set on the first question of a conversation to get a session_id back;
+    # without either, the question is answered without memory
+    new_session: bool = False
 
 class QueryResponse(BaseModel):
     answer: str
     sources: Optional[list] = None
+    session_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    questions: list[str]
+    # LLM calls in flight at once; defaults to BATCH_CONCURRENCY
+    concurrency: Optional[int] = None
@@ -1,40 +1,360 @@
+import gc
 import os
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
+import sys
+import json
+import time
+import asyncio
+from operator import itemgetter
+# Modules shared with the Django app live in ../rag_common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_import_started = time.perf_counter()
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough, RunnableSequence
+from langchain_core.documents import Document
 from dotenv import load_dotenv
+from rag_common.answer_cache import AnswerCache, normalize_question
+from rag_common.embedding_batcher import EmbeddingBatcher
+from rag_common.embedding_cache import CachedEmbeddings, format_cache_stats
+from rag_common.product_snapshot import ProductSnapshot, format_live_fields
+from rag_common.query_filters import parse_filters, build_where, filters_key
+from rag_common.hybrid_search import BM25Index, HybridSearch, matches_where
+from rag_common.index_sync import sync_documents, plan_sync, indexed_documents, format_counts
+from index_snapshots import IndexSnapshots
+from rag_common.vector_store import open_vectorstore
+from rag_common.retrieval_cache import IndexVersion, RetrievalCache
+from rag_common.context_builder import ContextBuilder
+from rag_common.intent_router import IntentRouter
+from rag_common.llm_provider import build_llm
+from rag_common.conversation_memory import ConversationMemory
+from rag_common.tracing import Tracer, TracedRunnable
+from rag_common import tracing
+from rag_common.startup_profile import StartupProfile
+from rag_common.model_cache import use_offline_cache
+
+# Cold-start timings for this worker (GET /startup). The embedding library
+# (torch via sentence-transformers) is imported on first use, not here.
+startup_profile = StartupProfile()
+startup_profile.record("import", time.perf_counter() - _import_started)
 
 # Load env vars
 load_dotenv()
 
-PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "chroma_db")
+# "chroma" (default) or "numpy" for in-memory exact search (see rag_common/vector_store.py)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+PERSIST_DIRECTORY = os.path.join(
+    os.path.dirname(__file__), "numpy_index" if VECTOR_BACKEND == "numpy" else "chroma_db"
+)
+# Catalog exported by Django's sync_products: one JSON product per line.
+# A sample_data.json array from before the switch is read until then.
+DATA_FILE = os.path.join(os.path.dirname(__file__), "sample_data.jsonl")
+LEGACY_DATA_FILE = os.path.join(os.path.dirname(__file__), "sample_data.json")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Model weights live here. Pin EMBEDDING_MODEL_REVISION (a commit hash) so
+# every worker and build loads the same weights; MODEL_OFFLINE=auto skips
+# the hub's network checks once the model is cached (see rag_common/model_cache.py).
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", os.path.join(os.path.dirname(__file__), "model_cache"))
+EMBEDDING_MODEL_REVISION = os.environ.get("EMBEDDING_MODEL_REVISION") or None
+MODEL_OFFLINE = os.environ.get("MODEL_OFFLINE", "auto")
+# Mirrors Product.GENDER_CHOICES / CATEGORY_CHOICES in the Django app
+GENDERS = ["Men", "Women", "Unisex"]
+CATEGORIES = ["Sweater", "Cardigan", "Inner", "Polo"]
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(__file__), "embedding_cache.sqlite3")
+)
+# Each ingest writes a new copy of the index under INDEX_ROOT and then
+# flips the CURRENT pointer to it. PERSIST_DIRECTORY (the old single
+# index) is served until the first versioned build.
+INDEX_ROOT = os.environ.get("INDEX_ROOT", PERSIST_DIRECTORY + "_versions")
+index_snapshots = IndexSnapshots(
+    INDEX_ROOT,
+    legacy_dir=PERSIST_DIRECTORY,
+    keep=int(os.environ.get("INDEX_KEEP_VERSIONS", 3)),
+    drain_seconds=int(os.environ.get("INDEX_DRAIN_SECONDS", 300)),
+)
+INDEX_VERSION_PATH = os.environ.get(
+    "INDEX_VERSION_PATH", os.path.join(os.path.dirname(__file__), "index_version")
+)
+
+# Query embedding is CPU-bound, so it runs on dedicated batcher threads
+# instead of blocking the event loop. Questions arriving within a few ms of
+# each other are embedded together in one vectorized call.
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", 2))
+query_batcher = EmbeddingBatcher(
+    lambda texts: get_embeddings().embed_documents(texts),
+    window_ms=float(os.environ.get("EMBED_BATCH_WINDOW_MS", 5)),
+    max_batch=int(os.environ.get("EMBED_BATCH_MAX", 32)),
+    workers=EMBED_THREADS,
+)
+
+# Caps how many questions run retrieval + LLM generation at once per worker;
+# the rest wait their turn instead of piling up on Groq.
+MAX_CONCURRENT_CHATS = int(os.environ.get("MAX_CONCURRENT_CHATS", 16))
+chat_limiter = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
+
+# Default number of LLM calls a /chat/batch request keeps in flight. Batches
+# get their own limit so a nightly FAQ run doesn't queue behind (or starve) /chat.
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
+
+# Documents embedded and written per chunk during an ingest (progress is
+# reported after each chunk)
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 256))
+
+# Keyword (BM25) leg of hybrid retrieval, kept in step with the vector index
+bm25_index = BM25Index()
+hybrid_search = HybridSearch(
+    bm25_index,
+    rrf_k=int(os.environ.get("RRF_K", 60)),
+    enabled=os.environ.get("HYBRID_SEARCH", "True") == "True",
+)
+
+# Retrieved docs per (question, filters, k), invalidated by bumping the
+# index version whenever the index is written (here or by ingest.py)
+index_version = IndexVersion(INDEX_VERSION_PATH)
+retrieval_cache = RetrievalCache(
+    index_version,
+    max_size=int(os.environ.get("RETRIEVAL_CACHE_SIZE", 1024)),
+    normalize=normalize_question,
+)
+
+# Shared answer cache for /chat. Emptied in every worker when the index
+# version moves, and locally by rebuild_index() for price/stock changes.
+answer_cache = AnswerCache(
+    max_size=int(os.environ.get("ANSWER_CACHE_SIZE", 512)),
+    ttl=int(os.environ.get("ANSWER_CACHE_TTL", 3600)),
+    threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95)),
+    versions=(index_version,),
+)
+
+_embeddings = None
+_llm = None
+
+def catalog_file(data_file=DATA_FILE):
+    if data_file == DATA_FILE and not os.path.exists(DATA_FILE) and os.path.exists(LEGACY_DATA_FILE):
+        return LEGACY_DATA_FILE
+    return data_file
+
+def iter_products(data_file=DATA_FILE):
+    """
+    Yields the products in the catalog file one at a time: newline-delimited
+    JSON, or (older exports) a single JSON array, which is loaded whole.
+    """
+    with open(catalog_file(data_file), 'r') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        if first == "[":
+            f.seek(0)
+            yield from json.load(f)
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _load_live_fields():
+    # Price and stock per product id, straight from the catalog file
+    if not os.path.exists(catalog_file()):
+        return {}
+    return {p['id']: {"price": p['price'], "stock": p['stock']} for p in iter_products(DATA_FILE)}
+
+# Live price/stock, merged into the context at answer time. Refreshed by rebuild_index().
+product_snapshot = ProductSnapshot(_load_live_fields)
+
+# Recent turns per session_id, for follow-up questions
+conversation_memory = ConversationMemory(
+    max_sessions=int(os.environ.get("CHAT_MEMORY_SESSIONS", 1000)),
+    max_turns=int(os.environ.get("CHAT_MEMORY_TURNS", 4)),
+    idle_ttl=int(os.environ.get("CHAT_MEMORY_IDLE_TTL", 3600)),
+)
+
+def _load_catalog():
+    # Catalog fields the intent router answers from, straight from the catalog file
+    if not os.path.exists(catalog_file()):
+        return []
+    return [
+        {"id": p['id'], "name": p['name'], **{
+            key: p['attributes'][key] for key in ("gender", "category", "material", "size", "color")
+        }}
+        for p in iter_products(DATA_FILE)
+    ]
+
+# Answers catalog listings and attribute lookups without the chain, and
+# picks k for everything else. Refreshed by rebuild_index().
+intent_router = IntentRouter(_load_catalog, product_snapshot.get)
+
+def _live_fields(doc):
+    live = product_snapshot.get(doc.metadata.get("id"))
+    return format_live_fields(live) if live else None
+
+# Keeps the prompt context under CONTEXT_TOKEN_BUDGET (dedup, then per-field truncation)
+context_builder = ContextBuilder(
+    budget=int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1500)),
+    live_fields=_live_fields,
+)
+
+# Per-stage timings of /chat requests, for /metrics and the slowest-requests view
+tracer = Tracer(window=int(os.environ.get("TRACE_WINDOW", 500)))
 
 def format_docs(docs):
-    return "\n\n".join([d.page_content for d in docs])
+    with tracing.stage("context"):
+        return context_builder.build(docs)
+
+def get_llm():
+    """
+    Returns the process-wide LLM: LLM_PROVIDER/LLM_MODEL behind a deadline,
+    with hedging/fallback to LLM_FALLBACK_MODEL (empty disables it).
+    Kept across chain reloads so its latency history and HTTP pool survive.
+    """
+    global _llm
+    if _llm is None:
+        with startup_profile.step("llm"):
+            _llm = build_llm(
+                provider=os.environ.get("LLM_PROVIDER", "groq"),
+                model=os.environ.get("LLM_MODEL", "llama-3.3-70b-versatile"),
+                fallback_provider=os.environ.get("LLM_FALLBACK_PROVIDER") or None,
+                fallback_model=os.environ.get("LLM_FALLBACK_MODEL", "llama-3.1-8b-instant"),
+                timeout=float(os.environ.get("LLM_TIMEOUT", 20)),
+                max_retries=int(os.environ.get("LLM_MAX_RETRIES", 2)),
+                deadline=float(os.environ.get("LLM_DEADLINE", 30)),
+                hedge=os.environ.get("LLM_HEDGE", "True") == "True",
+                hedge_after=float(os.environ.get("LLM_HEDGE_AFTER", 8)),
+            )
+    return _llm
+
+def llm_stats():
+    # Without building the LLM just to report on it
+    return _llm.stats() if _llm is not None else None
+
+def get_embeddings():
+    """
+    Returns the embedding model, loading it once per process.
+    """
+    global _embeddings
+    if _embeddings is None:
+        offline = use_offline_cache(MODEL_CACHE_DIR, EMBEDDING_MODEL, MODEL_OFFLINE, EMBEDDING_MODEL_REVISION)
+        with startup_profile.step("embeddings_import"):
+            from langchain_huggingface import HuggingFaceEmbeddings
+        # HuggingFace - Local. Must match ingestion. Includes importing torch.
+        with startup_profile.step("model_load"):
+            model_kwargs = {"revision": EMBEDDING_MODEL_REVISION} if EMBEDDING_MODEL_REVISION else {}
+            _embeddings = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL, cache_folder=MODEL_CACHE_DIR, model_kwargs=model_kwargs,
+            )
+        print(f"Embedding model loaded from {MODEL_CACHE_DIR}{' (offline)' if offline else ''}.")
+    return _embeddings
+
+def preload_model():
+    """
+    Loads the embedding model before gunicorn --preload forks the workers,
+    so they share one copy of the weights (copy-on-write) instead of each
+    loading its own.
+
+    Only the model: the vector store, BM25 index and LLM client are still
+    built per worker, since SQLite handles, sockets and threads don't
+    survive a fork. No inference runs here either, so torch's thread pool
+    starts in the workers. gc.freeze() moves everything loaded so far out
+    of the collector's reach; otherwise the first collection in each worker
+    writes to those objects and un-shares their pages.
+    """
+    get_embeddings()
+    gc.freeze()
+
+def embed_query(question):
+    """
+    Embeds a query through the shared micro-batcher.
+    MiniLM has no query prefix, so a batched embed_documents call
+    gives the same vectors as embed_query.
+    """
+    with tracing.stage("embed"):
+        return query_batcher.embed(question)
+
+def get_ingest_embeddings():
+    """
+    Embeddings for ingestion, backed by the on-disk embedding cache so text
+    that was embedded before is never re-embedded.
+    """
+    return CachedEmbeddings(get_embeddings(), EMBEDDING_MODEL, EMBEDDING_CACHE_PATH)
+
+async def aembed_query(question):
+    with tracing.stage("embed"):
+        return await asyncio.wrap_future(query_batcher.submit(question))
+
+def get_vectorstore(embeddings, path=None):
+    # The live index version unless a directory is given
+    return open_vectorstore(VECTOR_BACKEND, path or index_snapshots.current() or PERSIST_DIRECTORY, embeddings)
 
 def get_rag_chain():
     """
     Creates and returns the LangChain RAG pipeline.
     """
-    if not os.path.exists(PERSIST_DIRECTORY):
-        raise FileNotFoundError(f"ChromaDB not found at {PERSIST_DIRECTORY}. Please run ingest.py first.")
+    # Resolved once: the chain keeps reading this version until it is rebuilt
+    index_path = index_snapshots.current()
+    if index_path is None:
+        raise FileNotFoundError(f"Vector index not found in {INDEX_ROOT}. Please run ingest.py first.")
 
     # 1. Initialize Embeddings (HuggingFace - Local)
-    # Must match ingestion
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = get_embeddings()
 
     # 2. Connect to Vector DB
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY, 
-        embedding_function=embeddings
-    )
+    with startup_profile.step("index_open"):
+        vectorstore = get_vectorstore(embeddings, index_path)
     
     # 3. Create Retriever
-    # Increased k to 6 to handle "List all products" queries better
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 6})
+    # The chain accepts a plain question or {"question", "embedding", "filters"}
+    # so the query embedding computed for the answer cache is reused for search.
+    def with_embedding(inputs):
+        if isinstance(inputs, str):
+            return {"question": inputs, "embedding": embed_query(inputs), "filters": parse_question_filters(inputs)}
+        return inputs
+
+    async def awith_embedding(inputs):
+        if isinstance(inputs, str):
+            return {"question": inputs, "embedding": await aembed_query(inputs), "filters": parse_question_filters(inputs)}
+        return inputs
+
+    # Keyword index over the same documents, for the BM25 leg
+    with startup_profile.step("bm25"):
+        bm25_index.replace_all(indexed_documents(vectorstore))
+
+    def search_args(inputs):
+        # Gender/category/price/stock constraints become a pre-filter for both legs
+        where, has_candidates = build_where(inputs.get("filters") or {}, product_snapshot)
+        # The vector leg may run on a pool thread without the request's context
+        trace = tracing.current()
+
+        def vector_search(n, where):
+            with tracing.stage("vector_search", trace):
+                return vectorstore.similarity_search_by_vector(inputs["embedding"], k=n, filter=where)
+
+        # k comes from the intent router; 6 for a plain question
+        return has_candidates, (vector_search, inputs["question"], inputs.get("k") or 6, where)
+
+    def retrieve(inputs):
+        has_candidates, args = search_args(inputs)
+        if not has_candidates:
+            return []
+        _, question, k, where = args
+        with tracing.stage("retrieve"):
+            docs = retrieval_cache.get(question, where, k)
+            if docs is None:
+                docs = hybrid_search.search(*args)
+                retrieval_cache.put(question, where, k, docs)
+        return docs
+
+    async def aretrieve(inputs):
+        has_candidates, args = search_args(inputs)
+        if not has_candidates:
+            return []
+        _, question, k, where = args
+        with tracing.stage("retrieve"):
+            docs = retrieval_cache.get(question, where, k)
+            if docs is None:
+                docs = await hybrid_search.asearch(*args)
+                retrieval_cache.put(question, where, k, docs)
+        return docs
+
+    retriever = RunnableLambda(retrieve, afunc=aretrieve)
 
     # 4. Define Prompt
     template = """You are a helpful product assistant. Answer the question based ONLY on the following context.
@@ -50,87 +370,369 @@ def get_rag_chain():
     Context:
     {context}
 
+    Conversation so far (use it to understand follow-up questions):
+    {history}
+
     Question: {question}
     """
     prompt = ChatPromptTemplate.from_template(template)
 
-    # 5. Initialize LLM (Groq - Llama 3)
-    # Using Llama 3.3 70B via Groq for super fast inference
-    llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0)
+    # 5. Initialize LLM (Groq - Llama 3.3 70B by default, see get_llm),
+    # timed into the request trace (time to first token when streaming)
+    llm = TracedRunnable(get_llm(), "llm", first_chunk="llm_first_token")
 
     # 6. Build Chain
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+    # Output is {"question", "embedding", "docs", "answer"}. The docs give
+    # the sources, and .stream() yields "answer" chunks as tokens arrive.
+    generate = (
+        {
+            "context": itemgetter("docs") | RunnableLambda(format_docs),
+            "question": itemgetter("question"),
+            "history": lambda x: x.get("history") or "(none)",
+        }
         | prompt
+        | RunnableLambda(context_builder.log_prompt)
         | llm
         | StrOutputParser()
     )
-    
     rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+        RunnableLambda(with_embedding, afunc=awith_embedding)
+        | RunnablePassthrough.assign(docs=retriever)
+        | RunnablePassthrough.assign(answer=generate)
     )
     
     return rag_chain
 
-def rebuild_index():
+def get_sources(docs):
+    return [d.metadata.get("id") for d in docs]
+
+def parse_question_filters(question):
+    return parse_filters(question, GENDERS, CATEGORIES)
+
+def route_question(question, filters):
+    where, has_candidates = build_where(filters, product_snapshot)
+    return intent_router.route(question, lambda product: has_candidates and matches_where(product, where))
+
+async def _lookup_cache(question, filters):
+    # Returns (cached result or None, chain input). Answers are only reused
+    # between questions with the same parsed filters.
+    query = {"question": question, "embedding": None, "filters": filters}
+    with tracing.stage("cache"):
+        cached = answer_cache.get_exact(question)
+    if cached is not None:
+        tracing.tag(cached=True)
+        return cached, query
+
+    query["embedding"] = await aembed_query(question)
+    with tracing.stage("cache"):
+        cached = answer_cache.get_similar(query["embedding"], scope=filters_key(filters))
+    tracing.tag(cached=cached is not None)
+    return cached, query
+
+def _remember(query, result, latency):
+    # Nothing retrieved (no product matched the filters): cheap to redo
+    if not result["sources"]:
+        return
+    answer_cache.put(query["question"], result, query["embedding"],
+                     latency=latency, scope=filters_key(query["filters"]))
+
+def _start_turn(question, session_id):
+    # Follow-ups are resolved against the session before routing and
+    # retrieval; the original question goes into the history. The async
+    # paths run this in a thread: a stale catalog or snapshot is re-read
+    # from disk here.
+    with tracing.stage("route"):
+        history = conversation_memory.history(session_id)
+        standalone = conversation_memory.condense(session_id, question)
+        filters = parse_question_filters(standalone)
+        route = route_question(standalone, filters)
+    tracing.tag(intent=route.intent)
+    return standalone, filters, route, history
+
+async def aanswer_question(rag_chain, question, session_id=None):
     """
-    Rebuilds the ChromaDB index using data from sample_data.json.
-    Designed to be called from within the running FastAPI process.
+    Answers a question through the answer cache. Only misses reach the LLM.
+    Returns {"answer": str, "sources": [product ids]}.
+    Listings and attribute lookups are answered by the intent router.
+    With a session_id, earlier turns of that session inform the answer.
     """
-    import json
-    from langchain_core.documents import Document
-    
-    DATA_FILE = os.path.join(os.path.dirname(__file__), "sample_data.json")
-    print(f"Loading data from {DATA_FILE}...")
-    
-    with open(DATA_FILE, 'r') as f:
-        products = json.load(f)
-
-    documents = []
-    for product in products:
-        content = f"Product Name: {product['name']}. \n" \
-                  f"Gender: {product['attributes']['gender']}. \n" \
-                  f"Category: {product['attributes']['category']}. \n" \
-                  f"Description: {product['description']}. \n" \
-                  f"Material: {product['attributes']['material']}. \n" \
-                  f"Size: {product['attributes']['size']}. \n" \
-                  f"Color: {product['attributes']['color']}. \n" \
-                  f"Price: ${product['price']}."
-        
-        metadata = {
-            "id": product['id'],
-            "name": product['name'],
-            "price": product['price'],
-            "stock": product['stock']
-        }
-        documents.append(Document(page_content=content, metadata=metadata))
+    start = time.perf_counter()
+    standalone, filters, route, history = await asyncio.to_thread(_start_turn, question, session_id)
+    if route.answer is not None:
+        result = {"answer": route.answer, "sources": route.sources}
+    else:
+        cached, query = await _lookup_cache(standalone, filters)
+        if cached is not None:
+            result = cached
+        else:
+            query["k"] = route.k
+            query["history"] = history
+            queued = time.perf_counter()
+            async with chat_limiter:
+                chain_start = time.perf_counter()
+                tracing.record("queue", chain_start - queued)
+                output = await rag_chain.ainvoke(query)
+            result = {"answer": output["answer"], "sources": get_sources(output["docs"])}
+            _remember(query, result, time.perf_counter() - chain_start)
 
-    # Initialize Embeddings
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    
-    # Connect to existing DB
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY, 
-        embedding_function=embeddings
+    conversation_memory.add_turn(session_id, question, result["answer"], standalone)
+    intent_router.record(route.intent, time.perf_counter() - start)
+    return result
+
+async def astream_answer(rag_chain, question, session_id=None):
+    """
+    Streaming version of aanswer_question. Yields {"type": "token", "text": ...}
+    events as the LLM produces them, then one {"type": "sources", ...} event.
+    A cached or routed answer is sent as a single token event.
+    """
+    start = time.perf_counter()
+    standalone, filters, route, history = await asyncio.to_thread(_start_turn, question, session_id)
+    if route.answer is not None:
+        conversation_memory.add_turn(session_id, question, route.answer, standalone)
+        intent_router.record(route.intent, time.perf_counter() - start)
+        yield {"type": "token", "text": route.answer}
+        yield {"type": "sources", "sources": route.sources, "cached": False}
+        return
+
+    cached, query = await _lookup_cache(standalone, filters)
+    if cached is not None:
+        conversation_memory.add_turn(session_id, question, cached["answer"], standalone)
+        intent_router.record(route.intent, time.perf_counter() - start)
+        yield {"type": "token", "text": cached["answer"]}
+        yield {"type": "sources", "sources": cached["sources"], "cached": True}
+        return
+
+    query["k"] = route.k
+    query["history"] = history
+    queued = time.perf_counter()
+    async with chat_limiter:
+        chain_start = time.perf_counter()
+        tracing.record("queue", chain_start - queued)
+        sources, parts = [], []
+        async for chunk in rag_chain.astream(query):
+            if "docs" in chunk:
+                sources = get_sources(chunk["docs"])
+            if chunk.get("answer"):
+                parts.append(chunk["answer"])
+                yield {"type": "token", "text": chunk["answer"]}
+
+    result = {"answer": "".join(parts), "sources": sources}
+    _remember(query, result, time.perf_counter() - chain_start)
+    conversation_memory.add_turn(session_id, question, result["answer"], standalone)
+    intent_router.record(route.intent, time.perf_counter() - start)
+    yield {"type": "sources", "sources": sources, "cached": False}
+
+async def abatch_answer(rag_chain, questions, concurrency=None):
+    """
+    Answers many independent questions (no session) for offline evaluation
+    and FAQ precomputation. Yields {"index", "question", "answer", "sources",
+    "route", "cached"} per question in completion order, or {"index",
+    "question", "error"} when one fails; the rest of the batch carries on.
+
+    1. Routed and exactly cached questions are answered straight away.
+    2. The rest are embedded in one vectorized call and checked against the
+       semantic answer cache.
+    3. Retrieval runs for all remaining questions at once.
+    4. The LLM calls fan out, at most `concurrency` in flight.
+    Fresh answers go into the answer cache, so a nightly run warms /chat.
+    """
+    concurrency = max(1, min(concurrency or BATCH_CONCURRENCY, MAX_CONCURRENT_CHATS))
+    start = time.perf_counter()
+
+    def done(i, result, intent, cached):
+        intent_router.record(intent, time.perf_counter() - start)
+        return {"index": i, "question": questions[i], "answer": result["answer"],
+                "sources": result["sources"], "route": intent, "cached": cached}
+
+    # 1. Router and exact cache
+    pending = []  # (index, route, query)
+    for i, question in enumerate(questions):
+        filters = parse_question_filters(question)
+        try:
+            route = route_question(question, filters)
+        except Exception as e:
+            yield {"index": i, "question": question, "error": str(e)}
+            continue
+        if route.answer is not None:
+            yield done(i, {"answer": route.answer, "sources": route.sources}, route.intent, False)
+            continue
+        cached = answer_cache.get_exact(question)
+        if cached is not None:
+            yield done(i, cached, route.intent, True)
+            continue
+        pending.append((i, route, {"question": question, "embedding": None, "filters": filters, "k": route.k}))
+    if not pending:
+        return
+
+    # 2. One embedding pass for the whole batch, then the semantic cache
+    texts = [query["question"] for _, _, query in pending]
+    vectors = await asyncio.to_thread(get_embeddings().embed_documents, texts)
+    misses = []
+    for (i, route, query), vector in zip(pending, vectors):
+        query["embedding"] = vector
+        cached = answer_cache.get_similar(vector, scope=filters_key(query["filters"]))
+        if cached is not None:
+            yield done(i, cached, route.intent, True)
+        else:
+            misses.append((i, route, query))
+    if not misses:
+        return
+
+    # 3. Bulk retrieval. The chain is embed -> retrieve -> generate; inputs
+    # already carry their embedding, so only the retrieve step does work.
+    retrieve_stage = RunnableSequence(*rag_chain.steps[:-1])
+    generate_stage = rag_chain.steps[-1]
+    retrieved = await retrieve_stage.abatch(
+        [query for _, _, query in misses],
+        config={"max_concurrency": MAX_CONCURRENT_CHATS},
+        return_exceptions=True,
     )
-    
-    # Clear and Add
-    print("Clearing and rebuilding collection...")
+
+    # 4. LLM fan-out with bounded concurrency
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def generate(i, route, query, inputs):
+        if isinstance(inputs, Exception):
+            return i, route, query, inputs, 0.0
+        async with limiter:
+            chain_start = time.perf_counter()
+            try:
+                output = await generate_stage.ainvoke(inputs)
+            except Exception as e:
+                return i, route, query, e, 0.0
+        return i, route, query, output, time.perf_counter() - chain_start
+
+    tasks = [
+        asyncio.ensure_future(generate(i, route, query, inputs))
+        for (i, route, query), inputs in zip(misses, retrieved)
+    ]
     try:
-        vectorstore.delete_collection()
-        # Re-init after delete
-        vectorstore = Chroma(
-            persist_directory=PERSIST_DIRECTORY, 
-            embedding_function=embeddings
+        for next_done in asyncio.as_completed(tasks):
+            i, route, query, output, latency = await next_done
+            if isinstance(output, Exception):
+                yield {"index": i, "question": questions[i], "error": str(output)}
+                continue
+            result = {"answer": output["answer"], "sources": get_sources(output["docs"])}
+            _remember(query, result, latency)
+            yield done(i, result, route.intent, False)
+    finally:
+        # Client went away: don't leave LLM calls running
+        for task in tasks:
+            task.cancel()
+
+def product_document(product):
+    """
+    Renders one product (catalog file shape) into a Document.
+    Only semantic fields are embedded; price and stock come from product_snapshot.
+    """
+    content = f"Product Name: {product['name']}. \n" \
+              f"Gender: {product['attributes']['gender']}. \n" \
+              f"Category: {product['attributes']['category']}. \n" \
+              f"Description: {product['description']}. \n" \
+              f"Material: {product['attributes']['material']}. \n" \
+              f"Size: {product['attributes']['size']}. \n" \
+              f"Color: {product['attributes']['color']}."
+
+    # Price and stock are not embedded; format_docs adds them live
+    metadata = {
+        "id": product['id'],
+        "name": product['name'],
+        "gender": product['attributes']['gender'],
+        "category": product['attributes']['category']
+    }
+    return Document(page_content=content, metadata=metadata)
+
+class CatalogDocuments:
+    """
+    The catalog file as Documents, read lazily: every iteration re-reads
+    the file one product at a time, so a sync can diff and then embed
+    without holding the catalog in memory. len() counts the products.
+    """
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self._len = None
+
+    def __iter__(self):
+        return (product_document(product) for product in iter_products(self.data_file))
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for _ in iter_products(self.data_file))
+        return self._len
+
+def load_documents(data_file=DATA_FILE):
+    """
+    Every product in the catalog file as a Document (see CatalogDocuments).
+    """
+    print(f"Loading data from {catalog_file(data_file)}...")
+    return CatalogDocuments(data_file)
+
+def sync_index(documents, embeddings, progress=None):
+    """
+    Brings the index in line with `documents` as a new index version.
+    The changes are written into a copy of the live version, which goes live
+    in one step once complete; live requests keep reading the old one.
+    Nothing is copied when nothing changed. Raises IndexBusy if another
+    ingest is already building a version.
+    `documents` is read twice (diff, then sync), so pass a list or a
+    CatalogDocuments rather than a generator.
+    `progress(done, total)` is called every INGEST_BATCH_SIZE documents.
+    """
+    current = index_snapshots.current()
+    if current is not None:
+        counts = plan_sync(get_vectorstore(embeddings, current), documents)
+        if not (counts["added"] or counts["updated"] or counts["deleted"]):
+            return counts
+
+    with index_snapshots.build() as build:
+        counts = sync_documents(
+            get_vectorstore(embeddings, build.path), documents,
+            batch_size=INGEST_BATCH_SIZE, progress=progress,
         )
-    except Exception as e:
-        print(f"Rebuild warning: {e}")
+        build.docs = counts["added"] + counts["updated"] + counts["unchanged"]
+    # Running servers drop their cached retrieval results
+    index_version.bump()
+    return counts
+
+def restore_index(name):
+    """
+    Makes an earlier index version live again. Workers pick it up within
+    INDEX_POLL_SECONDS (main.py); the caller's process should reload now.
+    """
+    index_snapshots.restore(name)
+    index_version.bump()
+    answer_cache.clear()
+
+def rebuild_index(progress=None):
+    """
+    Syncs the vector index with the catalog file, streaming it in
+    INGEST_BATCH_SIZE batches.
+    Designed to be called from within the running FastAPI process (see the
+    ingest jobs in main.py).
+    Only new or changed products are re-embedded, into a new index version
+    (see sync_index), so live /chat requests never see a half-built index.
+    `progress(done, total)` receives documents processed so far.
+    The BM25 index is rebuilt by load_chain() on the new version.
+    Returns counts of added, updated, unchanged and deleted products.
+    """
+    documents = load_documents()
+
+    embeddings = get_ingest_embeddings()
+    counts = sync_index(documents, embeddings, progress=progress)
+    counts["embedding_cache"] = embeddings.stats()
+    counts["version"] = index_snapshots.current_name()
+    print(f"Index synced: {format_counts(counts)}.")
+    print(format_cache_stats(counts["embedding_cache"]))
+
+    # Price/stock-only changes land here without touching the index
+    live_changed = product_snapshot.refresh()
+    intent_router.refresh()
+
+    index_changed = counts["added"] or counts["updated"] or counts["deleted"]
 
-    if documents:
-        vectorstore.add_documents(documents=documents)
-        print(f"Added {len(documents)} documents.")
+    # Cached answers may describe products that changed
+    if index_changed or live_changed:
+        answer_cache.clear()
     
-    return True
+    return counts
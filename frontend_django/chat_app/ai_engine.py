@@ -1,42 +1,408 @@
+import gc
 import os
 import json
+import threading
+import time
+from operator import itemgetter
 from django.conf import settings
-from langchain_chroma import Chroma
-from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
-from langchain_groq import ChatGroq
+_import_started = time.perf_counter()
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.documents import Document
+from rag_common.answer_cache import AnswerCache, normalize_question
+from rag_common.embedding_batcher import EmbeddingBatcher
+from rag_common.embedding_cache import CachedEmbeddings, format_cache_stats
+from rag_common.product_snapshot import ProductSnapshot, format_live_fields
+from rag_common.query_filters import parse_filters, build_where, filters_key
+from rag_common.index_sync import sync_documents, apply_changes, indexed_documents, format_counts
+from rag_common.hybrid_search import BM25Index, HybridSearch, matches_where
+from rag_common.vector_store import open_vectorstore, index_write_lock
+from rag_common.retrieval_cache import IndexVersion, RetrievalCache
+from rag_common.context_builder import ContextBuilder
+from rag_common.intent_router import IntentRouter
+from rag_common.llm_provider import build_llm
+from rag_common.conversation_memory import ConversationMemory
+from rag_common.tracing import Tracer, TracedRunnable
+from rag_common import tracing
+from rag_common.startup_profile import StartupProfile
+from rag_common.model_cache import use_offline_cache
+from .signals import live_version
+
+# Cold-start timings for this worker (shown on the dashboard). FastEmbed and
+# onnxruntime are imported on first use, not here.
+startup_profile = StartupProfile()
+startup_profile.record("import", time.perf_counter() - _import_started)
 
 # Define paths
-# Use a specific path for ChromaDB
-PERSIST_DIRECTORY = getattr(settings, 'CHROMA_DB_PATH', os.path.join(settings.BASE_DIR, "chroma_db"))
+# "chroma" (default) or "numpy" for in-memory exact search (see rag_common/vector_store.py)
+VECTOR_BACKEND = getattr(settings, 'VECTOR_BACKEND', 'chroma')
+# Use a specific path for the index
+if VECTOR_BACKEND == 'numpy':
+    PERSIST_DIRECTORY = getattr(settings, 'NUMPY_INDEX_PATH', os.path.join(settings.BASE_DIR, "numpy_index"))
+else:
+    PERSIST_DIRECTORY = getattr(settings, 'CHROMA_DB_PATH', os.path.join(settings.BASE_DIR, "chroma_db"))
 DATA_FILE = os.path.join(settings.BASE_DIR, "sample_data.json")
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+# FastEmbed downloads its ONNX build of EMBEDDING_MODEL from this hub repo
+EMBEDDING_MODEL_REPO = "Qdrant/bge-small-en-v1.5-onnx-Q"
+EMBEDDING_CACHE_PATH = getattr(settings, 'EMBEDDING_CACHE_PATH', os.path.join(settings.BASE_DIR, "embedding_cache.sqlite3"))
+INDEX_VERSION_PATH = getattr(settings, 'INDEX_VERSION_PATH', os.path.join(settings.BASE_DIR, "index_version"))
+# Model weights live here; AI_MODEL_OFFLINE='auto' skips the hub check once
+# the model is in this directory (see rag_common/model_cache.py)
+MODEL_CACHE_DIR = getattr(settings, 'AI_MODEL_CACHE_DIR', os.path.join(settings.BASE_DIR, "model_cache"))
+MODEL_OFFLINE = getattr(settings, 'AI_MODEL_OFFLINE', 'auto')
+# Documents embedded and written per chunk during a full sync
+INGEST_BATCH_SIZE = getattr(settings, 'INGEST_BATCH_SIZE', 256)
+
+# --- Process-wide chain registry ---
+# Building the chain loads the embedding model, opens the Chroma client and
+# creates the Groq client. Each worker does that once and reuses the result.
+_registry_lock = threading.RLock()
+_stats_lock = threading.Lock()
+# Serializes chain rebuilds after an index change; requests never wait on it
+_reload_lock = threading.Lock()
+_reload_thread = None
+_reload_failed_at = None
+# After a failed background rebuild, keep the old chain this long before retrying
+RELOAD_RETRY_SECONDS = 30
+_embeddings = None
+_llm = None
+_rag_chain = None
+_chain_version = None  # index_version the chain was built at
+_chain_stats = {"cold_builds": 0, "warm_hits": 0, "reloads": 0, "last_build_seconds": 0.0}
+
+
+# BM25 over the indexed documents, fused with vector search (see rag_common/hybrid_search.py).
+# Kept in step with the vector index by rebuild_index() and update_products().
+bm25_index = BM25Index()
+hybrid_search = HybridSearch(
+    bm25_index,
+    rrf_k=getattr(settings, 'RRF_K', 60),
+    enabled=getattr(settings, 'HYBRID_SEARCH', True),
+)
+
+# Retrieved docs per (question, filters, k). The index version is a file,
+# so a re-index in one worker invalidates every worker's cache.
+index_version = IndexVersion(INDEX_VERSION_PATH)
+retrieval_cache = RetrievalCache(
+    index_version,
+    max_size=getattr(settings, 'RETRIEVAL_CACHE_SIZE', 1024),
+    normalize=normalize_question,
+)
+
+# Answer cache in front of the LLM. Emptied in every worker when the index
+# or any product's price/stock changes (both versions are files).
+answer_cache = AnswerCache(
+    max_size=getattr(settings, 'ANSWER_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'ANSWER_CACHE_TTL', 3600),
+    threshold=getattr(settings, 'ANSWER_CACHE_THRESHOLD', 0.95),
+    versions=(index_version, live_version),
+)
+
+def _load_live_fields(ids=None):
+    from chat_app.models import Product
+    products = Product.objects.all() if ids is None else Product.objects.filter(id__in=ids)
+    return {
+        pid: {"price": price, "stock": stock}
+        for pid, price, stock in products.values_list('id', 'price', 'stock')
+    }
+
+# Live price/stock, merged into the context at answer time. Every worker
+# re-reads the rows a product save names in live_version (see signals.py),
+# and the whole table after PRODUCT_SNAPSHOT_MAX_AGE for edits that skip
+# the signals (queryset.update()).
+product_snapshot = ProductSnapshot(
+    _load_live_fields,
+    max_age=getattr(settings, 'PRODUCT_SNAPSHOT_MAX_AGE', 30),
+    version=live_version,
+    load_rows=_load_live_fields,
+)
+
+# Recent turns per chat session (Django session key or client session_id).
+# Held per worker process.
+conversation_memory = ConversationMemory(
+    max_sessions=getattr(settings, 'CHAT_MEMORY_SESSIONS', 1000),
+    max_turns=getattr(settings, 'CHAT_MEMORY_TURNS', 4),
+    idle_ttl=getattr(settings, 'CHAT_MEMORY_IDLE_TTL', 3600),
+)
+
+def _load_catalog():
+    from chat_app.models import Product
+    return list(Product.objects.values('id', 'name', 'gender', 'category', 'material', 'size', 'color'))
+
+# Answers catalog listings and attribute lookups straight from the Product
+# table, and picks k for everything else. Re-read like product_snapshot.
+intent_router = IntentRouter(
+    _load_catalog,
+    product_snapshot.get,
+    max_age=getattr(settings, 'PRODUCT_SNAPSHOT_MAX_AGE', 30),
+    not_found="Maaf, saya tidak punya informasi tentang produk tersebut.",
+)
+
+def _live_fields(doc):
+    live = product_snapshot.get(doc.metadata.get("id"))
+    return format_live_fields(live) if live else None
+
+# Keeps the prompt context under CONTEXT_TOKEN_BUDGET (dedup, then per-field truncation)
+context_builder = ContextBuilder(
+    budget=getattr(settings, 'CONTEXT_TOKEN_BUDGET', 1500),
+    live_fields=_live_fields,
+)
+
+# Per-stage timings of chat requests, for /metrics/ and the dashboard
+tracer = Tracer(window=getattr(settings, 'TRACE_WINDOW', 500))
 
 def format_docs(docs):
-    return "\n\n".join([d.page_content for d in docs])
+    with tracing.stage("context"):
+        return context_builder.build(docs)
+
+def _embed_queries(texts):
+    # One query_embed call for the whole batch (embed_query does one at a time)
+    return get_embeddings().embed_queries(texts)
+
+# Questions from concurrent requests arriving within a few ms of each other
+# are embedded together in one vectorized call.
+query_batcher = EmbeddingBatcher(
+    _embed_queries,
+    window_ms=getattr(settings, 'EMBED_BATCH_WINDOW_MS', 5),
+    max_batch=getattr(settings, 'EMBED_BATCH_MAX', 32),
+)
+
+def embed_query(question):
+    with tracing.stage("embed"):
+        return query_batcher.embed(question)
+
+def get_embeddings():
+    """
+    Returns the shared FastEmbed model, loading it on first use.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _registry_lock:
+            if _embeddings is None:
+                offline = use_offline_cache(MODEL_CACHE_DIR, EMBEDDING_MODEL_REPO, MODEL_OFFLINE)
+                with startup_profile.step("embeddings_import"):
+                    from rag_common.fastembed_embeddings import FastEmbedEmbeddings
+                with startup_profile.step("model_load"):
+                    _embeddings = FastEmbedEmbeddings(model_name=EMBEDDING_MODEL, cache_dir=MODEL_CACHE_DIR) # Lightweight model
+                print(f"Embedding model loaded from {MODEL_CACHE_DIR}{' (offline)' if offline else ''}.")
+    return _embeddings
+
+def preload_model():
+    """
+    Loads the embedding model before gunicorn --preload forks the workers,
+    so they share one copy of the weights (copy-on-write).
+
+    Only the model: the Chroma client, DB connections and the Groq client
+    don't survive a fork, so the chain is still built in each worker.
+    gc.freeze() keeps the workers' garbage collector from writing to (and
+    so copying) the pages of everything loaded so far.
+    """
+    get_embeddings()
+    gc.freeze()
 
-def get_rag_chain():
+def get_llm():
     """
-    Creates and returns the LangChain RAG pipeline.
+    Returns the shared LLM (LLM_PROVIDER/LLM_MODEL with a deadline and
+    hedging/fallback to LLM_FALLBACK_MODEL). Survives chain reloads.
     """
-    if not os.path.exists(PERSIST_DIRECTORY):
-        # Auto-ingest if missing
-        print(f"ChromaDB not found at {PERSIST_DIRECTORY}. Building index now...")
-        rebuild_index()
+    global _llm
+    if _llm is None:
+        with _registry_lock:
+            if _llm is None:
+                with startup_profile.step("llm"):
+                    _llm = build_llm(
+                        provider=getattr(settings, 'LLM_PROVIDER', 'groq'),
+                        model=getattr(settings, 'LLM_MODEL', 'llama-3.3-70b-versatile'),
+                        api_key=getattr(settings, 'GROQ_API_KEY', None),
+                        fallback_provider=getattr(settings, 'LLM_FALLBACK_PROVIDER', None),
+                        fallback_model=getattr(settings, 'LLM_FALLBACK_MODEL', 'llama-3.1-8b-instant'),
+                        timeout=getattr(settings, 'LLM_TIMEOUT', 20),
+                        max_retries=getattr(settings, 'LLM_MAX_RETRIES', 2),
+                        deadline=getattr(settings, 'LLM_DEADLINE', 30),
+                        hedge=getattr(settings, 'LLM_HEDGE', True),
+                        hedge_after=getattr(settings, 'LLM_HEDGE_AFTER', 8),
+                    )
+    return _llm
+
+def llm_stats():
+    # Without building the LLM just to report on it
+    return _llm.stats() if _llm is not None else None
+
+def get_vectorstore(embeddings, reload=False):
+    return open_vectorstore(VECTOR_BACKEND, PERSIST_DIRECTORY, embeddings, reload=reload)
+
+def get_ingest_embeddings():
+    """
+    Embeddings for indexing, backed by the on-disk embedding cache so text
+    that was embedded before is never re-embedded.
+    """
+    return CachedEmbeddings(get_embeddings(), EMBEDDING_MODEL, EMBEDDING_CACHE_PATH)
+
+def _build_chain():
+    # Returns the chain and the index_version it was built at
+    start = time.perf_counter()
+    with startup_profile.step("chain_build"):
+        if not os.path.exists(PERSIST_DIRECTORY):
+            # Auto-ingest if missing
+            print(f"Vector index not found at {PERSIST_DIRECTORY}. Building index now...")
+            rebuild_index(reload=False)
+        # Read before opening the index, so a write during the build means another rebuild
+        version = index_version.current()
+        chain = get_rag_chain(version)
+    elapsed = time.perf_counter() - start
+    with _stats_lock:
+        _chain_stats["last_build_seconds"] = round(elapsed, 3)
+    print(f"RAG chain built in {elapsed:.2f}s. {startup_profile.report()}")
+    return chain, version
+
+def _chain_is_stale():
+    # Any worker (or ingest) that writes to the index bumps the index_version
+    # file, so every worker notices on its next request.
+    return _rag_chain is None or _chain_version != index_version.current()
+
+def _chain_is_current(chain):
+    # False for a chain that was replaced, or is still serving while its
+    # replacement builds: its answers must not be cached for the new index.
+    # _set_chain swaps the chain before the version and this reads them the
+    # other way round, so a read racing a swap errs towards False.
+    version = _chain_version
+    return chain is _rag_chain and version == index_version.current()
+
+def _set_chain(chain, version):
+    global _rag_chain, _chain_version
+    with _registry_lock:
+        _rag_chain = chain
+        _chain_version = version
+
+def get_chain():
+    """
+    Returns the process-wide RAG chain, building it on first use.
+    Only the first caller in a worker pays the setup cost. When the index
+    has changed since the chain was built, whichever process changed it,
+    a fresh chain (new Chroma handle, BM25 brought up to date) is built
+    in the background and swapped in; requests keep the current chain
+    until then.
+    """
+    chain = _rag_chain
+    if chain is None:
+        with _registry_lock:
+            if _rag_chain is None:
+                _set_chain(*_build_chain())
+                with _stats_lock:
+                    _chain_stats["cold_builds"] += 1
+                return _rag_chain
+            chain = _rag_chain
+    elif _chain_is_stale():
+        _start_reload()
+
+    with _stats_lock:
+        _chain_stats["warm_hits"] += 1
+    return chain
+
+def _start_reload():
+    global _reload_thread
+    with _registry_lock:
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return
+        if _reload_failed_at is not None and time.monotonic() - _reload_failed_at < RELOAD_RETRY_SECONDS:
+            return
+        print("Vector index changed since the chain was built; reloading in the background.")
+        _reload_thread = threading.Thread(target=_reload_in_background, name="chain-reload", daemon=True)
+        _reload_thread.start()
+
+def _reload_in_background():
+    global _reload_failed_at
+    try:
+        with _reload_lock:
+            # reload_chain() may have caught up while this thread started
+            if _chain_is_stale():
+                _swap_chain(*_build_chain())
+        _reload_failed_at = None
+    except Exception as e:
+        _reload_failed_at = time.monotonic()
+        print(f"Chain reload failed, still serving the previous chain: {e}")
+
+def _swap_chain(chain, version):
+    _set_chain(chain, version)
+    with _stats_lock:
+        _chain_stats["reloads"] += 1
+
+def reload_chain():
+    """
+    Builds a fresh chain and swaps it in. Requests already running keep
+    the old chain; new requests pick up the new one.
+    """
+    with _reload_lock:
+        chain, version = _build_chain()
+        _swap_chain(chain, version)
+    return chain
+
+def warm_up():
+    """
+    Builds the chain ahead of the first chat request (e.g. at worker boot).
+    """
+    try:
+        get_chain()
+        return True
+    except Exception as e:
+        print(f"AI warm-up failed: {e}")
+        return False
 
+def chain_stats():
+    with _stats_lock:
+        stats = dict(_chain_stats)
+    stats["ready"] = _rag_chain is not None
+    stats["startup"] = startup_profile.report()
+    return stats
+
+def get_rag_chain(built_at=None):
+    """
+    Creates and returns the LangChain RAG pipeline. `built_at` is the
+    index_version it reads; its retrievals are only cached while that is
+    still the current version.
+    """
     # 1. Initialize Embeddings (FastEmbed - Lightweight, No Torch)
-    embeddings = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5") # Lightweight model
+    embeddings = get_embeddings()
 
-    # 2. Connect to Vector DB
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY, 
-        embedding_function=embeddings
-    )
+    # 2. Connect to Vector DB (re-read from disk: another worker may have written to it)
+    with startup_profile.step("index_open"):
+        vectorstore = get_vectorstore(embeddings, reload=True)
+    with startup_profile.step("bm25"):
+        bm25_index.replace_all(indexed_documents(vectorstore))
     
     # 3. Create Retriever
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 6})
+    # The chain accepts a plain question or {"question", "embedding", "filters"}
+    # so the query embedding computed for the answer cache is reused for search.
+    def with_embedding(inputs):
+        if isinstance(inputs, str):
+            return {"question": inputs, "embedding": embed_query(inputs), "filters": parse_question_filters(inputs)}
+        return inputs
+
+    def retrieve(inputs):
+        # Gender/category/price/stock constraints become a metadata pre-filter
+        where, has_candidates = build_where(inputs.get("filters") or {}, product_snapshot)
+        if not has_candidates:
+            return []
+        # The vector leg runs on a pool thread without the request's context
+        trace = tracing.current()
+
+        def vector_search(k, where):
+            with tracing.stage("vector_search", trace):
+                return vectorstore.similarity_search_by_vector(inputs["embedding"], k=k, filter=where)
+
+        # k comes from the intent router; 6 for a plain question
+        k = inputs.get("k") or 6
+        with tracing.stage("retrieve"):
+            docs = retrieval_cache.get(inputs["question"], where, k)
+            if docs is None:
+                # Vector and BM25 legs run concurrently and are fused by rank
+                docs = hybrid_search.search(vector_search, inputs["question"], k, where)
+                retrieval_cache.put(inputs["question"], where, k, docs, version=built_at)
+        return docs
+
+    retriever = RunnableLambda(retrieve)
 
     # 4. Define Prompt
     template = """You are a helpful product assistant. Answer the question based ONLY on the following context.
@@ -50,90 +416,268 @@ def get_rag_chain():
     Context:
     {context}
 
+    Conversation so far (use it to understand follow-up questions):
+    {history}
+
     Question: {question}
     """
     prompt = ChatPromptTemplate.from_template(template)
 
-    # 5. Initialize LLM (Groq)
-    groq_api_key = getattr(settings, 'GROQ_API_KEY', None)
-    if not groq_api_key:
-        return RunnablePassthrough() | (lambda x: "Error: GROQ_API_KEY is not set.")
+    # 5. Initialize LLM (Groq by default, see get_llm)
+    if getattr(settings, 'LLM_PROVIDER', 'groq') == 'groq' and not getattr(settings, 'GROQ_API_KEY', None):
+        return RunnablePassthrough() | (lambda x: {"answer": "Error: GROQ_API_KEY is not set.", "docs": []})
 
-    llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0, groq_api_key=groq_api_key)
+    # Timed into the request trace (time to first token when streaming)
+    llm = TracedRunnable(get_llm(), "llm", first_chunk="llm_first_token")
 
     # 6. Build Chain
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+    # Output is {"question", "embedding", "docs", "answer"}. The docs give
+    # the sources, and .stream() yields "answer" chunks as tokens arrive.
+    generate = (
+        {
+            "context": itemgetter("docs") | RunnableLambda(format_docs),
+            "question": itemgetter("question"),
+            "history": lambda x: x.get("history") or "(none)",
+        }
         | prompt
+        | RunnableLambda(context_builder.log_prompt)
         | llm
         | StrOutputParser()
     )
+    rag_chain = (
+        RunnableLambda(with_embedding)
+        | RunnablePassthrough.assign(docs=retriever)
+        | RunnablePassthrough.assign(answer=generate)
+    )
     
     return rag_chain
 
-def rebuild_index():
+def product_to_document(p):
     """
-    Rebuilds the ChromaDB index using data directly from Django Models to ensure freshness.
+    Renders a Product into the Document that gets embedded.
     """
-    print("Rebuilding Index from Django Database...")
+    content = f"Product Name: {p.name}. \n" \
+              f"Gender: {p.gender}. \n" \
+              f"Category: {p.category}. \n" \
+              f"Description: {p.description}. \n" \
+              f"Material: {p.material}. \n" \
+              f"Size: {p.size}. \n" \
+              f"Color: {p.color}."
+    
+    # Price and stock are not embedded; format_docs adds them live
+    metadata = {
+        "id": p.id,
+        "name": p.name,
+        "gender": p.gender,
+        "category": p.category
+    }
+    return Document(page_content=content, metadata=metadata)
+
+def rebuild_index(reload=True, progress=None):
+    """
+    Syncs the vector index with the Django Product table to ensure freshness.
+    Only new or changed products are re-embedded and removed ones are deleted;
+    the collection is never cleared, so live chat keeps working during a sync.
+    Unless reload is False, the process-wide chain is swapped when anything changed.
+    Products are streamed from the database and embedded INGEST_BATCH_SIZE
+    at a time; `progress(done, total)` is called after each batch.
+    Waits for any other write to the index, in this worker or another.
+    Returns counts of added, updated, unchanged and deleted products.
+    """
+    print("Syncing Index from Django Database...")
     
     # Avoid circular import by importing inside function
     from chat_app.models import Product
     
-    products = Product.objects.all()
-    documents = []
-    
-    for p in products:
-        content = f"Product Name: {p.name}. \n" \
-                  f"Gender: {p.gender}. \n" \
-                  f"Category: {p.category}. \n" \
-                  f"Description: {p.description}. \n" \
-                  f"Material: {p.material}. \n" \
-                  f"Size: {p.size}. \n" \
-                  f"Color: {p.color}. \n" \
-                  f"Price: ${p.price}."
-        
-        metadata = {
-            "id": p.id,
-            "name": p.name,
-            "price": float(p.price) if p.price else 0,
-            "stock": p.stock
-        }
-        documents.append(Document(page_content=content, metadata=metadata))
+    # Streamed from the database, so memory stays flat however big the catalog is
+    total = Product.objects.count()
+    if not total:
+        print("No products found in database to index.")
+    documents = (product_to_document(p) for p in Product.objects.order_by('id').iterator(chunk_size=2000))
 
-    # Initialize Embeddings
-    embeddings = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5")
+    # Loaded before taking the write lock: the model loads under _registry_lock,
+    # which a chain build holds while it waits for the write lock
+    embeddings = get_ingest_embeddings()
+    with index_write_lock(PERSIST_DIRECTORY):
+        vectorstore = get_vectorstore(embeddings, reload=True)
+        counts = sync_documents(vectorstore, documents, batch_size=INGEST_BATCH_SIZE, progress=progress, total=total)
+        index_changed = counts["added"] or counts["updated"] or counts["deleted"]
+        if index_changed:
+            index_version.bump()
+    counts["embedding_cache"] = embeddings.stats()
+    print(f"Index synced: {format_counts(counts)}.")
+    print(format_cache_stats(counts["embedding_cache"]))
+
+    # Price/stock-only changes land here without touching the index.
+    # Either bump drops every worker's cached answers.
+    live_changed = product_snapshot.refresh()
+    intent_router.refresh()
+    if live_changed:
+        live_version.bump()
+
+    # The chain build re-reads the BM25 keyword index from the collection
+    if index_changed and reload:
+        reload_chain()
+    elif index_changed:
+        bm25_index.replace_all(indexed_documents(vectorstore))
     
-    # Clear and Add
-    vectorstore = Chroma(
-        persist_directory=PERSIST_DIRECTORY, 
-        embedding_function=embeddings
+    return counts
+
+def update_products(product_ids, deleted_ids=()):
+    """
+    Re-indexes just the given products in one batched embed-and-upsert,
+    and removes deleted ones. Used by the background re-index queue.
+    Waits for any other write to the index, like rebuild_index().
+    """
+    from chat_app.models import Product
+
+    documents = [product_to_document(p) for p in Product.objects.filter(id__in=product_ids)]
+    embeddings = get_ingest_embeddings()
+    with index_write_lock(PERSIST_DIRECTORY):
+        vectorstore = get_vectorstore(embeddings, reload=True)
+        counts = apply_changes(vectorstore, documents, deleted_ids)
+        if counts["added"] or counts["updated"] or counts["deleted"]:
+            index_version.bump()
+    bm25_index.upsert(documents)
+    bm25_index.remove(deleted_ids)
+    intent_router.refresh()
+    return counts
+
+def get_sources(docs):
+    return [d.metadata.get("id") for d in docs]
+
+def parse_question_filters(question):
+    from chat_app.models import Product
+    return parse_filters(
+        question,
+        [value for value, _ in Product.GENDER_CHOICES],
+        [value for value, _ in Product.CATEGORY_CHOICES],
     )
-    
-    try:
-        vectorstore.delete_collection()
-        # Refresh client
-        vectorstore = Chroma(
-            persist_directory=PERSIST_DIRECTORY, 
-            embedding_function=embeddings
-        )
-    except Exception as e:
-        print(f"Warning during delete_collection: {e}")
 
-    if documents:
-        vectorstore.add_documents(documents=documents)
-        print(f"Index updated with {len(documents)} products.")
+def route_question(question, filters):
+    where, has_candidates = build_where(filters, product_snapshot)
+    return intent_router.route(question, lambda product: has_candidates and matches_where(product, where))
+
+def _lookup_cache(question, filters):
+    # Returns (cached result or None, chain input). Answers are only reused
+    # between questions with the same parsed filters.
+    query = {"question": question, "embedding": None, "filters": filters}
+    with tracing.stage("cache"):
+        cached = answer_cache.get_exact(question)
+    if cached is not None:
+        tracing.tag(cached=True)
+        return cached, query
+
+    query["embedding"] = embed_query(question)
+    with tracing.stage("cache"):
+        cached = answer_cache.get_similar(query["embedding"], scope=filters_key(filters))
+    tracing.tag(cached=cached is not None)
+    return cached, query
+
+def _remember(query, result, latency, chain):
+    # Nothing retrieved (no product matched the filters, or the chain is the
+    # missing-API-key stub): cheap to redo, and it would outlive the fix
+    if not result["sources"] or not _chain_is_current(chain):
+        return
+    answer_cache.put(query["question"], result, query["embedding"],
+                     latency=latency, scope=filters_key(query["filters"]))
+
+def _start_turn(question, session_id):
+    # Follow-ups are resolved against the session before routing and
+    # retrieval; the original question goes into the history.
+    with tracing.stage("route"):
+        history = conversation_memory.history(session_id)
+        standalone = conversation_memory.condense(session_id, question)
+        filters = parse_question_filters(standalone)
+        route = route_question(standalone, filters)
+    tracing.tag(intent=route.intent)
+    return standalone, filters, route, history
+
+def answer_question(question, session_id=None):
+    """
+    Answers through the answer cache. Only misses reach the LLM.
+    Returns {"answer": str, "sources": [product ids]}.
+    Listings and attribute lookups are answered by the intent router.
+    With a session_id, earlier turns of that session inform the answer.
+    """
+    start = time.perf_counter()
+    standalone, filters, route, history = _start_turn(question, session_id)
+    if route.answer is not None:
+        result = {"answer": route.answer, "sources": route.sources}
     else:
-        print("No products found in database to index.")
-    
-    return True
+        cached, query = _lookup_cache(standalone, filters)
+        if cached is not None:
+            result = cached
+        else:
+            query["k"] = route.k
+            query["history"] = history
+            chain = get_chain()
+            chain_start = time.perf_counter()
+            output = chain.invoke(query)
+            result = {"answer": output["answer"], "sources": get_sources(output["docs"])}
+            _remember(query, result, time.perf_counter() - chain_start, chain)
+
+    conversation_memory.add_turn(session_id, question, result["answer"], standalone)
+    intent_router.record(route.intent, time.perf_counter() - start)
+    return result
+
+def stream_answer(question, session_id=None):
+    """
+    Streaming version of answer_question. Yields {"type": "token", "text": ...}
+    events as the LLM produces them, then one {"type": "sources", ...} event.
+    Time to first token and total time are logged separately.
+    """
+    start = time.perf_counter()
+    first_token = None
+    route = None
+    try:
+        standalone, filters, route, history = _start_turn(question, session_id)
+        if route.answer is not None:
+            first_token = time.perf_counter() - start
+            conversation_memory.add_turn(session_id, question, route.answer, standalone)
+            yield {"type": "token", "text": route.answer}
+            yield {"type": "sources", "sources": route.sources, "cached": False}
+            return
+
+        cached, query = _lookup_cache(standalone, filters)
+        if cached is not None:
+            first_token = time.perf_counter() - start
+            conversation_memory.add_turn(session_id, question, cached["answer"], standalone)
+            yield {"type": "token", "text": cached["answer"]}
+            yield {"type": "sources", "sources": cached["sources"], "cached": True}
+            return
+
+        query["k"] = route.k
+        query["history"] = history
+        chain = get_chain()
+        sources, parts = [], []
+        for chunk in chain.stream(query):
+            if "docs" in chunk:
+                sources = get_sources(chunk["docs"])
+            if chunk.get("answer"):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(chunk["answer"])
+                yield {"type": "token", "text": chunk["answer"]}
+
+        result = {"answer": "".join(parts), "sources": sources}
+        _remember(query, result, time.perf_counter() - start, chain)
+        conversation_memory.add_turn(session_id, question, result["answer"], standalone)
+        yield {"type": "sources", "sources": sources, "cached": False}
+    except Exception as e:
+        yield {"type": "error", "error": f"Error processing request: {str(e)}"}
+    finally:
+        total = time.perf_counter() - start
+        if route is not None:
+            intent_router.record(route.intent, total)
+        ttft = f"{first_token:.3f}s" if first_token is not None else "n/a"
+        print(f"Chat stream: time to first token {ttft}, total {total:.3f}s")
 
 def get_answer(question):
     """
     Simple wrapper to get answer.
     """
     try:
-        chain = get_rag_chain()
-        return chain.invoke(question)
+        return answer_question(question)["answer"]
     except Exception as e:
         return f"Error processing request: {str(e)}"
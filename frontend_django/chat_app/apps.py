@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ChatAppConfig(AppConfig):
+    name = 'chat_app'
+
+    def ready(self):
+        # Product save/delete -> background re-index queue
+        from . import signals  # noqa: F401
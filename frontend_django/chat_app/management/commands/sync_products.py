@@ -3,60 +3,82 @@ import os
 from django.core.management.base import BaseCommand
 from chat_app.models import Product
 
+
+def product_record(p):
+    return {
+        "id": p.id,
+        "name": p.name,
+        "description": p.description,
+        "attributes": {
+            "material": p.material,
+            "size": p.size,
+            "color": p.color,
+            "gender": p.gender,
+            "category": p.category
+        },
+        "price": float(p.price),
+        "stock": p.stock,
+        "image_url": p.image.url if p.image else ""
+    }
+
+
+def export_products(chunk_size=2000):
+    """
+    Writes every Product to backend_fastapi/sample_data.jsonl for the FastAPI
+    ingest, one JSON object per line. Products are streamed from the
+    database `chunk_size` rows at a time and written to a temp file that
+    replaces the old export in one step, so the ingest never reads a
+    half-written catalog. Returns (product count, path).
+    """
+    # Path to backend_fastapi/sample_data.jsonl
+    # File is in: frontend_django/chat_app/management/commands/sync_products.py
+    # We need to go up 5 levels to get to rag_chatbot root
+    
+    current_file = os.path.abspath(__file__) # .../commands/sync_products.py
+    commands_dir = os.path.dirname(current_file) # .../commands
+    management_dir = os.path.dirname(commands_dir) # .../management
+    chat_app_dir = os.path.dirname(management_dir) # .../chat_app
+    frontend_dir = os.path.dirname(chat_app_dir) # .../frontend_django
+    project_root = os.path.dirname(frontend_dir) # .../rag_chatbot
+    
+    json_path = os.path.join(project_root, 'backend_fastapi', 'sample_data.jsonl')
+    tmp_path = f"{json_path}.{os.getpid()}.tmp"
+
+    count = 0
+    try:
+        with open(tmp_path, 'w') as f:
+            for p in Product.objects.order_by('id').iterator(chunk_size=chunk_size):
+                f.write(json.dumps(product_record(p)) + "\n")
+                count += 1
+        os.replace(tmp_path, json_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return count, json_path
+
+
 class Command(BaseCommand):
-    help = 'Syncs Django Product DB to backend_fastapi/sample_data.json for RAG ingestion'
+    help = 'Syncs Django Product DB to backend_fastapi/sample_data.jsonl for RAG ingestion'
 
     def handle(self, *args, **options):
-        products = Product.objects.all()
-        data = []
-        
-        for p in products:
-            item = {
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "attributes": {
-                    "material": p.material,
-                    "size": p.size,
-                    "color": p.color,
-                    "gender": p.gender,
-                    "category": p.category
-                },
-                "price": float(p.price),
-                "stock": p.stock,
-                "image_url": p.image.url if p.image else ""
-            }
-            data.append(item)
-            
-        # Path to backend_fastapi/sample_data.json
-        # File is in: frontend_django/chat_app/management/commands/sync_products.py
-        # We need to go up 5 levels to get to rag_chatbot root
-        
-        current_file = os.path.abspath(__file__) # .../commands/sync_products.py
-        commands_dir = os.path.dirname(current_file) # .../commands
-        management_dir = os.path.dirname(commands_dir) # .../management
-        chat_app_dir = os.path.dirname(management_dir) # .../chat_app
-        frontend_dir = os.path.dirname(chat_app_dir) # .../frontend_django
-        project_root = os.path.dirname(frontend_dir) # .../rag_chatbot
-        
-        json_path = os.path.join(project_root, 'backend_fastapi', 'sample_data.json')
-        
-        with open(json_path, 'w') as f:
-            json.dump(data, f, indent=4)
+        count, json_path = export_products()
             
-        self.stdout.write(self.style.SUCCESS(f'Successfully synced {len(data)} products to {json_path}'))
+        self.stdout.write(self.style.SUCCESS(f'Successfully synced {count} products to {json_path}'))
 
         # 2. Trigger Internal AI Engine Rebuild
         try:
             from chat_app.ai_engine import rebuild_index
+            from rag_common.index_sync import format_counts
+            from rag_common.embedding_cache import format_cache_stats
             self.stdout.write("Triggering Internal AI Index Rebuild...")
             
-            success = rebuild_index()
+            counts = rebuild_index()
             
-            if success:
-                self.stdout.write(self.style.SUCCESS('✅ AI Brain Updated Successfully (Internal)!'))
-            else:
-                self.stdout.write(self.style.WARNING('⚠️ AI Rebuild verification returned False.'))
+            self.stdout.write(f"Index sync: {format_counts(counts)}")
+            self.stdout.write(format_cache_stats(counts["embedding_cache"]))
+            self.stdout.write(self.style.SUCCESS('✅ AI Brain Updated Successfully (Internal)!'))
                 
         except Exception as e:
             self.stdout.write(self.style.WARNING(f'Could not update AI Index: {e}'))
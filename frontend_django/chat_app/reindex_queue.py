@@ -0,0 +1,132 @@
+import threading
+import time
+
+
+class ReindexQueue:
+    """
+    Debounced in-process queue of product IDs waiting to be re-indexed.
+
+    A daemon worker thread waits until edits stop arriving for `debounce`
+    seconds (or `max_wait` seconds have passed since the first pending edit),
+    then hands the whole burst to `flush(upsert_ids, deleted_ids)` as one batch.
+
+    A batch whose flush fails goes back into the queue (edits made since
+    win) and is retried after `retry_delay` seconds, doubling on each
+    consecutive failure up to `max_retry_delay`.
+
+    Pending edits live in memory only. If the process exits before a flush,
+    the "Sync to AI" button still brings the index up to date.
+    """
+
+    def __init__(self, flush, debounce=2.0, max_wait=10.0, retry_delay=5.0, max_retry_delay=300.0):
+        self.flush = flush
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._cond = threading.Condition()
+        self._pending = {}  # product id -> True if deleted
+        self._first_enqueue = 0.0
+        self._last_enqueue = 0.0
+        self._retry_at = 0.0
+        self._failures = 0  # consecutive failed flushes
+        self._in_flight = 0
+        self._worker = None
+        self._stats = {
+            "flushes": 0,
+            "retries": 0,
+            "last_flush_at": None,
+            "last_batch_size": 0,
+            "last_counts": None,
+            "last_error": None,
+        }
+
+    def enqueue(self, product_id, deleted=False):
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_enqueue = now
+            self._last_enqueue = now
+            self._pending[product_id] = deleted
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="reindex-queue", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Debounce: let a burst of edits settle before flushing it
+            while True:
+                now = time.monotonic()
+                if now < self._retry_at:
+                    self._cond.wait(self._retry_at - now)
+                    continue
+                quiet_for = now - self._last_enqueue
+                waited = now - self._first_enqueue
+                if quiet_for >= self.debounce or waited >= self.max_wait:
+                    break
+                self._cond.wait(min(self.debounce - quiet_for, self.max_wait - waited))
+            batch, self._pending = self._pending, {}
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            upsert_ids = [pid for pid, deleted in batch.items() if not deleted]
+            deleted_ids = [pid for pid, deleted in batch.items() if deleted]
+            try:
+                counts = self.flush(upsert_ids, deleted_ids)
+                error = None
+            except Exception as e:
+                counts, error = None, str(e)
+            with self._cond:
+                self._in_flight = 0
+                if error is None:
+                    self._failures = 0
+                else:
+                    delay = min(self.retry_delay * 2 ** self._failures, self.max_retry_delay)
+                    self._failures += 1
+                    print(f"Background re-index failed, retrying {len(batch)} products in {delay:.0f}s: {error}")
+                    if not self._pending:
+                        self._first_enqueue = self._last_enqueue = time.monotonic()
+                    for pid, deleted in batch.items():
+                        self._pending.setdefault(pid, deleted)
+                    self._retry_at = time.monotonic() + delay
+                    self._stats["retries"] += 1
+                self._stats["flushes"] += 1
+                self._stats["last_flush_at"] = time.time()
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["last_counts"] = counts
+                self._stats["last_error"] = error
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._pending) + self._in_flight
+        if stats["last_flush_at"] is not None:
+            stats["seconds_since_flush"] = round(time.time() - stats["last_flush_at"], 1)
+        else:
+            stats["seconds_since_flush"] = None
+        return stats
+
+
+def _flush(upsert_ids, deleted_ids):
+    # Imported here so saving a Product never loads the AI stack itself
+    from .ai_engine import update_products
+    return update_products(upsert_ids, deleted_ids)
+
+
+def _build_queue():
+    from django.conf import settings
+    return ReindexQueue(
+        _flush,
+        debounce=getattr(settings, 'AI_REINDEX_DEBOUNCE_SECONDS', 2.0),
+        max_wait=getattr(settings, 'AI_REINDEX_MAX_WAIT_SECONDS', 10.0),
+        retry_delay=getattr(settings, 'AI_REINDEX_RETRY_SECONDS', 5.0),
+    )
+
+
+reindex_queue = _build_queue()
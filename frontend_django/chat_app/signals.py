@@ -0,0 +1,63 @@
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from rag_common.product_snapshot import LiveVersion
+from .models import Product
+from .reindex_queue import reindex_queue
+
+# Bumped with the product's id whenever its price or stock changes. It's a
+# file, so every worker (not just this one) re-reads that row and drops its
+# cached answers on its next chat request; see ai_engine.product_snapshot.
+live_version = LiveVersion(getattr(settings, 'LIVE_VERSION_PATH', os.path.join(settings.BASE_DIR, 'live_version')))
+
+# Fields that go into the embedded text (ai_engine.product_to_document)
+INDEXED_FIELDS = ('name', 'gender', 'category', 'description', 'material', 'size', 'color')
+LIVE_FIELDS = ('price', 'stock')
+
+
+@receiver(pre_save, sender=Product)
+def remember_saved_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The row as it was before this save, to tell what the save changes.
+    # None = unknown (new row), so everything counts as changed.
+    instance._fields_before = None
+    if raw or instance.pk is None or not getattr(settings, 'AI_AUTO_REINDEX', True):
+        return
+    fields = INDEXED_FIELDS + LIVE_FIELDS
+    if update_fields is not None:
+        fields = [f for f in fields if f in update_fields]
+        if not fields:
+            instance._fields_before = {}  # e.g. only the image was saved
+            return
+    instance._fields_before = Product.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def _changed(instance, fields):
+    before = getattr(instance, '_fields_before', None)
+    if before is None:
+        return True
+    return any(f in before and before[f] != getattr(instance, f) for f in fields)
+
+
+@receiver(post_save, sender=Product)
+def queue_product_reindex(sender, instance, created=False, raw=False, **kwargs):
+    # Skip fixture loading (raw saves) and wait for the edit to commit
+    if raw or not getattr(settings, 'AI_AUTO_REINDEX', True):
+        return
+    product_id = instance.pk
+    # Price/stock are served live, so they apply right away without a re-index
+    if created or _changed(instance, LIVE_FIELDS):
+        transaction.on_commit(lambda: live_version.bump([product_id]))
+    if created or _changed(instance, INDEXED_FIELDS):
+        transaction.on_commit(lambda: reindex_queue.enqueue(product_id))
+
+
+@receiver(post_delete, sender=Product)
+def queue_product_removal(sender, instance, **kwargs):
+    if not getattr(settings, 'AI_AUTO_REINDEX', True):
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: live_version.bump([product_id]))
+    transaction.on_commit(lambda: reindex_queue.enqueue(product_id, deleted=True))
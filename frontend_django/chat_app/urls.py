@@ -9,4 +9,6 @@ urlpatterns = [
     path('dashboard/update/<int:pk>/', views.product_update, name='product_update'),
     path('dashboard/delete/<int:pk>/', views.product_delete, name='product_delete'),
     path('dashboard/sync/', views.trigger_sync, name='trigger_sync'),
+    path('dashboard/sync/<str:job_id>/', views.sync_status, name='sync_status'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,10 +1,18 @@
 import json
+import sys
+import uuid
 import requests
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
 from django.conf import settings
 from django.views.decorators.csrf import ensure_csrf_cookie
-from .ai_engine import get_answer  # Direct Import
+# The AI engine (LangChain, FastEmbed) is imported on the first chat request
+# or by the warm-up in wsgi.py, not when a worker boots
+
+
+def _loaded_ai_engine():
+    # The engine module if this worker has already imported it, else None
+    return sys.modules.get('chat_app.ai_engine')
 
 @ensure_csrf_cookie
 def home(request):
@@ -29,13 +37,53 @@ def chat_view(request):
         if not question:
             return JsonResponse({"error": "No question provided"}, status=400)
 
+        from .ai_engine import answer_question, stream_answer, tracer  # Direct Import
+
+        # Conversation memory is keyed by the browser's Django session,
+        # unless the client sends its own session_id
+        session_id = data.get('session_id')
+        if not session_id:
+            if not request.session.session_key:
+                request.session.save()
+            session_id = request.session.session_key
+
+        # Traced per stage under this ID and sent back as X-Request-ID. The
+        # FastAPI backend honours the same header, so one ID spans both logs.
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+        # Streaming mode: newline-delimited JSON events, tokens first, sources last
+        if data.get('stream'):
+            def events():
+                trace = tracer.start(request_id, '/chat/stream', question)
+                error, cancelled = None, False
+                try:
+                    for event in stream_answer(question, session_id):
+                        if event["type"] == "error":
+                            error = event["error"]
+                        yield json.dumps(event) + "\n"
+                except GeneratorExit:
+                    # The client disconnected and the server closed the stream
+                    cancelled = True
+                    raise
+                finally:
+                    tracer.finish(trace, error, cancelled)
+                    print(f"[{request_id}] {trace.summary()}")
+
+            response = StreamingHttpResponse(events(), content_type='application/x-ndjson')
+            response['X-Request-ID'] = request_id
+            return response
+
         # Call AI Engine Directly (Single Server Mode)
         # This runs inside the Django process
         try:
-            answer = get_answer(question)
-            return JsonResponse({"answer": answer})
+            with tracer.request(request_id, '/chat', question) as trace:
+                result = answer_question(question, session_id)
+            print(f"[{request_id}] {trace.summary()}")
+            response = JsonResponse({"answer": result["answer"], "sources": result["sources"]})
         except Exception as e:
-            return JsonResponse({"error": f"AI Error: {str(e)}"}, status=500)
+            response = JsonResponse({"error": f"AI Error: {str(e)}"}, status=500)
+        response['X-Request-ID'] = request_id
+        return response
 
     # For GET requests, render the HTML template
     # Load product data from Database
@@ -64,12 +112,30 @@ def chat_view(request):
 
 # --- Custom Admin / Dashboard Views ---
 from django.shortcuts import redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from .forms import ProductForm
-from django.core.management import call_command
 from .models import Product, SiteConfig  # Import Product and SiteConfig globally
-import io
+from .reindex_queue import reindex_queue
+from rag_common.ingest_jobs import IngestJobs
+from rag_common.index_sync import format_counts
+from django.db import connection
+
+def _run_sync(job):
+    # Runs on the sync worker thread, off the request
+    from .management.commands.sync_products import export_products
+    from .ai_engine import rebuild_index
+    try:
+        job.phase = "exporting"
+        export_products()
+        return rebuild_index(progress=job.progress)
+    finally:
+        # The thread opened its own DB connection
+        connection.close()
+
+# "Sync to AI" jobs: one at a time across workers, state on disk so any worker can answer a poll
+sync_jobs = IngestJobs(_run_sync, state_dir=getattr(settings, 'AI_SYNC_JOBS_DIR', None))
 
 def is_admin(user):
     return user.is_authenticated and user.is_staff
@@ -88,7 +154,38 @@ def dashboard(request):
             messages.success(request, f"Theme updated to: {new_theme}")
             return redirect('dashboard')
             
-    return render(request, 'chat_app/dashboard.html', {'products': products, 'config': config})
+    context = {
+        'products': products,
+        'config': config,
+        'queue_stats': reindex_queue.stats(),
+        'sync_job': request.GET.get('sync_job', ''),
+    }
+    # Reporting on the AI engine shouldn't be what loads it in this worker
+    ai = _loaded_ai_engine()
+    if ai is not None:
+        context.update({
+            'ai_loaded': True,
+            'ai_stats': ai.chain_stats(),
+            'cache_stats': ai.answer_cache.stats(),
+            'embed_stats': ai.query_batcher.stats(),
+            'retrieval_stats': ai.hybrid_search.stats(),
+            'retrieval_cache_stats': ai.retrieval_cache.stats(),
+            'context_stats': ai.context_builder.stats(),
+            'router_stats': ai.intent_router.stats(),
+            'llm_stats': ai.llm_stats(),
+            'memory_stats': ai.conversation_memory.stats(),
+            'trace_stats': ai.tracer.stats(),
+            'slowest_requests': ai.tracer.slowest(5),
+        })
+    return render(request, 'chat_app/dashboard.html', context)
+
+def metrics(request):
+    """
+    Per-stage chat latency histograms in the Prometheus text format (this worker only).
+    """
+    ai = _loaded_ai_engine()
+    body = ai.tracer.prometheus() if ai is not None else ''
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
 
 @user_passes_test(is_admin)
 def product_create(request):
@@ -126,17 +223,28 @@ def product_delete(request, pk):
 
 @user_passes_test(is_admin)
 def trigger_sync(request):
-    try:
-        out = io.StringIO()
-        call_command('sync_products', stdout=out)
-        result = out.getvalue()
-        
-        if "WARNING" in result or "Could not update AI" in result:
-             messages.warning(request, f"Database synced, but AI update failed: {result}")
-        else:
-             messages.success(request, "✅ Database Synced & AI Brain Refreshed Successfully!")
-             
-    except Exception as e:
-        messages.error(request, f"Sync failed: {str(e)}")
-    
-    return redirect('dashboard')
+    """
+    Starts a full sync (export to sample_data.jsonl + index rebuild) in the
+    background and returns to the dashboard, which polls sync_status.
+    Clicking again while a sync is waiting to start joins that sync.
+    """
+    job, coalesced = sync_jobs.submit()
+    if coalesced:
+        messages.info(request, "An AI sync is already queued; it will include your latest changes.")
+    else:
+        messages.info(request, "AI sync started in the background.")
+    return redirect(f"{reverse('dashboard')}?sync_job={job['id']}")
+
+@user_passes_test(is_admin)
+def sync_status(request, job_id):
+    """
+    Progress of a "Sync to AI" job as JSON: phase, products embedded out of
+    the total, docs/sec and ETA, and the sync counts once finished.
+    """
+    job = sync_jobs.get(job_id)
+    if job is None:
+        return JsonResponse({"error": "Unknown sync job"}, status=404)
+    if job["result"]:
+        # e.g. "1 added, 2 updated, 40 unchanged, 0 deleted"
+        job["summary"] = format_counts(job["result"])
+    return JsonResponse(job)
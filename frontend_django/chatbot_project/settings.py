@@ -1,9 +1,13 @@
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Modules shared with the FastAPI backend live in ../rag_common
+sys.path.insert(0, str(BASE_DIR.parent))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
@@ -122,4 +126,63 @@ LOGIN_URL = '/admin/login/'
 
 # AI Configuration
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
+# LLM provider ('groq', 'openai', 'google' or 'fake' for tests/benchmarks)
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'groq')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'llama-3.3-70b-versatile')
+# Secondary model for failures and hedged requests (empty disables it)
+LLM_FALLBACK_PROVIDER = os.environ.get('LLM_FALLBACK_PROVIDER') or None
+LLM_FALLBACK_MODEL = os.environ.get('LLM_FALLBACK_MODEL', 'llama-3.1-8b-instant')
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 20))  # per HTTP request
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+LLM_DEADLINE = float(os.environ.get('LLM_DEADLINE', 30))  # per answer, retries included
+# Hedge to the fallback once the primary is slower than its p95 (LLM_HEDGE_AFTER until known)
+LLM_HEDGE = os.environ.get('LLM_HEDGE', 'True') == 'True'
+LLM_HEDGE_AFTER = float(os.environ.get('LLM_HEDGE_AFTER', 8))
 CHROMA_DB_PATH = os.path.join(BASE_DIR, 'chroma_db')
+NUMPY_INDEX_PATH = os.path.join(BASE_DIR, 'numpy_index')
+# On-disk cache of product embeddings, keyed by model + text hash
+EMBEDDING_CACHE_PATH = os.path.join(BASE_DIR, 'embedding_cache.sqlite3')
+# Bumped on every index write; keys the retrieval cache across workers
+INDEX_VERSION_PATH = os.path.join(BASE_DIR, 'index_version')
+# Bumped on every product save/delete; workers re-read price/stock and drop cached answers
+LIVE_VERSION_PATH = os.path.join(BASE_DIR, 'live_version')
+RETRIEVAL_CACHE_SIZE = int(os.environ.get('RETRIEVAL_CACHE_SIZE', 1024))
+# Max tokens of product context per prompt (near-duplicates dropped, long fields cut)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 1500))
+# Conversation memory for follow-up questions (per worker, LRU over sessions)
+CHAT_MEMORY_SESSIONS = int(os.environ.get('CHAT_MEMORY_SESSIONS', 1000))
+CHAT_MEMORY_TURNS = int(os.environ.get('CHAT_MEMORY_TURNS', 4))
+CHAT_MEMORY_IDLE_TTL = int(os.environ.get('CHAT_MEMORY_IDLE_TTL', 3600))
+# Recent chat requests kept per worker for the slowest-requests view
+TRACE_WINDOW = int(os.environ.get('TRACE_WINDOW', 500))
+# Build the RAG chain when a worker boots instead of on the first chat message
+AI_WARMUP_ON_STARTUP = os.environ.get('AI_WARMUP_ON_STARTUP', 'False') == 'True'
+# Embedding model weights; 'auto' loads them without a network check once cached
+AI_MODEL_CACHE_DIR = os.environ.get('AI_MODEL_CACHE_DIR', os.path.join(BASE_DIR, 'model_cache'))
+AI_MODEL_OFFLINE = os.environ.get('AI_MODEL_OFFLINE', 'auto')
+# Load the embedding model in the gunicorn master so forked workers share it (see gunicorn.conf.py)
+AI_PRELOAD_MODEL = os.environ.get('AI_PRELOAD_MODEL', 'False') == 'True'
+# Answer cache in front of the LLM (exact question + embedding similarity)
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 512))
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 3600))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', 0.95))
+# Re-index products in the background after admin edits (debounced, batched)
+AI_AUTO_REINDEX = os.environ.get('AI_AUTO_REINDEX', 'True') == 'True'
+AI_REINDEX_DEBOUNCE_SECONDS = float(os.environ.get('AI_REINDEX_DEBOUNCE_SECONDS', 2.0))
+AI_REINDEX_MAX_WAIT_SECONDS = float(os.environ.get('AI_REINDEX_MAX_WAIT_SECONDS', 10.0))
+# First retry of a failed re-index batch; doubles per consecutive failure (max 5 min)
+AI_REINDEX_RETRY_SECONDS = float(os.environ.get('AI_REINDEX_RETRY_SECONDS', 5.0))
+# "Sync to AI" runs as a background job; its progress is shared between workers here
+AI_SYNC_JOBS_DIR = os.path.join(BASE_DIR, 'sync_jobs')
+# Products embedded and written per chunk during a full sync
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 256))
+# Query embedding micro-batching across concurrent chat requests
+EMBED_BATCH_WINDOW_MS = float(os.environ.get('EMBED_BATCH_WINDOW_MS', 5))
+EMBED_BATCH_MAX = int(os.environ.get('EMBED_BATCH_MAX', 32))
+# Seconds before a worker re-reads live price/stock from the database
+PRODUCT_SNAPSHOT_MAX_AGE = float(os.environ.get('PRODUCT_SNAPSHOT_MAX_AGE', 30))
+# Fuse BM25 keyword search with vector search (reciprocal-rank fusion)
+HYBRID_SEARCH = os.environ.get('HYBRID_SEARCH', 'True') == 'True'
+RRF_K = int(os.environ.get('RRF_K', 60))
+# Vector index: 'chroma', or 'numpy' for in-memory exact search on small/medium catalogs
+VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'chroma')
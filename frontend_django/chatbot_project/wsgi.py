@@ -5,3 +5,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatbot_project.settings')
 
 application = get_wsgi_application()
+
+# Optionally build the RAG chain now so the first chat request is warm
+from django.conf import settings
+
+if settings.AI_PRELOAD_MODEL:
+    # Under gunicorn --preload this runs once, in the master, and the workers
+    # share the model. The chain can't be shared across the fork, so the
+    # warm-up runs in each worker instead (post_worker_init in gunicorn.conf.py).
+    from chat_app.ai_engine import preload_model
+    preload_model()
+elif settings.AI_WARMUP_ON_STARTUP:
+    from chat_app.ai_engine import warm_up
+    warm_up()
@@ -0,0 +1,17 @@
+import os
+
+# Read by gunicorn from the working directory:
+#   gunicorn chatbot_project.wsgi:application
+
+# AI_PRELOAD_MODEL=True: load the app (and with it the embedding model, see
+# wsgi.py) once in the master, then fork the workers so they share the model
+preload_app = os.environ.get('AI_PRELOAD_MODEL', 'False') == 'True'
+
+
+def post_worker_init(worker):
+    # wsgi.py skips the warm-up when preloading; build the chain per worker
+    from django.conf import settings
+
+    if settings.AI_PRELOAD_MODEL and settings.AI_WARMUP_ON_STARTUP:
+        from chat_app.ai_engine import warm_up
+        warm_up()
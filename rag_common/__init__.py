@@ -0,0 +1,5 @@
+"""
+Modules shared by the FastAPI backend and the Django app's in-process AI
+engine. Both apps put the repository root on sys.path to import them
+(backend_fastapi/rag_engine.py, frontend_django/chatbot_project/settings.py).
+"""
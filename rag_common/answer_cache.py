@@ -0,0 +1,158 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question):
+    """
+    Lowercases, collapses whitespace and drops trailing punctuation so that
+    "List all products?" and "list all products" share a cache entry.
+    """
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Two-layer cache for LLM answers.
+
+    Layer 1 matches the exact normalized question.
+    Layer 2 matches the query embedding (already computed for retrieval)
+    against cached questions by cosine similarity. An optional `scope`
+    (e.g. the parsed filters) must also be equal, so "under $50" never
+    reuses the answer for "under $80".
+
+    Entries are evicted least-recently-used once max_size is reached and
+    expire after ttl seconds. `versions` are IndexVersion-like objects
+    (anything with current()); when one of them moves, e.g. because
+    another worker re-indexed, every entry is dropped. clear() only
+    empties this process's cache.
+    """
+
+    def __init__(self, max_size=512, ttl=3600, threshold=0.95, versions=()):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.versions = tuple(versions)
+        self._lock = threading.Lock()
+        self._version = None
+        # normalized question -> (answer, unit vector or None, created_at, latency, scope)
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self._matrix_scopes = []
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "latency_saved_seconds": 0.0,
+        }
+
+    def _check_version(self):
+        # Caller holds the lock
+        version = tuple(v.current() for v in self.versions)
+        if version != self._version:
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expired(self, entry, now):
+        return self.ttl and now - entry[2] > self.ttl
+
+    def _hit(self, key, entry, kind):
+        self._entries.move_to_end(key)
+        self._stats[kind] += 1
+        self._stats["latency_saved_seconds"] += entry[3]
+        return entry[0]
+
+    def _rebuild_matrix(self):
+        keys = [k for k, e in self._entries.items() if e[1] is not None]
+        self._matrix_keys = keys
+        self._matrix_scopes = [self._entries[k][4] for k in keys]
+        if keys:
+            self._matrix = np.vstack([self._entries[k][1] for k in keys])
+        else:
+            self._matrix = None
+
+    def get_exact(self, question):
+        """
+        Layer 1 lookup. Cheap enough to run before the question is embedded.
+        Does not count a miss, since the semantic layer may still hit.
+        """
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                del self._entries[key]
+                self._matrix = None
+                return None
+            return self._hit(key, entry, "exact_hits")
+
+    def get_similar(self, embedding, scope=None):
+        """
+        Layer 2 lookup against the query embedding. Counts a miss if nothing
+        in the same scope is close enough.
+        """
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            if self._entries:
+                if self._matrix is None:
+                    self._rebuild_matrix()
+                if self._matrix is not None:
+                    scores = self._matrix @ _unit(embedding)
+                    in_scope = np.array([sc == scope for sc in self._matrix_scopes])
+                    scores = np.where(in_scope, scores, -1.0)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        key = self._matrix_keys[best]
+                        entry = self._entries.get(key)
+                        if entry is not None and not self._expired(entry, now):
+                            return self._hit(key, entry, "semantic_hits")
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, question, answer, embedding=None, latency=0.0, scope=None):
+        """
+        Stores an answer together with how long it took to produce.
+        """
+        key = normalize_question(question)
+        vector = _unit(embedding) if embedding is not None else None
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (answer, vector, time.time(), latency, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._matrix_keys = []
+            self._matrix_scopes = []
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        total = hits + stats["misses"]
+        stats["hit_ratio"] = round(hits / total, 3) if total else 0.0
+        stats["latency_saved_seconds"] = round(stats["latency_saved_seconds"], 3)
+        return stats
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,170 @@
+import re
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # the Django app doesn't ship tiktoken
+    tiktoken = None
+
+# Fields cut when the context is over budget, in order, down to the given
+# number of tokens. Name, gender and category are never cut.
+TRUNCATE_STEPS = [
+    ("Description", 60),
+    ("Description", 20),
+    ("Material", 12),
+    ("Color", 12),
+    ("Size", 12),
+]
+
+_FIELD = re.compile(r"^(\s*)([A-Za-z ]+): (.*?)(\.?\s*)$")
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken's cl100k_base. Groq's Llama tokenizer is
+    different, but close enough for budgeting. Without tiktoken it falls
+    back to ~4 characters per token.
+    """
+
+    def __init__(self, encoding="cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:  # the BPE file is fetched on first use
+                print(f"tiktoken unavailable ({e}); estimating token counts.")
+        self.name = "tiktoken" if self._encoding is not None else "estimate"
+
+    def count(self, text):
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text))
+
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            return text if len(text) <= max_tokens * 4 else text[:max_tokens * 4].rstrip() + "…"
+        tokens = self._encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens]).rstrip() + "…"
+
+
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+class ContextBuilder:
+    """
+    Turns retrieved documents into the prompt context under a token budget.
+
+    Documents stay in relevance order. A document whose words overlap an
+    earlier one by at least `dedup_threshold` (Jaccard) is skipped. If the
+    result is still over `budget` tokens, fields are cut per TRUNCATE_STEPS,
+    and as a last resort the least relevant documents are dropped (the top
+    one always stays).
+
+    `live_fields(doc)` returns text appended to a document that is never
+    cut (price and stock).
+    """
+
+    def __init__(self, budget=1500, dedup_threshold=0.9, live_fields=None, counter=None):
+        self.budget = budget
+        self.dedup_threshold = dedup_threshold
+        self.live_fields = live_fields or (lambda doc: None)
+        self.counter = counter or TokenCounter()
+        self._lock = threading.Lock()
+        self._totals = {
+            "contexts": 0, "full_tokens": 0, "context_tokens": 0,
+            "deduped": 0, "truncated": 0, "dropped": 0,
+            "prompts": 0, "prompt_tokens": 0,
+        }
+
+    def _dedupe(self, docs):
+        kept, seen = [], []
+        for doc in docs:
+            words = _words(doc.page_content)
+            if any(len(words & other) / max(len(words | other), 1) >= self.dedup_threshold for other in seen):
+                continue
+            kept.append(doc)
+            seen.append(words)
+        return kept
+
+    def _render(self, content, live):
+        return f"{content} \n{live}" if live else content
+
+    def _cut_field(self, content, field, max_tokens):
+        lines = content.split("\n")
+        for i, line in enumerate(lines):
+            match = _FIELD.match(line)
+            if match and match.group(2) == field:
+                indent, name, value, end = match.groups()
+                lines[i] = f"{indent}{name}: {self.counter.truncate(value, max_tokens)}{end}"
+        return "\n".join(lines)
+
+    def build(self, docs):
+        docs = list(docs)
+        unique = self._dedupe(docs)
+        contents = [doc.page_content for doc in unique]
+        lives = [self.live_fields(doc) for doc in unique]
+
+        def total():
+            return self.counter.count("\n\n".join(self._render(c, l) for c, l in zip(contents, lives)))
+
+        full_tokens = tokens = total()
+        truncated = set()
+        for field, max_tokens in TRUNCATE_STEPS:
+            if tokens <= self.budget:
+                break
+            for i, content in enumerate(contents):
+                cut = self._cut_field(content, field, max_tokens)
+                if cut != content:
+                    contents[i] = cut
+                    truncated.add(i)
+            tokens = total()
+
+        dropped = 0
+        while tokens > self.budget and len(contents) > 1:
+            contents.pop()
+            lives.pop()
+            dropped += 1
+            tokens = total()
+
+        with self._lock:
+            self._totals["contexts"] += 1
+            self._totals["full_tokens"] += full_tokens
+            self._totals["context_tokens"] += tokens
+            self._totals["deduped"] += len(docs) - len(unique)
+            self._totals["truncated"] += len(truncated)
+            self._totals["dropped"] += dropped
+
+        return "\n\n".join(self._render(c, l) for c, l in zip(contents, lives))
+
+    def log_prompt(self, prompt_value):
+        """
+        Pass-through step between the prompt and the LLM: logs the token
+        count of the final prompt.
+        """
+        tokens = self.counter.count(prompt_value.to_string())
+        with self._lock:
+            self._totals["prompts"] += 1
+            self._totals["prompt_tokens"] += tokens
+        print(f"Prompt tokens: {tokens}")
+        return prompt_value
+
+    def stats(self):
+        with self._lock:
+            t = dict(self._totals)
+        contexts, prompts = t["contexts"], t["prompts"]
+        return {
+            "budget": self.budget,
+            "tokenizer": self.counter.name,
+            "contexts": contexts,
+            "mean_prompt_tokens": round(t["prompt_tokens"] / prompts, 1) if prompts else 0.0,
+            "mean_context_tokens": round(t["context_tokens"] / contexts, 1) if contexts else 0.0,
+            "mean_tokens_saved": round((t["full_tokens"] - t["context_tokens"]) / contexts, 1) if contexts else 0.0,
+            "deduped_docs": t["deduped"],
+            "truncated_docs": t["truncated"],
+            "dropped_docs": t["dropped"],
+        }
@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Openers and pronouns that make a question lean on the previous turn
+_FOLLOW_UP = re.compile(
+    r"^(and|also|what about|how about|in|only|but|kalau|yang|bagaimana dengan)\b"
+    r"|\b(it|its|it's|that|this|those|these|them|they|one|ones|same|itu|ini|tersebut|nya)\b"
+)
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+class _Session:
+    __slots__ = ("turns", "summary", "last_query", "last_used")
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)  # (question, answer) pairs, clipped
+        self.summary = ""
+        self.last_query = ""  # standalone form of the latest question
+        self.last_used = time.monotonic()
+
+
+class ConversationMemory:
+    """
+    Per-session chat history for follow-up questions.
+
+    Each session keeps its last `max_turns` turns (questions and answers
+    clipped to a few hundred characters). A turn that falls out of the
+    ring buffer is folded into a rolling summary capped at `summary_chars`,
+    oldest text first to go, so the history block in the prompt stays small.
+
+    At most `max_sessions` sessions are held; the least recently used is
+    evicted beyond that, and sessions idle for `idle_ttl` seconds expire.
+    """
+
+    def __init__(self, max_sessions=1000, max_turns=4, idle_ttl=3600,
+                 summary_chars=400, question_chars=200, answer_chars=300):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.summary_chars = summary_chars
+        self.question_chars = question_chars
+        self.answer_chars = answer_chars
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.evictions = 0
+        self.condensed = 0
+
+    def _expire(self, now):
+        # Caller holds the lock; the oldest sessions sit at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def _get(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = now
+            return session
+
+    def history(self, session_id):
+        """
+        The conversation so far as prompt text ("" for a new session).
+        """
+        session = self._get(session_id) if session_id else None
+        if session is None:
+            return ""
+        lines = [f"Summary of earlier turns: {session.summary}"] if session.summary else []
+        for question, answer in session.turns:
+            lines.append(f"User: {question}")
+            lines.append(f"Assistant: {answer}")
+        return "\n".join(lines)
+
+    def condense(self, session_id, question):
+        """
+        Standalone retrieval query for `question`. A follow-up such as
+        "what about in blue?" is prefixed with the previous question, so
+        retrieval and the filters see "Women's cardigans? what about in blue?".
+        """
+        session = self._get(session_id) if session_id else None
+        if session is None or not session.last_query or not _FOLLOW_UP.search(question.lower()):
+            return question
+        with self._lock:
+            self.condensed += 1
+        return f"{session.last_query} {question}"
+
+    def add_turn(self, session_id, question, answer, query=None):
+        """
+        Records a finished turn. `query` is the standalone form that
+        condense() returned, so a chain of follow-ups keeps its subject.
+        """
+        if not session_id:
+            return
+        turn = (_clip(question, self.question_chars), _clip(answer, self.answer_chars))
+        with self._lock:
+            now = time.monotonic()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+
+            if len(session.turns) == session.turns.maxlen:
+                old_question, old_answer = session.turns[0]
+                summary = f"{session.summary} Asked: {old_question} Answered: {_clip(old_answer, 120)}".strip()
+                session.summary = summary[-self.summary_chars:]
+            session.turns.append(turn)
+            session.last_query = _clip(query or question, self.question_chars)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "turns": sum(len(s.turns) for s in self._sessions.values()),
+                "condensed_queries": self.condensed,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches query embeddings across concurrent requests.
+
+    Each caller submits one text. A worker thread takes the first waiting
+    text, gathers whatever else arrives within `window_ms` (up to
+    `max_batch` texts), embeds them with one vectorized `embed_batch(texts)`
+    call and hands each caller its own vector.
+
+    With `workers` > 1 several batches can be embedded at the same time.
+    """
+
+    def __init__(self, embed_batch, window_ms=5, max_batch=32, workers=1):
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stats = {
+            "batches": 0,
+            "requests": 0,
+            "max_batch_size": 0,
+            "queue_wait_seconds": 0.0,
+            "batch_seconds": 0.0,
+            "last_batch_ms": 0.0,
+            "batch_sizes": {},  # power-of-two bucket -> number of batches
+        }
+
+    def submit(self, text):
+        """
+        Queues a text and returns a concurrent.futures.Future for its vector.
+        Async callers can await it with asyncio.wrap_future().
+        """
+        self._ensure_workers()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text):
+        return self.submit(text).result()
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            # A worker that died is replaced instead of being counted
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"embed-batcher-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window closed: still take anything already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # A caller that went away (e.g. a client disconnect cancelling the
+            # asyncio.wrap_future wrapper) has cancelled its future while it
+            # was queued: skip it. The rest are marked running, so they can no
+            # longer be cancelled and set_result below cannot fail.
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                vectors = self.embed_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result([float(x) for x in vector])
+            self._record(batch, start, elapsed)
+
+    def _record(self, batch, start, elapsed):
+        size = len(batch)
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        with self._lock:
+            stats = self._stats
+            stats["batches"] += 1
+            stats["requests"] += size
+            stats["max_batch_size"] = max(stats["max_batch_size"], size)
+            stats["queue_wait_seconds"] += sum(start - queued_at for _, _, queued_at in batch)
+            stats["batch_seconds"] += elapsed
+            stats["last_batch_ms"] = round(elapsed * 1000, 2)
+            stats["batch_sizes"][bucket] = stats["batch_sizes"].get(bucket, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batch_sizes"] = {f"<={k}": v for k, v in sorted(self._stats["batch_sizes"].items())}
+        batches, requests = stats["batches"], stats["requests"]
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": batches,
+            "requests": requests,
+            "queue_depth": self._queue.qsize(),
+            "mean_batch_size": round(requests / batches, 2) if batches else 0.0,
+            "max_batch_size": stats["max_batch_size"],
+            "mean_queue_wait_ms": round(stats["queue_wait_seconds"] * 1000 / requests, 2) if requests else 0.0,
+            "mean_batch_ms": round(stats["batch_seconds"] * 1000 / batches, 2) if batches else 0.0,
+            "last_batch_ms": stats["last_batch_ms"],
+            "batch_sizes": stats["batch_sizes"],
+        }
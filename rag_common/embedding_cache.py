@@ -0,0 +1,100 @@
+import hashlib
+import sqlite3
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a disk cache for document embeddings.
+
+    Vectors are stored as float32 blobs in SQLite, keyed by
+    (model name, sha256 of the text). embed_documents() only runs the model
+    on texts it has never seen. Queries are not cached.
+
+    Create one wrapper per ingest run; its stats cover that run only.
+    """
+
+    def __init__(self, embeddings, model_name, path):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.embed_seconds = 0.0
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def embed_documents(self, texts):
+        keys = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+        found = {}
+
+        conn = sqlite3.connect(self.path)
+        try:
+            unique = list(dict.fromkeys(keys))
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [self.model_name, *chunk],
+                )
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            # One model run per distinct unseen text
+            missing, queued = [], set()
+            for i, key in enumerate(keys):
+                if key not in found and key not in queued:
+                    missing.append(i)
+                    queued.add(key)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            if missing:
+                start = time.perf_counter()
+                vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+                self.embed_seconds += time.perf_counter() - start
+
+                rows = []
+                for i, vector in zip(missing, vectors):
+                    found[keys[i]] = list(vector)
+                    rows.append((self.model_name, keys[i], np.asarray(vector, dtype=np.float32).tobytes()))
+                conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+                conn.commit()
+        finally:
+            conn.close()
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def stats(self):
+        total = self.hits + self.misses
+        per_text = self.embed_seconds / self.misses if self.misses else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "embed_seconds": round(self.embed_seconds, 3),
+            # Estimated from the average cost of the texts that were embedded
+            "seconds_saved": round(self.hits * per_text, 3),
+        }
+
+
+def format_cache_stats(stats):
+    return (f"Embedding cache: {stats['hits']} hits / {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['embed_seconds']}s embedding, "
+            f"~{stats['seconds_saved']}s saved")
@@ -0,0 +1,27 @@
+from fastembed import TextEmbedding
+from langchain_core.embeddings import Embeddings
+
+
+class FastEmbedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings over a fastembed TextEmbedding it holds itself.
+
+    embed_queries() embeds a whole batch of questions in one query_embed
+    call (with the model's query instruction, if it has one), for the
+    micro-batcher. It uses only fastembed's public API, so it doesn't
+    depend on how a LangChain wrapper stores the model.
+    """
+
+    def __init__(self, model_name, cache_dir=None, batch_size=256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = TextEmbedding(model_name=model_name, cache_dir=cache_dir)
+
+    def embed_documents(self, texts):
+        return [vector.tolist() for vector in self.model.embed(list(texts), batch_size=self.batch_size)]
+
+    def embed_queries(self, texts):
+        return [vector.tolist() for vector in self.model.query_embed(list(texts), batch_size=self.batch_size)]
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
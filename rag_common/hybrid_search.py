@@ -0,0 +1,278 @@
+import asyncio
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+# "Product Name:", "Gender:", "Description:"... at the start of each line of
+# a product document. Every document has them, so as BM25 terms they match
+# any query that mentions "name", "size" or "color" and only pad the length.
+FIELD_LABEL = re.compile(r"^[ \t]*[A-Za-z][A-Za-z ]{0,30}:", re.MULTILINE)
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def field_values(text):
+    """
+    A product document with its field labels dropped, leaving the values.
+    """
+    return FIELD_LABEL.sub(" ", text)
+
+
+def matches_where(metadata, where):
+    """
+    Evaluates the subset of Chroma's `where` syntax that query_filters
+    produces ($and, $or, $in, $nin, $eq, $ne and plain equality).
+    """
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            for op, expected in cond.items():
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over the same Documents that go into Chroma.
+
+    Documents are keyed by metadata["id"]. upsert() skips documents whose
+    metadata["content_hash"] (set by index_sync) is unchanged, so keeping
+    it in step with each catalog sync is incremental.
+
+    Scoring is vectorized: each document has a row in NumPy arrays, each
+    term's postings are cached as (rows, term frequencies) arrays, and the
+    per-document length norms are computed once per change to the index,
+    so a term found in most of the catalog costs a few array operations.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._hashes = {}
+        self._tf = {}
+        self._postings = defaultdict(set)
+        self._total_length = 0
+        self._rows = {}  # doc id -> row in the arrays below
+        self._row_ids = []  # row -> doc id, None for a free row
+        self._free_rows = []
+        self._lengths = np.zeros(0)
+        self._norms = None  # k1 * (1 - b + b * length / avg_length), per row
+        self._term_arrays = {}  # term -> (rows, tf), built on first search
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add(self, doc_id, doc):
+        tf = Counter(tokenize(field_values(doc.page_content)))
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_ids[row] = doc_id
+        else:
+            row = len(self._row_ids)
+            self._row_ids.append(doc_id)
+            if row >= len(self._lengths):
+                self._lengths = np.concatenate([self._lengths, np.zeros(max(64, len(self._lengths)))])
+        self._rows[doc_id] = row
+        self._docs[doc_id] = doc
+        self._hashes[doc_id] = doc.metadata.get("content_hash")
+        self._tf[doc_id] = tf
+        length = sum(tf.values())
+        self._lengths[row] = length
+        self._total_length += length
+        for term in tf:
+            self._postings[term].add(doc_id)
+            self._term_arrays.pop(term, None)
+        self._norms = None
+
+    def _remove(self, doc_id):
+        if doc_id not in self._docs:
+            return
+        for term in self._tf[doc_id]:
+            self._postings[term].discard(doc_id)
+            if not self._postings[term]:
+                del self._postings[term]
+            self._term_arrays.pop(term, None)
+        row = self._rows.pop(doc_id)
+        self._total_length -= self._lengths[row]
+        self._lengths[row] = 0
+        self._row_ids[row] = None
+        self._free_rows.append(row)
+        self._norms = None
+        del self._docs[doc_id], self._hashes[doc_id], self._tf[doc_id]
+
+    def upsert(self, documents):
+        with self._lock:
+            for doc in documents:
+                doc_id = doc.metadata["id"]
+                digest = doc.metadata.get("content_hash")
+                if digest is not None and self._hashes.get(doc_id) == digest:
+                    continue
+                self._remove(doc_id)
+                self._add(doc_id, doc)
+
+    def remove(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def replace_all(self, documents):
+        """
+        Makes the index hold exactly `documents`, touching only what changed.
+        """
+        keep = {doc.metadata["id"] for doc in documents}
+        self.upsert(documents)
+        self.remove([doc_id for doc_id in list(self._docs) if doc_id not in keep])
+
+    def _term_array(self, term):
+        # Caller holds the lock
+        arrays = self._term_arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            rows = np.fromiter((self._rows[d] for d in postings), dtype=np.int64, count=len(postings))
+            tf = np.fromiter((self._tf[d][term] for d in postings), dtype=np.float64, count=len(postings))
+            arrays = self._term_arrays[term] = (rows, tf)
+        return arrays
+
+    def search(self, query, k, where=None):
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs or not terms or k <= 0:
+                return []
+            n_rows = len(self._row_ids)
+            if self._norms is None:
+                avg_length = self._total_length / n_docs
+                self._norms = self.k1 * (1 - self.b + self.b * self._lengths[:n_rows] / avg_length)
+            scores = np.zeros(n_rows)
+            for term in terms:
+                if term not in self._postings:
+                    continue
+                rows, tf = self._term_array(term)
+                idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+                # A term occurs once per document, so rows has no repeats
+                scores[rows] += idf * tf * (self.k1 + 1) / (tf + self._norms[rows])
+
+            candidates = np.flatnonzero(scores)
+            if not where and len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            results = []
+            for row in ranked:
+                doc = self._docs[self._row_ids[row]]
+                if where and not matches_where(doc.metadata, where):
+                    continue
+                results.append(doc)
+                if len(results) == k:
+                    break
+            return results
+
+
+def rrf_fuse(result_lists, k, rrf_k=60):
+    """
+    Reciprocal-rank fusion: each document scores sum(1 / (rrf_k + rank))
+    over the lists it appears in. Returns the top k documents.
+    """
+    scores, docs = defaultdict(float), {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            doc_id = doc.metadata.get("id")
+            scores[doc_id] += 1.0 / (rrf_k + rank)
+            docs.setdefault(doc_id, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[doc_id] for doc_id in best]
+
+
+class HybridSearch:
+    """
+    Runs the vector leg (Chroma) and the BM25 leg concurrently and fuses
+    them with reciprocal-rank fusion. Keeps per-leg latency totals.
+    """
+
+    def __init__(self, bm25_index, rrf_k=60, enabled=True):
+        self.bm25_index = bm25_index
+        self.rrf_k = rrf_k
+        self.enabled = enabled
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-leg")
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: [0, 0.0])  # leg -> [calls, seconds]
+
+    def _timed(self, leg, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._totals[leg][0] += 1
+                self._totals[leg][1] += elapsed
+
+    def search(self, vector_search, question, k, where=None):
+        """
+        `vector_search(n, where)` returns the top n Documents from Chroma.
+        """
+        if not self.enabled or not len(self.bm25_index):
+            return self._timed("vector", vector_search, k, where)
+
+        start = time.perf_counter()
+        n = k * 2
+        vector_future = self._pool.submit(self._timed, "vector", vector_search, n, where)
+        bm25_docs = self._timed("bm25", self.bm25_index.search, question, n, where)
+        fused = rrf_fuse([vector_future.result(), bm25_docs], k, self.rrf_k)
+        self._record_fused(start)
+        return fused
+
+    async def asearch(self, vector_search, question, k, where=None):
+        if not self.enabled or not len(self.bm25_index):
+            return await asyncio.to_thread(self._timed, "vector", vector_search, k, where)
+
+        start = time.perf_counter()
+        n = k * 2
+        vector_docs, bm25_docs = await asyncio.gather(
+            asyncio.to_thread(self._timed, "vector", vector_search, n, where),
+            asyncio.to_thread(self._timed, "bm25", self.bm25_index.search, question, n, where),
+        )
+        fused = rrf_fuse([vector_docs, bm25_docs], k, self.rrf_k)
+        self._record_fused(start)
+        return fused
+
+    def _record_fused(self, start):
+        with self._lock:
+            self._totals["hybrid"][0] += 1
+            self._totals["hybrid"][1] += time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            totals = {leg: list(v) for leg, v in self._totals.items()}
+        stats = {"enabled": self.enabled, "bm25_docs": len(self.bm25_index)}
+        for leg in ("vector", "bm25", "hybrid"):
+            calls, seconds = totals.get(leg, [0, 0.0])
+            stats[f"{leg}_calls"] = calls
+            stats[f"{leg}_mean_ms"] = round(seconds * 1000 / calls, 2) if calls else 0.0
+        return stats
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from contextlib import nullcontext
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_hash(doc):
+    # Covers the metadata too, so a newly indexed field (e.g. gender) is
+    # pushed to Chroma. Unchanged text is still served from the embedding cache.
+    metadata = {k: v for k, v in doc.metadata.items() if k != "content_hash"}
+    return content_hash(doc.page_content + "\n" + json.dumps(metadata, sort_keys=True, default=str))
+
+
+# Page size when reading back the whole collection's hashes
+PAGE_SIZE = 5000
+
+
+def _classify(doc, indexed, counts):
+    # Tags the document with its content hash and counts it; True if the
+    # hash differs from what is indexed (so it needs embedding).
+    doc_id = str(doc.metadata["id"])
+    digest = document_hash(doc)
+    doc.metadata["content_hash"] = digest
+
+    if doc_id not in indexed:
+        counts["added"] += 1
+    elif indexed[doc_id] != digest:
+        counts["updated"] += 1
+    else:
+        counts["unchanged"] += 1
+        return False
+    return True
+
+
+def _diff(documents, indexed, counts):
+    # The documents that need writing, along with their ids
+    changed = [doc for doc in documents if _classify(doc, indexed, counts)]
+    return changed, [str(doc.metadata["id"]) for doc in changed]
+
+
+def _indexed_hashes(vectorstore, ids=None):
+    if ids is not None:
+        existing = vectorstore.get(ids=ids, include=["metadatas"])
+        return {
+            doc_id: (metadata or {}).get("content_hash")
+            for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+    # Whole collection: read it a page at a time and keep only ids and hashes
+    hashes, offset = {}, 0
+    while True:
+        page = vectorstore.get(include=["metadatas"], limit=PAGE_SIZE, offset=offset)
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            hashes[doc_id] = (metadata or {}).get("content_hash")
+        if len(page["ids"]) < PAGE_SIZE:
+            return hashes
+        offset += PAGE_SIZE
+
+
+def sync_documents(vectorstore, documents, batch_size=256, progress=None, total=None):
+    """
+    Brings the Chroma collection in line with `documents` without clearing it.
+
+    Documents are keyed by product id and carry a hash of their page_content
+    and metadata, so only new or changed products are written and products that are gone
+    are deleted. Upserts run before deletes, so live queries never see an
+    empty collection.
+
+    `documents` can be any iterable, e.g. a generator reading the catalog
+    file. It is read once, and changed documents are embedded and written
+    `batch_size` at a time, so memory does not grow with the catalog
+    (beyond one id and hash per product). `progress(done, total)` is called
+    every `batch_size` documents read; `total` defaults to len(documents)
+    when there is one.
+
+    Returns counts of added, updated, unchanged and deleted products.
+    """
+    indexed = _indexed_hashes(vectorstore)
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    if total is None and hasattr(documents, "__len__"):
+        total = len(documents)
+
+    # NumpyVectorStore rewrites its files per write unless they are deferred
+    deferred = getattr(vectorstore, "deferred_writes", None)
+    with deferred() if deferred else nullcontext():
+        seen, batch, done = set(), [], 0
+        if progress:
+            progress(0, total)
+        for doc in documents:
+            doc_id = str(doc.metadata["id"])
+            seen.add(doc_id)
+            if _classify(doc, indexed, counts):
+                batch.append(doc)
+            if len(batch) >= batch_size:
+                vectorstore.add_documents(documents=batch, ids=[str(d.metadata["id"]) for d in batch])
+                batch = []
+            done += 1
+            if progress and done % batch_size == 0:
+                progress(done, total)
+        if batch:
+            vectorstore.add_documents(documents=batch, ids=[str(d.metadata["id"]) for d in batch])
+
+        # Also drops entries from older full rebuilds, which used random ids
+        stale = [doc_id for doc_id in indexed if doc_id not in seen]
+        if stale:
+            vectorstore.delete(ids=stale)
+        counts["deleted"] = len(stale)
+    if progress:
+        progress(done, total if total is not None else done)
+
+    return counts
+
+
+def plan_sync(vectorstore, documents):
+    """
+    The counts sync_documents would return, without writing anything.
+    Reads `documents` once, like sync_documents.
+    """
+    indexed = _indexed_hashes(vectorstore)
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    seen = set()
+    for doc in documents:
+        seen.add(str(doc.metadata["id"]))
+        _classify(doc, indexed, counts)
+    counts["deleted"] = sum(1 for doc_id in indexed if doc_id not in seen)
+    return counts
+
+
+def apply_changes(vectorstore, documents, deleted_ids=()):
+    """
+    Partial version of sync_documents for a known set of products: upserts
+    `documents` whose content changed and deletes `deleted_ids`. Products
+    not mentioned are left alone.
+    """
+    ids = [str(doc.metadata["id"]) for doc in documents]
+    indexed = _indexed_hashes(vectorstore, ids) if ids else {}
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    changed, changed_ids = _diff(documents, indexed, counts)
+
+    deleted_ids = [str(doc_id) for doc_id in deleted_ids]
+    if changed:
+        vectorstore.add_documents(documents=changed, ids=changed_ids)
+    if deleted_ids:
+        vectorstore.delete(ids=deleted_ids)
+    counts["deleted"] = len(deleted_ids)
+
+    return counts
+
+
+def indexed_documents(vectorstore):
+    """
+    Reads every document currently in the collection back as Documents.
+    """
+    from langchain_core.documents import Document
+
+    data = vectorstore.get(include=["documents", "metadatas"])
+    return [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(data["documents"], data["metadatas"])
+    ]
+
+
+def format_counts(counts):
+    return (f"{counts['added']} added, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['deleted']} deleted")
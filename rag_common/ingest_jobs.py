@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: jobs are only coalesced within one process
+    fcntl = None
+
+# Under state_dir: the running and queued job across all processes, and the
+# locks around it and around running a job
+ACTIVE_FILE = ".active"
+ACTIVE_LOCK = ".active.lock"
+RUN_LOCK = ".run.lock"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, but owned by another user
+        pass
+    return True
+
+
+class IngestJob:
+    """
+    One ingest run. The runner reports progress with progress(done, total,
+    phase); done/total count the documents being embedded and written.
+    """
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"  # queued, running, succeeded, failed
+        self.phase = "queued"
+        self.triggers = 1  # how many requests were coalesced into this job
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self._on_change = None
+        self._saved_at = 0.0
+
+    def progress(self, done, total, phase="embedding"):
+        self.done, self.total, self.phase = done, total, phase
+        # Progress can arrive many times a second; persist at most twice a second
+        now = time.monotonic()
+        if self._on_change and now - self._saved_at >= 0.5:
+            self._saved_at = now
+            self._on_change(self)
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        rate = self.done / elapsed if elapsed and self.done else None
+        eta = None
+        if self.status == "running" and rate and self.total is not None:
+            eta = round(max(self.total - self.done, 0) / rate, 1)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "phase": self.phase,
+            "triggers": self.triggers,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "done": self.done,
+            "total": self.total,
+            "docs_per_sec": round(rate, 1) if rate else None,
+            "eta_seconds": eta,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class IngestJobs:
+    """
+    Runs `run(job)` on a background thread, one job at a time.
+
+    submit() returns at once. A trigger while a job is running queues one
+    follow-up job (the catalog may have changed after the running job read
+    it); further triggers before that starts join the queued job instead of
+    adding more.
+
+    With `state_dir`, job state is also written to <state_dir>/<id>.json, so
+    any worker process can answer a status poll, and the running and queued
+    job are shared between processes: a trigger on any worker joins the one
+    queued job, and jobs run one at a time across workers. A job runs in the
+    process that accepted it; if that process dies, its job is forgotten and
+    the next trigger queues a new one. The last `history` jobs are kept.
+    """
+
+    def __init__(self, run, state_dir=None, history=20):
+        self.run = run
+        self.state_dir = state_dir
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._running = None
+        self._queued = None
+        self._worker = None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        if self.state_dir:
+            self._write(job.to_dict())
+
+    def _write(self, job):
+        tmp = f"{self._path(job['id'])}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f, default=str)
+        os.replace(tmp, self._path(job["id"]))
+
+    def _load(self, job_id):
+        try:
+            with open(self._path(os.path.basename(job_id))) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _shared(self):
+        """
+        Yields the running and queued job across processes, as
+        {"running": {"id", "pid"} or None, "queued": {"id", "pid", "triggers"}
+        or None}, and writes it back on exit. Entries from processes that
+        have died are dropped. Yields None without a state_dir or fcntl.
+        Take self._lock first.
+        """
+        if not self.state_dir or fcntl is None:
+            yield None
+            return
+        path = os.path.join(self.state_dir, ACTIVE_FILE)
+        with open(os.path.join(self.state_dir, ACTIVE_LOCK), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(path) as f:
+                        active = json.load(f)
+                except (OSError, ValueError):
+                    active = {}
+                for key in ("running", "queued"):
+                    entry = active.get(key)
+                    active[key] = entry if entry and _alive(entry["pid"]) else None
+                yield active
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(active, f)
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _run_lock(self):
+        # Held while a job runs, so jobs run one at a time across processes
+        if not self.state_dir or fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.state_dir, RUN_LOCK), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def submit(self):
+        """
+        Returns (job dict, coalesced). coalesced is True when the trigger
+        joined a job that was already queued, here or in another process.
+        """
+        with self._lock, self._shared() as active:
+            queued = active and active["queued"]
+            if queued and queued["pid"] != os.getpid():
+                # Queued by another worker; it runs there
+                queued["triggers"] += 1
+                job = self._load(queued["id"]) or {"id": queued["id"], "status": "queued"}
+                job["triggers"] = queued["triggers"]
+                self._write(job)
+                return job, True
+            if self._queued is not None:
+                self._queued.triggers += 1
+                job, coalesced = self._queued, True
+            else:
+                job = IngestJob(uuid.uuid4().hex[:12])
+                job._on_change = self._save
+                self._jobs[job.id] = job
+                self._queued, coalesced = job, False
+                self._prune()
+            if active is not None:
+                active["queued"] = {"id": job.id, "pid": os.getpid(), "triggers": job.triggers}
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, name="ingest-jobs", daemon=True)
+                self._worker.start()
+            # Saved before the shared state is released, so other workers can read it
+            self._save(job)
+        return job.to_dict(), coalesced
+
+    def _prune(self):
+        # Caller holds the lock
+        while len(self._jobs) > self.history:
+            job_id, job = next(iter(self._jobs.items()))
+            if job is self._running or job is self._queued:
+                break
+            del self._jobs[job_id]
+            if self.state_dir:
+                try:
+                    os.remove(self._path(job_id))
+                except OSError:
+                    pass
+
+    def _loop(self):
+        while True:
+            # Waits here while another process runs a job
+            with self._run_lock():
+                with self._lock, self._shared() as active:
+                    job = self._queued
+                    if job is None:
+                        self._worker = None
+                        return
+                    self._queued, self._running = None, job
+                    if active is not None:
+                        if active["queued"] and active["queued"]["id"] == job.id:
+                            job.triggers = active["queued"]["triggers"]
+                            active["queued"] = None
+                        active["running"] = {"id": job.id, "pid": os.getpid()}
+                    job.status, job.phase, job.started_at = "running", "starting", time.time()
+                self._save(job)
+                try:
+                    job.result = self.run(job)
+                    job.status, job.phase = "succeeded", "done"
+                except Exception as e:
+                    print(f"Ingest job {job.id} failed: {e}")
+                    job.status, job.phase, job.error = "failed", "failed", str(e)
+                job.finished_at = time.time()
+                with self._lock, self._shared() as active:
+                    self._running = None
+                    if active is not None:
+                        active["running"] = None
+                self._save(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if not self.state_dir:
+            return None
+        # Accepted by another worker process
+        return self._load(job_id)
+
+    def recent(self):
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
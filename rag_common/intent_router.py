@@ -0,0 +1,181 @@
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+# intent: "list", "attribute" or "open". answer is None unless the question
+# was answered straight from the catalog; k is the retrieval depth otherwise.
+Route = namedtuple("Route", ["intent", "answer", "sources", "k"])
+
+LIST_PATTERNS = [
+    re.compile(r"\b(list|show)\b.*\b(all|every|entire|whole)\b"),
+    re.compile(r"\blist (?:the |your |of )?(products|items|catalog)\b"),
+    re.compile(r"\bwhat (products|items|\w+s) do you (have|sell|carry)\b"),
+    re.compile(r"\b(daftar|semua) produk\b"),
+    re.compile(r"\b(produk apa saja|ada produk apa)\b"),
+]
+
+# Attribute words -> catalog field. price/stock are read live.
+ATTRIBUTE_WORDS = {
+    "color": ["color", "colors", "colour", "colours", "warna"],
+    "size": ["size", "sizes", "ukuran"],
+    "material": ["material", "made of", "fabric", "bahan"],
+    "price": ["price", "prices", "cost", "how much", "harga", "berapa"],
+    "stock": ["stock", "in stock", "stok"],
+}
+
+# One pattern per attribute, compiled once
+ATTRIBUTE_PATTERNS = {
+    attribute: re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + r")\b")
+    for attribute, words in ATTRIBUTE_WORDS.items()
+}
+
+WORD = re.compile(r"\w+")
+
+COMPARE = re.compile(r"\b(compare|comparison|vs|versus|difference|better|banding|bandingkan)\b")
+
+# Retrieval depth per kind of open-ended question
+K_SPECIFIC = 3   # names one product
+K_DEFAULT = 6
+K_COMPARE = 8    # comparisons and multi-product questions
+
+
+class IntentRouter:
+    """
+    Sits in front of the RAG chain. Catalog listings ("list all products")
+    and single-attribute lookups ("what colors does X come in") are
+    answered from the product catalog in Markdown, without vector search
+    or the LLM. Everything else goes to the chain with a k suited to the
+    question.
+
+    `loader()` returns the catalog as a list of dicts with id, name,
+    gender, category, material, size and color; it is re-read like
+    ProductSnapshot (on refresh() or after `max_age` seconds).
+    `live(id)` returns {"price", "stock"} for a product.
+    """
+
+    def __init__(self, loader, live, max_age=None, not_found="I don't have information about that product."):
+        self.loader = loader
+        self.live = live
+        self.max_age = max_age
+        self.not_found = not_found
+        self._lock = threading.Lock()
+        self._catalog = []
+        self._names = {}
+        self._loaded_at = None
+        self._totals = defaultdict(lambda: [0, 0.0])  # intent -> [requests, seconds]
+
+    def refresh(self):
+        catalog = sorted(self.loader(), key=lambda p: p["name"])
+        # Longest names first, so "Polo Shirt Slim" wins over "Polo Shirt".
+        # Each name's pattern is compiled once here and filed under the
+        # name's first word: a question only runs the patterns of names
+        # whose words it all contains, instead of one regex per product.
+        ranked = sorted(((p["name"].lower(), p) for p in catalog), key=lambda item: -len(item[0]))
+        names = defaultdict(list)  # first word -> [(rank, words, pattern, product)]
+        for rank, (name, product) in enumerate(ranked):
+            words = WORD.findall(name)
+            if words:
+                names[words[0]].append((rank, frozenset(words), re.compile(rf"\b{re.escape(name)}\b"), product))
+        names = dict(names)
+        with self._lock:
+            self._catalog = catalog
+            self._names = names
+            self._loaded_at = time.monotonic()
+
+    def _current(self):
+        if self._loaded_at is None or (
+            self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age
+        ):
+            self.refresh()
+        with self._lock:
+            return self._catalog, self._names
+
+    def _mentioned(self, text, names):
+        words = set(WORD.findall(text))
+        candidates = sorted(
+            (entry for word in words for entry in names.get(word, ()) if entry[1] <= words),
+            key=lambda entry: entry[0],
+        )
+        found, taken = [], []
+        for _, _, pattern, product in candidates:
+            match = pattern.search(text)
+            if not match:
+                continue
+            # Skip a shorter name inside one already matched
+            if any(start <= match.start() and match.end() <= end for start, end in taken):
+                continue
+            found.append(product)
+            taken.append(match.span())
+        return found
+
+    def _list_answer(self, catalog, matches):
+        products = [p for p in catalog if matches(p)]
+        if not products:
+            return self.not_found, []
+        lines = "\n".join(f"- {p['name']}" for p in products)
+        return f"Here are the products we have:\n\n{lines}", [p["id"] for p in products]
+
+    def _attribute_answer(self, product, attribute):
+        name = f"**{product['name']}**"
+        if attribute in ("price", "stock"):
+            live = self.live(product["id"])
+            if not live:
+                return None
+            if attribute == "price":
+                return f"{name} costs ${live['price']}."
+            if live["stock"] > 0:
+                return f"{name} has {live['stock']} in stock."
+            return f"{name} is currently out of stock."
+        value = product.get(attribute)
+        if not value:
+            return None
+        if attribute == "color":
+            return f"{name} comes in: {value}."
+        if attribute == "size":
+            return f"{name} is available in sizes: {value}."
+        return f"{name} is made of {value}."
+
+    def route(self, question, matches=lambda product: True):
+        """
+        `matches(product)` applies the question's parsed filters to a
+        catalog entry (gender, category, live price/stock).
+        """
+        text = question.lower()
+        catalog, names = self._current()
+        mentioned = self._mentioned(text, names)
+        attributes = [
+            attribute for attribute, pattern in ATTRIBUTE_PATTERNS.items() if pattern.search(text)
+        ]
+
+        if len(mentioned) == 1 and len(attributes) == 1 and not COMPARE.search(text):
+            answer = self._attribute_answer(mentioned[0], attributes[0])
+            if answer is not None:
+                return Route("attribute", answer, [mentioned[0]["id"]], None)
+
+        # A listing that also asks for prices, colors etc. needs the LLM
+        if not attributes and any(p.search(text) for p in LIST_PATTERNS):
+            answer, sources = self._list_answer(catalog, matches)
+            return Route("list", answer, sources, None)
+
+        if len(mentioned) > 1 or COMPARE.search(text):
+            return Route("open", None, None, K_COMPARE)
+        if len(mentioned) == 1:
+            return Route("open", None, None, K_SPECIFIC)
+        return Route("open", None, None, K_DEFAULT)
+
+    def record(self, intent, seconds):
+        with self._lock:
+            self._totals[intent][0] += 1
+            self._totals[intent][1] += seconds
+
+    def stats(self):
+        with self._lock:
+            totals = {intent: list(v) for intent, v in self._totals.items()}
+            products = len(self._catalog)
+        stats = {"catalog_products": products}
+        for intent in ("list", "attribute", "open"):
+            requests, seconds = totals.get(intent, [0, 0.0])
+            stats[f"{intent}_requests"] = requests
+            stats[f"{intent}_mean_ms"] = round(seconds * 1000 / requests, 2) if requests else 0.0
+        return stats
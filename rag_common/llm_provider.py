@@ -0,0 +1,373 @@
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+
+# One set of pooled HTTP clients per process, shared by every chat model
+# built here (primary and fallback), so keep-alive connections survive
+# chain reloads.
+_http_lock = threading.Lock()
+_http_clients = None
+
+
+def http_clients(max_connections=20, timeout=30.0):
+    global _http_clients
+    with _http_lock:
+        if _http_clients is None:
+            import httpx
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            _http_clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+        return _http_clients
+
+
+def build_chat_model(provider, model, api_key=None, timeout=20.0, max_retries=2):
+    """
+    Returns a LangChain chat model for `provider` ("groq", "openai",
+    "google" or "fake"). `timeout` bounds each HTTP request and the SDK
+    retries rate limits and 5xx errors up to `max_retries` times.
+    """
+    if provider == "fake":
+        return FakeChatModel()
+
+    kwargs = {"temperature": 0, "timeout": timeout, "max_retries": max_retries}
+    if api_key:
+        kwargs["api_key"] = api_key
+
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        client, async_client = http_clients(timeout=timeout)
+        return ChatGroq(model_name=model, http_client=client, http_async_client=async_client, **kwargs)
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        client, async_client = http_clients(timeout=timeout)
+        return ChatOpenAI(model=model, http_client=client, http_async_client=async_client, **kwargs)
+    if provider == "google":
+        # The Gemini client manages its own connections
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, **kwargs)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic local stand-in for the LLM, for tests and benchmarks.
+
+    Answers with the "Product Name:" entries found in the prompt as a
+    Markdown list (or a fixed "not found" line) and streams it word by
+    word. `latency` adds a fixed delay before the first token.
+    """
+
+    latency: float = 0.0
+    not_found: str = "I don't have information about that product."
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _answer(self, messages):
+        prompt = "\n".join(str(m.content) for m in messages)
+        names = list(dict.fromkeys(re.findall(r"Product Name: (.+?)\.\s*$", prompt, re.MULTILINE)))
+        if not names:
+            return self.not_found
+        return "\n".join(f"- {name}" for name in names)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        for token in re.findall(r"\S+\s*", self._answer(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for token in re.findall(r"\S+\s*", self._answer(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class ResilientChatModel(Runnable):
+    """
+    Wraps a primary chat model with a per-call deadline and an optional
+    secondary model.
+
+    - If the primary fails, the call falls back to the secondary.
+    - If the primary has not answered (or, when streaming, produced its
+      first token) within the p95 of its recent latencies, the same call
+      is hedged to the secondary and whichever answers first wins.
+    - Past `deadline` seconds the call raises TimeoutError.
+
+    Until `min_samples` latencies are recorded, `hedge_after` is used as
+    the hedging threshold. A primary that loses the race or runs into
+    the deadline is recorded as taking as long as it was waited for (a
+    censored sample), so the p95 isn't computed from the fast calls only.
+    The sync stream() can only enforce the deadline up to the first
+    token; after that the HTTP timeout applies.
+    """
+
+    def __init__(self, primary, fallback=None, deadline=30.0, hedge=True, hedge_after=8.0,
+                 min_hedge_after=1.0, min_samples=20, window=200):
+        self.primary = primary
+        self.fallback = fallback
+        self.deadline = deadline
+        self.hedge = hedge and fallback is not None
+        self.default_hedge_after = hedge_after
+        self.min_hedge_after = min_hedge_after
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {"invoke": deque(maxlen=window), "stream": deque(maxlen=window)}
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+        self._counts = {"calls": 0, "primary_wins": 0, "hedged": 0, "hedge_wins": 0,
+                        "fallbacks": 0, "timeouts": 0, "errors": 0, "censored": 0}
+
+    # --- latency bookkeeping ---
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _p95(self, kind):
+        with self._lock:
+            samples = sorted(self._samples[kind])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def _hedge_after(self, kind):
+        p95 = self._p95(kind)
+        return max(p95 if p95 is not None else self.default_hedge_after, self.min_hedge_after)
+
+    def _finish(self, kind, name, started, primary_pending):
+        with self._lock:
+            if name == "primary":
+                self._counts["primary_wins"] += 1
+                self._samples[kind].append(time.perf_counter() - started)
+            else:
+                self._counts["hedge_wins"] += 1
+        if primary_pending:
+            self._censor(kind, started)
+
+    def _censor(self, kind, started):
+        # The primary was given up on (never before the hedge fired), so it
+        # took at least this long. Dropping these would leave the slow tail
+        # out of the p95, which would then drift down and hedge more calls.
+        with self._lock:
+            self._counts["censored"] += 1
+            self._samples[kind].append(time.perf_counter() - started)
+
+    # --- sync ---
+
+    def _race(self, kind, call):
+        """
+        Runs `call(model)` on the primary, then on the secondary when the
+        hedge threshold passes or the primary fails. Returns the first result.
+        """
+        self._count("calls")
+        started = time.perf_counter()
+        pending = {self._pool.submit(call, self.primary): "primary"}
+        second_started = self.fallback is None
+        errors = []
+
+        while pending:
+            remaining = self.deadline - (time.perf_counter() - started)
+            if remaining <= 0:
+                break
+            timeout = remaining
+            if not second_started and self.hedge:
+                timeout = min(timeout, max(self._hedge_after(kind) - (time.perf_counter() - started), 0))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if not second_started and self.hedge:
+                    pending[self._pool.submit(call, self.fallback)] = "fallback"
+                    second_started = True
+                    self._count("hedged")
+                continue
+
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    if not second_started:
+                        pending[self._pool.submit(call, self.fallback)] = "fallback"
+                        second_started = True
+                        self._count("fallbacks")
+                    continue
+                self._finish(kind, name, started, "primary" in pending.values())
+                for other in pending:
+                    other.cancel()
+                    # A stream already running in the loser is closed once it yields
+                    other.add_done_callback(_close_stream)
+                return result
+
+        if "primary" in pending.values():
+            self._censor(kind, started)
+        for other in pending:
+            other.cancel()
+            other.add_done_callback(_close_stream)
+        if errors and not pending:
+            self._count("errors")
+            raise errors[-1]
+        self._count("timeouts")
+        raise TimeoutError(f"LLM call exceeded its {self.deadline}s deadline")
+
+    def invoke(self, input, config=None, **kwargs):
+        return self._race("invoke", lambda model: model.invoke(input, config, **kwargs))
+
+    def stream(self, input, config=None, **kwargs):
+        def first_chunk(model):
+            iterator = iter(model.stream(input, config, **kwargs))
+            return next(iterator, None), iterator
+
+        chunk, iterator = self._race("stream", first_chunk)
+        if chunk is None:
+            return
+        yield chunk
+        yield from iterator
+
+    # --- async ---
+
+    async def _arace(self, kind, call):
+        self._count("calls")
+        started = time.perf_counter()
+        pending = {asyncio.ensure_future(call(self.primary)): "primary"}
+        second_started = self.fallback is None
+        errors = []
+
+        try:
+            while pending:
+                remaining = self.deadline - (time.perf_counter() - started)
+                if remaining <= 0:
+                    break
+                timeout = remaining
+                if not second_started and self.hedge:
+                    timeout = min(timeout, max(self._hedge_after(kind) - (time.perf_counter() - started), 0))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if not second_started and self.hedge:
+                        pending[asyncio.ensure_future(call(self.fallback))] = "fallback"
+                        second_started = True
+                        self._count("hedged")
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        if not second_started:
+                            pending[asyncio.ensure_future(call(self.fallback))] = "fallback"
+                            second_started = True
+                            self._count("fallbacks")
+                        continue
+                    self._finish(kind, name, started, "primary" in pending.values())
+                    return result
+            if "primary" in pending.values():
+                self._censor(kind, started)
+        finally:
+            for task in pending:
+                task.cancel()
+                # A loser that already has its first chunk (or gets it before
+                # the cancel lands) holds an open stream
+                task.add_done_callback(_aclose_stream)
+
+        if errors and not pending:
+            self._count("errors")
+            raise errors[-1]
+        self._count("timeouts")
+        raise TimeoutError(f"LLM call exceeded its {self.deadline}s deadline")
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self._arace("invoke", lambda model: model.ainvoke(input, config, **kwargs))
+
+    async def astream(self, input, config=None, **kwargs):
+        async def first_chunk(model):
+            iterator = model.astream(input, config, **kwargs).__aiter__()
+            try:
+                return await iterator.__anext__(), iterator
+            except StopAsyncIteration:
+                return None, iterator
+
+        started = time.perf_counter()
+        chunk, iterator = await self._arace("stream", first_chunk)
+        if chunk is None:
+            return
+        yield chunk
+        while True:
+            remaining = self.deadline - (time.perf_counter() - started)
+            if remaining <= 0:
+                self._count("timeouts")
+                raise TimeoutError(f"LLM stream exceeded its {self.deadline}s deadline")
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield chunk
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+        for kind in ("invoke", "stream"):
+            p95 = self._p95(kind)
+            stats[f"{kind}_p95_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        stats["fallback_enabled"] = self.fallback is not None
+        return stats
+
+
+def _close_stream(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if isinstance(result, tuple) and hasattr(result[1], "close"):
+        result[1].close()
+
+
+# aclose() tasks in flight, so they aren't garbage-collected before they run
+_closing = set()
+
+
+def _aclose_stream(task):
+    if task.cancelled() or task.exception() is not None:
+        return
+    result = task.result()
+    if isinstance(result, tuple) and hasattr(result[1], "aclose"):
+        closing = asyncio.ensure_future(result[1].aclose())
+        _closing.add(closing)
+        closing.add_done_callback(_closing.discard)
+
+
+def build_llm(provider, model, api_key=None, fallback_provider=None, fallback_model=None,
+              fallback_api_key=None, timeout=20.0, max_retries=2, deadline=30.0, hedge=True, hedge_after=8.0):
+    """
+    Primary model plus optional fallback, wrapped in ResilientChatModel.
+    """
+    primary = build_chat_model(provider, model, api_key, timeout, max_retries)
+    fallback = None
+    if fallback_model:
+        fallback_provider = fallback_provider or provider
+        if fallback_api_key is None and fallback_provider == provider:
+            fallback_api_key = api_key
+        fallback = build_chat_model(fallback_provider, fallback_model, fallback_api_key, timeout, max_retries)
+    return ResilientChatModel(primary, fallback, deadline=deadline, hedge=hedge, hedge_after=hedge_after)
@@ -0,0 +1,53 @@
+import os
+import sys
+
+
+def is_cached(cache_dir, model_name, revision=None):
+    """
+    True if `cache_dir` holds a downloaded snapshot of the hub repo
+    `model_name`, in the Hugging Face hub layout that sentence-transformers
+    and FastEmbed both use (models--<org>--<name>/snapshots/<commit>/).
+    With `revision` (a commit hash, branch or tag), only that snapshot
+    counts, so a pinned revision that was never downloaded is fetched
+    rather than silently served from an older one.
+    """
+    repo_dir = os.path.join(cache_dir, "models--" + model_name.replace("/", "--"))
+    snapshots = os.path.join(repo_dir, "snapshots")
+    if revision is None:
+        return os.path.isdir(snapshots) and bool(os.listdir(snapshots))
+    # Branches and tags are resolved to a commit under refs/
+    commit = revision
+    try:
+        with open(os.path.join(repo_dir, "refs", revision)) as f:
+            commit = f.read().strip()
+    except OSError:
+        pass
+    snapshot = os.path.join(snapshots, commit)
+    return os.path.isdir(snapshot) and bool(os.listdir(snapshot))
+
+
+def use_offline_cache(cache_dir, model_name, offline="auto", revision=None):
+    """
+    Decides whether the embedding model loads without touching the network,
+    and if so switches the Hugging Face libraries to offline mode. Otherwise
+    every worker boot asks the hub whether the model changed, and with no
+    network that can stall for a minute or more before the cache is used.
+
+    offline: "auto" goes offline once the model (at `revision`, when pinned)
+    is in `cache_dir` (the first run downloads it), "True" always (fail fast if it is missing), "False"
+    never. Call before the embedding library is imported. Returns True if
+    offline.
+    """
+    mode = str(offline).lower()
+    if mode == "auto":
+        enabled = is_cached(cache_dir, model_name, revision)
+    else:
+        enabled = mode == "true"
+    if enabled:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        # huggingface_hub reads the variable once, at import
+        constants = sys.modules.get("huggingface_hub.constants")
+        if constants is not None:
+            constants.HF_HUB_OFFLINE = True
+    return enabled
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: bumps only serialize within one process
+    fcntl = None
+
+
+class ProductSnapshot:
+    """
+    In-memory product id -> {"price": ..., "stock": ...} map. Ids have the
+    same type as the "id" stored in the Chroma metadata.
+
+    Price and stock are kept out of the embedded text and merged into the
+    prompt context from here, so a price or stock change is a dictionary
+    write instead of a re-embed.
+
+    `loader()` returns the full map; it runs on first use, on refresh(),
+    whenever `version` (an IndexVersion bumped by whoever writes prices
+    and stock) has moved since the last load, and whenever the snapshot
+    is older than `max_age` seconds (None = only on demand).
+
+    With a LiveVersion and `load_rows(ids)` (the same map, for just those
+    ids), a move that names the products it changed re-reads only those
+    rows; ids missing from the result are dropped.
+    """
+
+    def __init__(self, loader, max_age=None, version=None, load_rows=None):
+        self.loader = loader
+        self.max_age = max_age
+        self.version = version
+        self.load_rows = load_rows
+        self._lock = threading.Lock()
+        self._items = {}
+        self._loaded_at = None
+        self._loaded_version = None
+
+    def refresh(self):
+        """
+        Reloads everything. Returns True if any price or stock changed.
+        """
+        # Read first, so a write during the load means another reload
+        version = self.version.current() if self.version is not None else None
+        items = dict(self.loader())
+        with self._lock:
+            changed = items != self._items
+            self._items = items
+            self._loaded_at = time.monotonic()
+            self._loaded_version = version
+        return changed
+
+    def _stale(self):
+        if self._loaded_at is None:
+            return True
+        if self.version is not None and self.version.current() != self._loaded_version:
+            return True
+        return self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age
+
+    def _catch_up(self):
+        if not self._stale():
+            return
+        if (
+            self._loaded_at is None
+            or self.load_rows is None
+            or not hasattr(self.version, "changed_since")
+            or (self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age)
+        ):
+            self.refresh()
+            return
+        version, ids = self.version.changed_since(self._loaded_version)
+        if ids is None:
+            self.refresh()
+            return
+        rows = dict(self.load_rows(ids)) if ids else {}
+        with self._lock:
+            for product_id in ids:
+                if product_id in rows:
+                    self._items[product_id] = rows[product_id]
+                else:
+                    self._items.pop(product_id, None)
+            self._loaded_version = version
+
+    def get(self, product_id):
+        self._catch_up()
+        return self._items.get(product_id)
+
+    def set(self, product_id, price, stock):
+        """
+        Updates one product. Returns True if its price or stock changed.
+        """
+        live = {"price": price, "stock": stock}
+        with self._lock:
+            changed = self._items.get(product_id) != live
+            self._items[product_id] = live
+        return changed
+
+    def remove(self, product_id):
+        with self._lock:
+            self._items.pop(product_id, None)
+
+    def ids_matching(self, predicate):
+        """
+        Ids of the products whose live fields satisfy `predicate(live)`.
+        """
+        self._catch_up()
+        with self._lock:
+            return [pid for pid, live in self._items.items() if predicate(live)]
+
+
+class LiveVersion:
+    """
+    Version of the live price/stock data, shared through a small JSON file
+    like IndexVersion, that also remembers which product ids the last
+    `keep` bumps changed. A worker that is behind re-reads just those
+    rows instead of the whole table.
+
+    bump(ids) records a change to those products; bump() with no ids
+    means anything may have changed and every reader reloads in full, as
+    does one that has fallen further behind than the log reaches.
+    """
+
+    def __init__(self, path, keep=256):
+        self.path = path
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._state = {"version": 0, "floor": 0, "log": []}
+        self._stamp = None
+
+    def _read(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return self._state
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._stamp:
+            try:
+                with open(self.path, "r") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                return self._state
+            if isinstance(state, int):
+                # A plain IndexVersion file: no log to catch up from
+                state = {"version": state, "floor": state, "log": []}
+            self._state, self._stamp = state, stamp
+        return self._state
+
+    def current(self):
+        return self._read()["version"]
+
+    def changed_since(self, version):
+        """
+        Returns (current version, ids changed after `version`), or
+        (current version, None) when the log can't tell.
+        """
+        state = self._read()
+        if version is None or version < state["floor"]:
+            return state["version"], None
+        ids = []
+        for entry_version, entry_ids in state["log"]:
+            if entry_version <= version:
+                continue
+            if entry_ids is None:
+                return state["version"], None
+            ids.extend(entry_ids)
+        return state["version"], list(dict.fromkeys(ids))
+
+    def bump(self, ids=None):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # Read-modify-write under the file lock, so concurrent bumps
+                # from other workers don't drop each other's ids
+                self._stamp = None
+                state = self._read()
+                version = max(state["version"] + 1, time.time_ns())
+                log = state["log"] + [[version, None if ids is None else list(ids)]]
+                floor = state["floor"]
+                if len(log) > self.keep:
+                    floor = log[-self.keep - 1][0]
+                    log = log[-self.keep:]
+                state = {"version": version, "floor": floor, "log": log}
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.path)
+                self._state, self._stamp = state, None
+            return version
+
+
+def format_live_fields(live):
+    return f"Price: ${live['price']}. \nStock: {live['stock']}."
@@ -0,0 +1,128 @@
+import json
+import re
+
+# Extra words (English + Indonesian) that map onto a choice value. The
+# choice value itself, lowercased, always matches.
+GENDER_SYNONYMS = {
+    "Men": ["men", "man", "mens", "male", "pria", "cowok", "laki-laki"],
+    "Women": ["women", "woman", "womens", "ladies", "female", "wanita", "cewek", "perempuan"],
+    "Unisex": ["unisex"],
+}
+CATEGORY_SYNONYMS = {
+    "Sweater": ["sweaters", "jumper", "jumpers", "pullover", "pullovers"],
+    "Cardigan": ["cardigans", "kardigan"],
+    "Inner": ["inners", "innerwear", "dalaman"],
+    "Polo": ["polos", "polo shirt", "polo shirts"],
+}
+
+_NUMBER = r"\$?\s*(\d+(?:[.,]\d+)?)\s*(k|rb|ribu)?"
+_BETWEEN = re.compile(rf"(?:between|antara)\s+{_NUMBER}\s*(?:and|to|-|dan|sampai)\s*{_NUMBER}")
+_RANGE = re.compile(rf"{_NUMBER}\s*(?:-|to|sampai)\s*{_NUMBER}")
+_MAX = re.compile(rf"(?:under|below|less than|cheaper than|up to|max(?:imum)?|at most|<=?|di ?bawah|kurang dari|maksimal)\s*{_NUMBER}")
+_MIN = re.compile(rf"(?:over|above|more than|at least|min(?:imum)?|>=?|di ?atas|lebih dari|minimal)\s*{_NUMBER}")
+_IN_STOCK = re.compile(r"\b(in stock|available|ready stock|tersedia|ada stok|stok ada)\b")
+
+
+def _amount(number, suffix):
+    value = float(number.replace(",", "."))
+    return value * 1000 if suffix else value
+
+
+def _match_choice(text, choices, synonyms):
+    found = []
+    for value in choices:
+        words = [value.lower()] + synonyms.get(value, [])
+        if any(re.search(rf"\b{re.escape(w)}(?:'s)?\b", text) for w in words):
+            found.append(value)
+    return found
+
+
+def parse_filters(question, genders, categories):
+    """
+    Pulls exact constraints out of a question:
+    gender and category (from the Product choice values), a price range
+    and whether only in-stock products are wanted.
+
+    Returns a dict with only the keys that were found, e.g.
+    {"gender": ["Women", "Unisex"], "category": "Cardigan", "max_price": 50.0}.
+    """
+    text = question.lower()
+    filters = {}
+
+    found = _match_choice(text, genders, GENDER_SYNONYMS)
+    if len(found) == 1:
+        # Unisex items fit either gender
+        filters["gender"] = found if found[0] == "Unisex" else [found[0], "Unisex"]
+
+    found = _match_choice(text, categories, CATEGORY_SYNONYMS)
+    if len(found) == 1:
+        filters["category"] = found[0]
+
+    match = _BETWEEN.search(text)
+    if not match:
+        match = _RANGE.search(text)
+        # A bare "2-3" is more likely a size or quantity than a price
+        if match and "$" not in match.group(0):
+            match = None
+    if match:
+        low, high = _amount(*match.group(1, 2)), _amount(*match.group(3, 4))
+        filters["min_price"], filters["max_price"] = min(low, high), max(low, high)
+    else:
+        match = _MAX.search(text)
+        if match:
+            filters["max_price"] = _amount(*match.group(1, 2))
+        match = _MIN.search(text)
+        if match:
+            filters["min_price"] = _amount(*match.group(1, 2))
+
+    if _IN_STOCK.search(text):
+        filters["in_stock"] = True
+
+    return filters
+
+
+def filters_key(filters):
+    """
+    Hashable form of the filters, used to scope cached answers.
+    """
+    return json.dumps(filters, sort_keys=True) if filters else None
+
+
+def build_where(filters, snapshot):
+    """
+    Turns parsed filters into a Chroma `where` clause.
+
+    Gender and category are indexed metadata. Price and stock live in the
+    product snapshot, so they become an id filter over the products that
+    currently match. Returns (where or None, has_candidates).
+    """
+    clauses = []
+    if "gender" in filters:
+        clauses.append({"gender": {"$in": filters["gender"]}})
+    if "category" in filters:
+        clauses.append({"category": filters["category"]})
+
+    if {"min_price", "max_price", "in_stock"} & filters.keys():
+        low = filters.get("min_price")
+        high = filters.get("max_price")
+
+        def wanted(live):
+            price = float(live["price"])
+            if low is not None and price < low:
+                return False
+            if high is not None and price > high:
+                return False
+            if filters.get("in_stock") and live["stock"] <= 0:
+                return False
+            return True
+
+        ids = snapshot.ids_matching(wanted)
+        if not ids:
+            return None, False
+        clauses.append({"id": {"$in": ids}})
+
+    if not clauses:
+        return None, True
+    if len(clauses) == 1:
+        return clauses[0], True
+    return {"$and": clauses}, True
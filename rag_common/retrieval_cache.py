@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class IndexVersion:
+    """
+    Monotonically increasing version of the vector index. Call bump() after
+    anything that writes to the index.
+
+    With a `path` the version lives in a small file, so every process
+    sharing the index (uvicorn/gunicorn workers, ingest.py) sees a bump on
+    its next read. Versions are nanosecond timestamps (or last + 1), so two
+    processes bumping at once still move past each other's value.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._value = 0
+        self._stamp = None
+
+    def current(self):
+        if self.path is None:
+            return self._value
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return self._value
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._stamp:
+            try:
+                with open(self.path, "r") as f:
+                    self._value = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                return self._value
+            self._stamp = stamp
+        return self._value
+
+    def bump(self):
+        with self._lock:
+            value = max(self.current() + 1, time.time_ns())
+            if self.path is not None:
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(str(value))
+                os.replace(tmp, self.path)
+            self._value = value
+            return value
+
+
+class RetrievalCache:
+    """
+    LRU cache of retrieval results, so a repeated question skips the
+    vector + BM25 search even when its answer can't be reused.
+
+    Keyed by (normalized question, where clause, k, index version). The
+    where clause is the resolved pre-filter, including the ids that match
+    a price/stock constraint, so a price change that alters the candidate
+    set is a different key. Entries from an older index version are
+    dropped as soon as the version moves, so there is no TTL.
+    """
+
+    def __init__(self, index_version, max_size=1024, normalize=str.lower):
+        self.index_version = index_version
+        self.max_size = max_size
+        self.normalize = normalize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, question, where, k):
+        return (self.normalize(question), json.dumps(where, sort_keys=True, default=str), k)
+
+    def _check_version(self):
+        # Caller holds the lock
+        version = self.index_version.current()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, question, where, k):
+        key = self._key(question, where, k)
+        with self._lock:
+            self._check_version()
+            docs = self._entries.get(key)
+            if docs is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(docs)
+
+    def put(self, question, where, k, docs, version=None):
+        """
+        With `version`, the index version `docs` were retrieved from: they
+        are dropped if the index has moved on since (e.g. a chain still
+        serving while its replacement is built).
+        """
+        key = self._key(question, where, k)
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = tuple(docs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "index_version": self._version,
+            }
@@ -0,0 +1,38 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """
+    Wall time of each cold-start step of the AI engine (imports, embedding
+    model load, index open, chain build), in the order they first ran.
+    A step that runs again, e.g. on a chain reload, keeps its latest time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = {}
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._steps[name] = seconds
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            return {f"{name}_ms": round(seconds * 1000, 1) for name, seconds in self._steps.items()}
+
+    def report(self):
+        with self._lock:
+            steps = list(self._steps.items())
+        if not steps:
+            return "Startup: nothing loaded yet"
+        return "Startup: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in steps)
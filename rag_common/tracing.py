@@ -0,0 +1,231 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from langchain_core.runnables import Runnable
+
+# Stages recorded per request, in pipeline order. "total" is the whole request.
+STAGES = ["route", "cache", "embed", "queue", "retrieve", "vector_search", "context", "llm_first_token", "llm", "total"]
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+_current = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """
+    Timings of one request. Stages that run more than once add up.
+    """
+
+    __slots__ = ("request_id", "path", "question", "started", "stages", "tags")
+
+    def __init__(self, request_id, path, question=""):
+        self.request_id = request_id
+        self.path = path
+        self.question = question[:200]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tags = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self):
+        return " ".join(f"{stage}={self.stages[stage] * 1000:.1f}ms" for stage in STAGES if stage in self.stages)
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "path": self.path,
+            "question": self.question,
+            **self.tags,
+            "stages_ms": {s: round(self.stages[s] * 1000, 2) for s in STAGES if s in self.stages},
+        }
+
+
+def _order(name):
+    return STAGES.index(name) if name in STAGES else len(STAGES)
+
+
+def current():
+    return _current.get()
+
+
+def record(stage, seconds, trace=None):
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+def tag(**tags):
+    trace = _current.get()
+    if trace is not None:
+        trace.tags.update(tags)
+
+
+@contextmanager
+def stage(name, trace=None):
+    """
+    Times the block into the current request's trace (a no-op outside one).
+    Pass `trace` explicitly from threads that don't inherit the context.
+    """
+    trace = trace or _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - start)
+
+
+class Tracer:
+    """
+    Per-stage latency histograms across requests, plus the last `window`
+    traces (a ring buffer) from which the slowest are picked for inspection.
+
+    start() makes a trace current for the calling context: asyncio tasks,
+    asyncio.to_thread and LangChain's executors inherit it, so stage()
+    calls deep in the chain land in the right request. Numbers are per
+    process; with several workers each one reports its own.
+    """
+
+    def __init__(self, buckets=BUCKETS, window=500):
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}  # stage -> [bucket counts..., +Inf count, sum]
+        self._requests = {}  # (path, intent, outcome) -> count
+        self._recent = deque(maxlen=window)
+
+    def start(self, request_id, path, question=""):
+        trace = Trace(request_id, path, question)
+        _current.set(trace)
+        return trace
+
+    def finish(self, trace, error=None, cancelled=False):
+        """
+        Records a finished request. `cancelled` is for one the client
+        abandoned (disconnect, timeout); it counts as outcome="cancelled".
+        """
+        trace.add("total", time.perf_counter() - trace.started)
+        if error is not None:
+            trace.tags["error"] = str(error)[:200]
+        if cancelled:
+            trace.tags["cancelled"] = True
+        if _current.get() is trace:
+            _current.set(None)
+        with self._lock:
+            for name, seconds in trace.stages.items():
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = [0] * (len(self.buckets) + 1) + [0.0]
+                histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+                histogram[-1] += seconds
+            outcome = "cancelled" if cancelled else "error" if error is not None else "ok"
+            key = (trace.path, trace.tags.get("intent", "unknown"), outcome)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._recent.append(trace)
+
+    @contextmanager
+    def request(self, request_id, path, question=""):
+        trace = self.start(request_id, path, question)
+        error, cancelled = None, False
+        try:
+            yield trace
+        except Exception as e:
+            error = e
+            raise
+        except BaseException:
+            # CancelledError or GeneratorExit: the client went away
+            cancelled = True
+            raise
+        finally:
+            self.finish(trace, error, cancelled)
+
+    def slowest(self, n=10):
+        with self._lock:
+            recent = list(self._recent)
+        recent.sort(key=lambda t: t.stages.get("total", 0.0), reverse=True)
+        return [t.to_dict() for t in recent[:n]]
+
+    def prometheus(self):
+        """
+        Histograms and request counts in the Prometheus text format.
+        """
+        with self._lock:
+            histograms = {name: list(h) for name, h in self._histograms.items()}
+            requests = dict(self._requests)
+
+        lines = [
+            "# HELP rag_stage_duration_seconds Time spent in each stage of a chat request.",
+            "# TYPE rag_stage_duration_seconds histogram",
+        ]
+        for name in sorted(histograms, key=_order):
+            histogram = histograms[name]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], histogram[:-1]):
+                cumulative += count
+                lines.append(f'rag_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'rag_stage_duration_seconds_sum{{stage="{name}"}} {histogram[-1]:.6f}')
+            lines.append(f'rag_stage_duration_seconds_count{{stage="{name}"}} {cumulative}')
+
+        lines.append("# HELP rag_requests_total Chat requests by path, intent and outcome.")
+        lines.append("# TYPE rag_requests_total counter")
+        for (path, intent, outcome), count in sorted(requests.items()):
+            lines.append(f'rag_requests_total{{path="{path}",intent="{intent}",outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        with self._lock:
+            histograms = {name: (sum(h[:-1]), h[-1]) for name, h in self._histograms.items()}
+        return {
+            f"{name}_mean_ms": round(total * 1000 / count, 2) if count else 0.0
+            for name, (count, total) in sorted(histograms.items(), key=lambda item: _order(item[0]))
+        }
+
+
+class TracedRunnable(Runnable):
+    """
+    Wraps a Runnable (the LLM) so its time lands in the current trace as
+    `name`, and for streams the wait for the first chunk as `first_chunk`.
+    """
+
+    def __init__(self, runnable, name, first_chunk=None):
+        self.runnable = runnable
+        self.stage_name = name
+        self.first_chunk = first_chunk
+
+    def invoke(self, input, config=None, **kwargs):
+        with stage(self.stage_name):
+            return self.runnable.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        with stage(self.stage_name):
+            return await self.runnable.ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        trace = _current.get()
+        start = time.perf_counter()
+        first = True
+        try:
+            for chunk in self.runnable.stream(input, config, **kwargs):
+                if first and self.first_chunk:
+                    record(self.first_chunk, time.perf_counter() - start, trace)
+                first = False
+                yield chunk
+        finally:
+            record(self.stage_name, time.perf_counter() - start, trace)
+
+    async def astream(self, input, config=None, **kwargs):
+        trace = _current.get()
+        start = time.perf_counter()
+        first = True
+        try:
+            async for chunk in self.runnable.astream(input, config, **kwargs):
+                if first and self.first_chunk:
+                    record(self.first_chunk, time.perf_counter() - start, trace)
+                first = False
+                yield chunk
+        finally:
+            record(self.stage_name, time.perf_counter() - start, trace)
@@ -0,0 +1,395 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: the write lock only holds within one process
+    fcntl = None
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.json"
+
+# Chroma registers a client's System in its per-path cache before starting
+# it, so a second thread opening the same path meanwhile gets a half-built
+# one ("'RustBindingsAPI' object has no attribute 'bindings'").
+_open_lock = threading.Lock()
+_write_locks = {}
+
+
+def open_vectorstore(backend, persist_directory, embeddings, reload=False):
+    """
+    Returns the vector store for `backend` ("chroma" or "numpy"). Both
+    expose the calls the app uses: similarity_search_by_vector(), get(),
+    add_documents() and delete().
+
+    With reload=True a Chroma index is read from disk again, picking up
+    writes made by other processes since this one opened it.
+    """
+    if backend == "numpy":
+        # Re-reads the files on its own when another process replaces them
+        return NumpyVectorStore(persist_directory, embeddings)
+    from langchain_chroma import Chroma
+    with _open_lock:
+        if reload:
+            _forget_chroma_system(persist_directory)
+        return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
+
+@contextmanager
+def index_write_lock(persist_directory):
+    """
+    Held around every write to the index at `persist_directory`, so only
+    one thread in one process (web worker, re-index queue, ingest command)
+    writes at a time; Chroma doesn't support concurrent writers. Blocks
+    until the lock is free. Open the store with reload=True inside it, so
+    the write starts from what the previous writer left.
+    """
+    with _open_lock:
+        lock = _write_locks.setdefault(persist_directory, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        path = os.path.normpath(persist_directory) + ".lock"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _forget_chroma_system(persist_directory):
+    # Chroma keeps one System per path per process, with the vector index
+    # loaded in memory, and never sees another process's writes to it.
+    # Dropping it from the cache makes the next client load the index from
+    # disk; handles already open keep the old System until they are freed.
+    from chromadb.api.shared_system_client import SharedSystemClient
+    with SharedSystemClient._refcount_lock:
+        SharedSystemClient._identifier_to_system.pop(str(persist_directory), None)
+        SharedSystemClient._identifier_to_refcount.pop(str(persist_directory), None)
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class _Snapshot:
+    """
+    One immutable generation of the index: the vector matrix plus ids,
+    texts and metadatas in parallel lists. Metadata columns are built
+    as NumPy arrays on first use so filters are boolean masks.
+    """
+
+    def __init__(self, matrix, ids, texts, metadatas):
+        self.matrix = matrix
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def column(self, key):
+        with self._lock:
+            if key not in self._columns:
+                values = [m.get(key) for m in self.metadatas]
+                try:
+                    self._columns[key] = np.asarray(values)
+                except ValueError:
+                    self._columns[key] = np.asarray(values, dtype=object)
+            return self._columns[key]
+
+    def mask(self, where):
+        """
+        Boolean mask for the subset of Chroma's `where` syntax that
+        query_filters produces ($and, $or, $in, $nin, $eq, $ne, equality).
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for c in cond:
+                    mask &= self.mask(c)
+            elif key == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for c in cond:
+                    any_mask |= self.mask(c)
+                mask &= any_mask
+            else:
+                column = self.column(key)
+                if not isinstance(cond, dict):
+                    cond = {"$eq": cond}
+                for op, expected in cond.items():
+                    if op == "$in":
+                        mask &= np.isin(column, list(expected))
+                    elif op == "$nin":
+                        mask &= ~np.isin(column, list(expected))
+                    elif op == "$eq":
+                        mask &= column == expected
+                    elif op == "$ne":
+                        mask &= column != expected
+                    else:
+                        raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+
+class _Changes:
+    """
+    Edits to a snapshot that add_documents()/delete() collect before it is
+    saved. The snapshot's matrix is only copied if one of its rows changes;
+    new rows are kept as a list and streamed to disk by write_vectors(), so
+    a chunked ingest neither re-stacks the matrix per chunk nor holds a
+    second full copy of it while saving.
+    """
+
+    WRITE_ROWS = 4096  # rows per chunk written to vectors.npy
+
+    def __init__(self, snapshot):
+        self.base = snapshot.matrix
+        self.base_rows = len(snapshot.ids)
+        self._base_copied = False
+        self.new_rows = []
+        self.ids = list(snapshot.ids)
+        self.texts = list(snapshot.texts)
+        self.metadatas = list(snapshot.metadatas)
+        self.positions = dict(snapshot.positions)
+
+    def upsert(self, documents, ids, vectors):
+        for doc, doc_id, vector in zip(documents, ids, vectors):
+            i = self.positions.get(doc_id)
+            if i is None:
+                self.positions[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self.texts.append(doc.page_content)
+                self.metadatas.append(doc.metadata)
+                self.new_rows.append(vector)
+                continue
+            if i < self.base_rows:
+                if not self._base_copied:
+                    # The snapshot's matrix is a read-only memory map
+                    self.base = np.array(self.base, dtype=np.float32)
+                    self._base_copied = True
+                self.base[i] = vector
+            else:
+                self.new_rows[i - self.base_rows] = vector
+            self.texts[i] = doc.page_content
+            self.metadatas[i] = doc.metadata
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.positions.pop(doc_id, None)
+
+    def finish(self):
+        """
+        Drops deleted rows (whose id no longer points at them) from the
+        lists; returns the number of rows left.
+        """
+        self.keep = [i for i, doc_id in enumerate(self.ids) if self.positions.get(doc_id) == i]
+        if len(self.keep) < len(self.ids):
+            self.ids = [self.ids[i] for i in self.keep]
+            self.texts = [self.texts[i] for i in self.keep]
+            self.metadatas = [self.metadatas[i] for i in self.keep]
+        return len(self.keep)
+
+    def _row_chunks(self):
+        for start in range(0, len(self.keep), self.WRITE_ROWS):
+            rows = self.keep[start:start + self.WRITE_ROWS]
+            old = [i for i in rows if i < self.base_rows]
+            if old:
+                yield np.asarray(self.base[old], dtype=np.float32)
+            new = [self.new_rows[i - self.base_rows] for i in rows if i >= self.base_rows]
+            if new:
+                yield np.asarray(new, dtype=np.float32)
+
+    def write_vectors(self, f):
+        """
+        Writes the kept rows to `f` in the .npy format, a chunk at a time.
+        """
+        if not self.keep:
+            np.save(f, np.zeros((0, 0), dtype=np.float32))
+            return
+        dim = self.base.shape[1] if self.base_rows else len(self.new_rows[0])
+        np.lib.format.write_array_header_2_0(
+            f, {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                "fortran_order": False, "shape": (len(self.keep), dim)},
+        )
+        for chunk in self._row_chunks():
+            f.write(np.ascontiguousarray(chunk).tobytes())
+
+
+class NumpyVectorStore:
+    """
+    Exact (brute-force) vector search over one contiguous float32 matrix.
+
+    For a catalog of a few thousand products one matrix-vector product is
+    cheaper than a Chroma query. Vectors are L2-normalized on write, so the
+    dot product is the cosine similarity. The matrix is memory-mapped from
+    `persist_directory/vectors.npy`; ids, texts and metadata sit in
+    `docs.json`. Writes rewrite both files and swap them in with
+    os.replace(), and other processes pick up a new generation on their
+    next query (docs.json is stat()ed per call).
+    """
+
+    def __init__(self, persist_directory, embedding_function):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self._write_lock = threading.RLock()
+        self._snapshot = _Snapshot(np.zeros((0, 0), dtype=np.float32), [], [], [])
+        self._loaded_version = None
+        self._pending = None  # _Changes while inside deferred_writes()
+        self._maybe_reload()
+
+    def _path(self, name):
+        return os.path.join(self.persist_directory, name)
+
+    def _file_version(self):
+        # os.replace() gives docs.json a new inode on every write
+        try:
+            st = os.stat(self._path(DOCS_FILE))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _maybe_reload(self):
+        version = self._file_version()
+        if version is None or version == self._loaded_version:
+            return self._snapshot
+
+        with self._write_lock:
+            version = self._file_version()
+            if version != self._loaded_version:
+                with open(self._path(DOCS_FILE), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data["ids"]:
+                    matrix = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+                else:
+                    matrix = np.zeros((0, 0), dtype=np.float32)
+                self._snapshot = _Snapshot(matrix, data["ids"], data["documents"], data["metadatas"])
+                self._loaded_version = version
+        return self._snapshot
+
+    def _save(self, changes):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        changes.finish()
+        # Vectors first: a reader keys off docs.json, so it never sees
+        # new ids without their rows.
+        tmp = self._path(VECTORS_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            changes.write_vectors(f)
+        os.replace(tmp, self._path(VECTORS_FILE))
+
+        ids, texts, metadatas = changes.ids, changes.texts, changes.metadatas
+        tmp = self._path(DOCS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": texts, "metadatas": metadatas}, f)
+        os.replace(tmp, self._path(DOCS_FILE))
+
+        if ids:
+            matrix = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._snapshot = _Snapshot(matrix, ids, texts, metadatas)
+        self._loaded_version = self._file_version()
+
+    def __len__(self):
+        return len(self._maybe_reload().ids)
+
+    def add_documents(self, documents, ids):
+        """
+        Upserts documents by id, embedding them with the embedding function.
+        """
+        if not documents:
+            return []
+        vectors = np.asarray(
+            self.embedding_function.embed_documents([d.page_content for d in documents]),
+            dtype=np.float32,
+        )
+        vectors = _normalize(vectors)
+
+        with self._write_lock:
+            if self._pending is not None:
+                self._pending.upsert(documents, ids, vectors)
+            else:
+                changes = _Changes(self._maybe_reload())
+                changes.upsert(documents, ids, vectors)
+                self._save(changes)
+        return list(ids)
+
+    def delete(self, ids):
+        with self._write_lock:
+            if self._pending is not None:
+                self._pending.delete(ids)
+                return
+            current = self._maybe_reload()
+            if not any(doc_id in current.positions for doc_id in ids):
+                return
+            changes = _Changes(current)
+            changes.delete(ids)
+            self._save(changes)
+
+    @contextmanager
+    def deferred_writes(self):
+        """
+        Collects add_documents()/delete() calls inside the block and writes
+        the files once at the end, instead of rewriting the whole matrix per
+        call. Readers see the previous generation until then; nothing is
+        written if the block raises.
+        """
+        with self._write_lock:
+            self._pending = _Changes(self._maybe_reload())
+        try:
+            yield self
+            with self._write_lock:
+                self._save(self._pending)
+        finally:
+            self._pending = None
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=None):
+        current = self._maybe_reload()
+        if ids is None:
+            start = offset or 0
+            stop = len(current.ids) if limit is None else min(len(current.ids), start + limit)
+            rows = range(start, stop)
+        else:
+            rows = [current.positions[i] for i in ids if i in current.positions]
+        result = {"ids": [current.ids[i] for i in rows]}
+        if "documents" in include:
+            result["documents"] = [current.texts[i] for i in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [current.metadatas[i] for i in rows]
+        return result
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        current = self._maybe_reload()
+        if not len(current.ids) or k <= 0:
+            return []
+
+        if filter:
+            rows = np.flatnonzero(current.mask(filter))
+            if not len(rows):
+                return []
+            matrix = current.matrix[rows]
+        else:
+            rows, matrix = None, current.matrix
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        scores = matrix @ query
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            top = rows[top]
+        return [
+            Document(page_content=current.texts[i], metadata=current.metadatas[i])
+            for i in top
+        ]
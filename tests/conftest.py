@@ -0,0 +1,72 @@
+import importlib
+import os
+import sys
+import zlib
+
+import pytest
+from langchain_core.documents import Document
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# rag_common is imported from the repository root, index_snapshots from the backend
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend_fastapi"))
+
+
+class WordEmbeddings:
+    """
+    Deterministic bag-of-words vectors, so the tests need no model.
+    """
+
+    dim = 32
+
+    def embed_documents(self, texts):
+        self.calls = getattr(self, "calls", 0) + len(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vector
+
+
+def product(pid, name, gender="Women", category="Cardigan", color="Navy"):
+    return Document(
+        page_content=f"Product Name: {name}. \nGender: {gender}. \nCategory: {category}. \nColor: {color}.",
+        metadata={"id": pid, "name": name, "gender": gender, "category": category},
+    )
+
+
+@pytest.fixture
+def embeddings():
+    return WordEmbeddings()
+
+
+@pytest.fixture(params=["chroma", "numpy"])
+def store(request, tmp_path, embeddings):
+    from rag_common.vector_store import open_vectorstore
+    return open_vectorstore(request.param, str(tmp_path / "index"), embeddings)
+
+
+@pytest.fixture(scope="session")
+def rag_engine(tmp_path_factory):
+    """
+    The backend's rag_engine with its index, version file and embedding
+    cache under a temp dir, the NumPy store and the fake LLM. It reads
+    most settings at import, the LLM ones per call, so the environment
+    stays set until the session ends.
+    """
+    root = tmp_path_factory.mktemp("backend")
+    env = {
+        "VECTOR_BACKEND": "numpy", "LLM_PROVIDER": "fake", "LLM_FALLBACK_MODEL": "",
+        "INDEX_ROOT": str(root / "versions"), "INDEX_VERSION_PATH": str(root / "index_version"),
+        "EMBEDDING_CACHE_PATH": str(root / "embedding_cache.sqlite3"),
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    yield importlib.import_module("rag_engine")
+    for key, value in saved.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
@@ -0,0 +1,64 @@
+from rag_common import answer_cache
+from rag_common.answer_cache import AnswerCache, normalize_question
+
+ANSWER = {"answer": "- Navy Cardigan", "sources": [1]}
+
+
+def test_normalize_question():
+    assert normalize_question("  List ALL\n products?! ") == "list all products"
+
+
+def test_exact_hit_ignores_case_spacing_and_punctuation():
+    cache = AnswerCache()
+    cache.put("Navy cardigans?", ANSWER, latency=1.5)
+    assert cache.get_exact("navy   CARDIGANS") == ANSWER
+    assert cache.get_exact("red cardigans") is None
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1 and stats["misses"] == 0
+    assert stats["latency_saved_seconds"] == 1.5
+
+
+def test_semantic_hit_needs_similarity_and_same_scope():
+    cache = AnswerCache(threshold=0.95)
+    cache.put("navy cardigans", ANSWER, embedding=[1.0, 0.0], scope="women")
+    assert cache.get_similar([0.99, 0.05], scope="women") == ANSWER
+    # Close enough, but asked with different filters
+    assert cache.get_similar([0.99, 0.05], scope="men") is None
+    # Same scope, not similar enough
+    assert cache.get_similar([0.7, 0.7], scope="women") is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"], stats["hit_ratio"]) == (1, 2, 0.333)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl=60)
+    cache.put("navy cardigans", ANSWER, embedding=[1.0, 0.0])
+    now[0] += 59
+    assert cache.get_exact("navy cardigans") == ANSWER
+    now[0] += 2
+    assert cache.get_similar([1.0, 0.0]) is None
+    assert cache.get_exact("navy cardigans") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_size=2)
+    cache.put("a", {"answer": "a"}, embedding=[1.0, 0.0])
+    cache.put("b", {"answer": "b"}, embedding=[0.0, 1.0])
+    cache.get_exact("a")
+    cache.put("c", {"answer": "c"})
+    assert cache.get_exact("b") is None
+    assert cache.get_exact("a") == {"answer": "a"}
+    # The evicted entry is gone from the semantic layer too
+    assert cache.get_similar([0.0, 1.0]) is None
+
+
+def test_clear_empties_both_layers():
+    cache = AnswerCache()
+    cache.put("navy cardigans", ANSWER, embedding=[1.0, 0.0])
+    cache.clear()
+    assert cache.get_exact("navy cardigans") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import WordEmbeddings
+
+PRODUCTS = [
+    {"id": 1, "name": "Navy Cardigan", "description": "Soft wool cardigan", "price": 40, "stock": 2,
+     "attributes": {"gender": "Women", "category": "Cardigan", "material": "Wool", "size": "M", "color": "Navy"}},
+    {"id": 2, "name": "Grey Sweater", "description": "Warm wool sweater", "price": 35, "stock": 5,
+     "attributes": {"gender": "Men", "category": "Sweater", "material": "Wool", "size": "L", "color": "Grey"}},
+    {"id": 3, "name": "White Polo", "description": "Cotton polo shirt", "price": 25, "stock": 0,
+     "attributes": {"gender": "Men", "category": "Polo", "material": "Cotton", "size": "M", "color": "White"}},
+]
+
+
+@pytest.fixture(scope="module")
+def engine(rag_engine, tmp_path_factory):
+    """
+    rag_engine on a three-product NumPy index, with the word-count
+    embeddings.
+    """
+    catalog = str(tmp_path_factory.mktemp("catalog") / "sample_data.jsonl")
+    with open(catalog, "w") as f:
+        f.writelines(json.dumps(p) + "\n" for p in PRODUCTS)
+    catalog_file = rag_engine.catalog_file
+    rag_engine.catalog_file = lambda data_file=None: catalog
+    rag_engine._embeddings = WordEmbeddings()
+    rag_engine.sync_index(rag_engine.load_documents(catalog), rag_engine.get_ingest_embeddings())
+    rag_engine.product_snapshot.refresh()
+    rag_engine.intent_router.refresh()
+    yield rag_engine
+    rag_engine.catalog_file = catalog_file
+
+
+def run(engine, questions, concurrency=2):
+    async def collect():
+        chain = engine.get_rag_chain()
+        return [result async for result in engine.abatch_answer(chain, questions, concurrency)]
+    return sorted(asyncio.run(collect()), key=lambda result: result["index"])
+
+
+def test_each_question_gets_one_result(engine):
+    engine.answer_cache.clear()
+    results = run(engine, [
+        "list all products",
+        "What colors does the Navy Cardigan come in?",
+        "warm wool sweater for men",
+        "cotton polo shirt",
+    ])
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert [r["route"] for r in results] == ["list", "attribute", "open", "open"]
+    assert results[0]["sources"] == [2, 1, 3]
+    assert results[1]["answer"] == "**Navy Cardigan** comes in: Navy."
+    assert "Grey Sweater" in results[2]["answer"] and 2 in results[2]["sources"]
+    assert not any(r["cached"] for r in results)
+
+
+def test_fresh_answers_warm_the_cache(engine):
+    engine.answer_cache.clear()
+    first = run(engine, ["warm wool sweater for men"])
+    again = run(engine, ["Warm wool sweater for men?"])
+    assert again[0]["cached"] is True
+    assert again[0]["answer"] == first[0]["answer"]
+
+
+def test_a_failing_question_does_not_stop_the_batch(engine, monkeypatch):
+    route_question = engine.route_question
+
+    def route(question, filters):
+        if question == "boom":
+            raise RuntimeError("router failed")
+        return route_question(question, filters)
+
+    monkeypatch.setattr(engine, "route_question", route)
+    results = run(engine, ["boom", "list all products"])
+    assert results[0] == {"index": 0, "question": "boom", "error": "router failed"}
+    assert results[1]["route"] == "list"
+
+
+def test_read_questions(engine, tmp_path):
+    from batch_answer import read_questions
+
+    text = tmp_path / "questions.txt"
+    text.write_text("# FAQ\nlist all products\n\n  cotton polo?  \n")
+    assert read_questions(str(text)) == ["list all products", "cotton polo?"]
+    listed = tmp_path / "questions.json"
+    listed.write_text(json.dumps(["a", {"question": "b"}]))
+    assert read_questions(str(listed)) == ["a", "b"]
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+PRODUCTS = [
+    {"id": i, "name": f"Product {i}", "description": "Cotton shirt", "price": 20 + i, "stock": i,
+     "attributes": {"gender": "Men", "category": "Shirt", "material": "Cotton", "size": "M", "color": "White"}}
+    for i in range(1, 4)
+]
+
+
+@pytest.fixture
+def jsonl(tmp_path):
+    path = tmp_path / "sample_data.jsonl"
+    path.write_text("".join(json.dumps(p) + "\n" for p in PRODUCTS) + "\n")
+    return str(path)
+
+
+def test_jsonl_is_read_line_by_line(rag_engine, jsonl):
+    products = rag_engine.iter_products(jsonl)
+    assert next(products) == PRODUCTS[0]
+    assert list(products) == PRODUCTS[1:]  # the trailing blank line is skipped
+
+
+def test_older_array_exports_are_still_read(rag_engine, tmp_path):
+    path = tmp_path / "sample_data.json"
+    path.write_text("\n  " + json.dumps(PRODUCTS, indent=4))
+    assert list(rag_engine.iter_products(str(path))) == PRODUCTS
+
+
+def test_catalog_documents_reread_the_file(rag_engine, jsonl):
+    documents = rag_engine.load_documents(jsonl)
+    assert len(documents) == 3
+    assert [d.metadata["id"] for d in documents] == [1, 2, 3]
+    # Each pass (diff, then sync) reads the file again
+    with open(jsonl, "a") as f:
+        f.write(json.dumps(dict(PRODUCTS[0], id=4)) + "\n")
+    assert [d.metadata["id"] for d in documents] == [1, 2, 3, 4]
+    assert "Price" not in next(iter(documents)).page_content
@@ -0,0 +1,77 @@
+from langchain_core.documents import Document
+
+from rag_common import context_builder
+from rag_common.context_builder import ContextBuilder, TokenCounter
+
+
+class WordCounter:
+    """
+    One token per word, so budgets in the tests are easy to reason about.
+    """
+
+    name = "words"
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        words = text.split()
+        return text if len(words) <= max_tokens else " ".join(words[:max_tokens]) + "…"
+
+
+def doc(pid, name, description="Soft knit.", color="Navy"):
+    content = (
+        f"Product Name: {name}. \nCategory: Cardigan. \nDescription: {description}. \n"
+        f"Material: Wool. \nSize: M. \nColor: {color}."
+    )
+    return Document(page_content=content, metadata={"id": pid})
+
+
+def builder(budget, **kwargs):
+    return ContextBuilder(budget=budget, counter=WordCounter(), **kwargs)
+
+
+def test_under_budget_keeps_everything_and_appends_live_fields():
+    docs = [doc(1, "Navy Cardigan"), doc(2, "Red Polo", color="Red")]
+    live = {1: "Price: $10.", 2: None}
+    context = builder(1000, live_fields=lambda d: live[d.metadata["id"]]).build(docs)
+    assert context == f"{docs[0].page_content} \nPrice: $10.\n\n{docs[1].page_content}"
+
+
+def test_near_duplicates_are_dropped_in_relevance_order():
+    cb = builder(1000)
+    context = cb.build([doc(1, "Navy Cardigan"), doc(2, "Navy Cardigan"), doc(3, "Red Polo", color="Red")])
+    assert context.count("Navy Cardigan") == 1 and "Red Polo" in context
+    assert cb.stats()["deduped_docs"] == 1
+
+
+def test_description_is_cut_before_anything_is_dropped():
+    long = " ".join(["warm"] * 200)
+    cb = builder(120, live_fields=lambda d: "Price: $10.")
+    context = cb.build([doc(1, "Navy Cardigan", long), doc(2, "Red Polo", long, color="Red")])
+    assert WordCounter().count(context) <= 120
+    assert "Product Name: Navy Cardigan" in context and "Product Name: Red Polo" in context
+    assert context.count("Price: $10.") == 2
+    assert "warm…" in context
+    stats = cb.stats()
+    assert (stats["truncated_docs"], stats["dropped_docs"]) == (2, 0)
+    assert stats["mean_tokens_saved"] > 300
+
+
+def test_least_relevant_docs_are_dropped_but_the_top_one_stays():
+    docs = [doc(i, f"Cardigan {i}", color=f"Color{i}") for i in range(5)]
+    cb = builder(40)
+    context = cb.build(docs)
+    assert "Cardigan 0" in context and "Cardigan 4" not in context
+    assert WordCounter().count(context) <= 40
+    # A budget too small for even one document still sends the best one
+    assert "Cardigan 0" in builder(1).build(docs)
+
+
+def test_estimate_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(context_builder, "tiktoken", None)
+    counter = TokenCounter()
+    assert counter.name == "estimate"
+    assert counter.count("abcdefgh") == 2
+    assert counter.truncate("abcdefghijkl", 2) == "abcdefgh…"
+    assert counter.truncate("abc", 2) == "abc"
@@ -0,0 +1,70 @@
+from rag_common import conversation_memory
+from rag_common.conversation_memory import ConversationMemory
+
+
+def test_no_session_means_no_memory():
+    memory = ConversationMemory()
+    memory.add_turn(None, "women's cardigans?", "- Navy Cardigan")
+    assert memory.history(None) == ""
+    assert memory.condense(None, "what about in blue?") == "what about in blue?"
+    assert memory.stats()["sessions"] == 0
+
+
+def test_history_lists_the_turns():
+    memory = ConversationMemory()
+    memory.add_turn("s", "women's cardigans?", "- Navy Cardigan")
+    assert memory.history("s") == "User: women's cardigans?\nAssistant: - Navy Cardigan"
+    assert memory.history("other") == ""
+
+
+def test_follow_ups_are_condensed_with_the_previous_query():
+    memory = ConversationMemory()
+    memory.add_turn("s", "Women's cardigans?", "- Navy Cardigan")
+    query = memory.condense("s", "what about in blue?")
+    assert query == "Women's cardigans? what about in blue?"
+    # A chain of follow-ups keeps its subject
+    memory.add_turn("s", "what about in blue?", "- Blue Cardigan", query=query)
+    assert memory.condense("s", "is it in stock?") == "Women's cardigans? what about in blue? is it in stock?"
+    # A new question stands on its own
+    assert memory.condense("s", "Do you sell polo shirts?") == "Do you sell polo shirts?"
+    assert memory.stats()["condensed_queries"] == 2
+
+
+def test_old_turns_fold_into_a_capped_summary():
+    memory = ConversationMemory(max_turns=2, summary_chars=60, answer_chars=20)
+    for i in range(4):
+        memory.add_turn("s", f"question {i}", f"answer {i} " + "x" * 50)
+    history = memory.history("s").split("\n")
+    assert history[0].startswith("Summary of earlier turns: ")
+    assert len(history[0]) <= len("Summary of earlier turns: ") + 60
+    assert "question 1" in history[0]  # the newest folded turn survives the cap
+    assert history[1:3] == ["User: question 2", "Assistant: answer 2 xxxxxxxxxx…"]
+    assert memory.stats()["turns"] == 2
+
+
+def test_least_recently_used_session_is_evicted():
+    memory = ConversationMemory(max_sessions=2)
+    memory.add_turn("a", "q", "a")
+    memory.add_turn("b", "q", "a")
+    memory.history("a")
+    memory.add_turn("c", "q", "a")
+    assert memory.history("b") == "" and memory.history("a") != ""
+    assert memory.stats()["evictions"] == 1
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(conversation_memory.time, "monotonic", lambda: now[0])
+    memory = ConversationMemory(idle_ttl=60)
+    memory.add_turn("s", "q", "a")
+    now[0] += 61
+    assert memory.history("s") == ""
+    assert memory.stats() == {"sessions": 0, "max_sessions": 1000, "turns": 0, "condensed_queries": 0, "evictions": 1}
+
+
+def test_clear_forgets_one_session():
+    memory = ConversationMemory()
+    memory.add_turn("a", "q", "a")
+    memory.add_turn("b", "q", "a")
+    memory.clear("a")
+    assert memory.history("a") == "" and memory.history("b") != ""
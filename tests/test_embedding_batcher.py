@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+import pytest
+
+from rag_common.embedding_batcher import EmbeddingBatcher
+
+
+class BlockingEmbed:
+    """
+    Embeds text as [len(text)], holding the first batch until released so
+    the test can queue and cancel requests behind it.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        return [[float(len(text))] for text in texts]
+
+
+def test_batches_concurrent_texts():
+    embed = BlockingEmbed()
+    batcher = EmbeddingBatcher(embed, window_ms=0)
+    first = batcher.submit("a")
+    embed.started.wait(5)
+    queued = [batcher.submit(text) for text in ("bb", "ccc")]
+    embed.release.set()
+    assert first.result(5) == [1.0]
+    assert [future.result(5) for future in queued] == [[2.0], [3.0]]
+    assert embed.batches == [["a"], ["bb", "ccc"]]
+
+
+def test_cancelled_future_is_skipped_and_worker_survives():
+    embed = BlockingEmbed()
+    batcher = EmbeddingBatcher(embed, window_ms=0)
+    running = batcher.submit("a")
+    embed.started.wait(5)
+
+    # Queued behind the running batch, then abandoned by its caller
+    cancelled, kept = batcher.submit("bb"), batcher.submit("ccc")
+    assert cancelled.cancel()
+    # Already picked up by the worker: too late to cancel
+    assert not running.cancel()
+    embed.release.set()
+
+    assert running.result(5) == [1.0]
+    assert kept.result(5) == [3.0]
+    assert embed.batches == [["a"], ["ccc"]]
+    assert batcher.embed("dddd") == [4.0]
+    assert all(thread.is_alive() for thread in batcher._threads)
+    assert batcher.stats()["requests"] == 3
+
+
+def test_client_disconnect_while_queued():
+    embed = BlockingEmbed()
+    batcher = EmbeddingBatcher(embed, window_ms=0)
+    batcher.submit("a")
+    embed.started.wait(5)
+
+    async def disconnecting_client():
+        # wait_for cancels the wrap_future wrapper, like a dropped request
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.wrap_future(batcher.submit("bb")), 0.05)
+
+    asyncio.run(disconnecting_client())
+    embed.release.set()
+    assert batcher.submit("ccc").result(5) == [3.0]
+
+
+def test_dead_worker_is_replaced():
+    batcher = EmbeddingBatcher(lambda texts: [[1.0] for _ in texts])
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    batcher._threads = [dead]
+    assert batcher.embed("a") == [1.0]
+    assert dead not in batcher._threads and len(batcher._threads) == 1
+
+
+def test_embedding_error_reaches_every_caller():
+    def fail(texts):
+        raise RuntimeError("model not loaded")
+
+    batcher = EmbeddingBatcher(fail)
+    with pytest.raises(RuntimeError):
+        batcher.embed("a")
+    with pytest.raises(RuntimeError):
+        batcher.embed("b")
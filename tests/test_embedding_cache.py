@@ -0,0 +1,52 @@
+import pytest
+
+from rag_common.embedding_cache import CachedEmbeddings, format_cache_stats
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "embedding_cache.sqlite3")
+
+
+def test_only_unseen_texts_reach_the_model(embeddings, path):
+    cache = CachedEmbeddings(embeddings, "word-model", path)
+    first = cache.embed_documents(["navy cardigan", "red polo", "navy cardigan"])
+    assert embeddings.calls == 2  # the repeat is embedded once
+    assert first[0] == first[2] == embeddings.embed_query("navy cardigan")
+
+    # A new run (new wrapper) reads the vectors back from disk
+    again = CachedEmbeddings(embeddings, "word-model", path)
+    assert again.embed_documents(["red polo", "grey sweater"]) == [
+        embeddings.embed_query("red polo"), embeddings.embed_query("grey sweater"),
+    ]
+    assert embeddings.calls == 3
+    stats = again.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_vectors_are_kept_per_model(embeddings, path):
+    CachedEmbeddings(embeddings, "model-a", path).embed_documents(["navy cardigan"])
+    other = CachedEmbeddings(embeddings, "model-b", path)
+    other.embed_documents(["navy cardigan"])
+    assert other.stats()["misses"] == 1
+
+
+def test_large_batches_stay_under_the_parameter_limit(embeddings, path):
+    texts = [f"product {i}" for i in range(1200)]
+    CachedEmbeddings(embeddings, "word-model", path).embed_documents(texts)
+    cache = CachedEmbeddings(embeddings, "word-model", path)
+    assert cache.embed_documents(texts) == [embeddings.embed_query(t) for t in texts]
+    assert cache.stats()["hits"] == 1200
+
+
+def test_queries_are_not_cached(embeddings, path):
+    cache = CachedEmbeddings(embeddings, "word-model", path)
+    assert cache.embed_query("navy") == embeddings.embed_query("navy")
+    assert cache.stats()["misses"] == 0
+
+
+def test_format_cache_stats():
+    stats = {"hits": 3, "misses": 1, "hit_rate": 0.75, "embed_seconds": 0.2, "seconds_saved": 0.6}
+    assert format_cache_stats(stats) == (
+        "Embedding cache: 3 hits / 1 misses (75% hit rate), 0.2s embedding, ~0.6s saved"
+    )
@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+from rag_common.hybrid_search import BM25Index, rrf_fuse
+
+from conftest import product
+
+
+def ids(docs):
+    return [doc.metadata["id"] for doc in docs]
+
+
+def test_rarer_and_repeated_terms_rank_first():
+    index = BM25Index()
+    index.upsert([
+        product(1, "Navy Cardigan"),
+        product(2, "Cashmere Cardigan"),
+        product(3, "Cashmere Cashmere Sweater", category="Sweater"),
+    ])
+    assert ids(index.search("cashmere", 3)) == [3, 2]
+    assert ids(index.search("cashmere cardigan", 1)) == [2]
+    # Field labels are not indexed
+    assert index.search("category", 3) == []
+
+
+def test_where_filter_skips_to_the_next_best():
+    index = BM25Index()
+    index.upsert([product(i, f"Wool Sweater {i}", gender="Men" if i % 2 else "Women") for i in range(10)])
+    results = index.search("wool", 3, where={"gender": {"$in": ["Women"]}})
+    assert len(results) == 3
+    assert all(doc.metadata["gender"] == "Women" for doc in results)
+
+
+def test_removed_rows_are_reused_and_never_returned():
+    index = BM25Index()
+    index.upsert([product(i, f"Linen Polo {i}") for i in range(5)])
+    index.remove([1, 3])
+    assert sorted(ids(index.search("linen", 10))) == [0, 2, 4]
+    index.upsert([product(7, "Linen Shirt")])
+    assert len(index) == 4
+    assert sorted(ids(index.search("linen", 10))) == [0, 2, 4, 7]
+    assert ids(index.search("shirt", 10)) == [7]
+
+
+def test_unchanged_hash_is_skipped_and_changed_text_reindexed():
+    index = BM25Index()
+    doc = product(1, "Alpaca Cardigan")
+    doc.metadata["content_hash"] = "a"
+    index.upsert([doc])
+    renamed = Document(page_content="Product Name: Merino Cardigan.", metadata={"id": 1, "content_hash": "a"})
+    index.upsert([renamed])
+    assert ids(index.search("alpaca", 5)) == [1]
+    renamed.metadata["content_hash"] = "b"
+    index.upsert([renamed])
+    assert index.search("alpaca", 5) == []
+    assert ids(index.search("merino", 5)) == [1]
+
+
+def test_rrf_fuse_rewards_documents_in_both_lists():
+    a, b, c = product(1, "A"), product(2, "B"), product(3, "C")
+    assert ids(rrf_fuse([[a, b], [c, b]], 2)) == [2, 1]
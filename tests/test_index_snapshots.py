@@ -0,0 +1,121 @@
+import os
+import threading
+
+import pytest
+
+from index_snapshots import IndexBusy, IndexSnapshots
+
+
+def write(path, name, text):
+    with open(os.path.join(path, name), "w") as f:
+        f.write(text)
+
+
+def read(path, name):
+    with open(os.path.join(path, name)) as f:
+        return f.read()
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    return IndexSnapshots(str(tmp_path / "versions"), keep=1, drain_seconds=0)
+
+
+def test_build_goes_live_on_success(snapshots):
+    assert snapshots.current() is None
+    with snapshots.build() as build:
+        write(build.path, "data", "one")
+        build.docs = 1
+    assert snapshots.current_name() == build.name
+    assert read(snapshots.current(), "data") == "one"
+    assert snapshots.versions()[0]["docs"] == 1
+
+
+def test_build_starts_from_the_live_version(snapshots):
+    with snapshots.build() as first:
+        write(first.path, "data", "one")
+    with snapshots.build() as second:
+        assert read(second.path, "data") == "one"
+        # Readers still see the old version while the build runs
+        assert snapshots.current_name() == first.name
+        write(second.path, "data", "two")
+    assert snapshots.current_name() == second.name
+    assert read(snapshots.current(), "data") == "two"
+
+
+def test_failed_build_is_thrown_away(snapshots):
+    with snapshots.build() as first:
+        write(first.path, "data", "one")
+    with pytest.raises(RuntimeError):
+        with snapshots.build() as failed:
+            write(failed.path, "data", "half")
+            raise RuntimeError("embedding failed")
+    assert snapshots.current_name() == first.name
+    assert not os.path.exists(failed.path)
+
+
+def test_unpublished_build_is_discarded(snapshots):
+    with snapshots.build() as first:
+        pass
+    with snapshots.build() as noop:
+        noop.publish = False
+    assert snapshots.current_name() == first.name
+    assert not os.path.exists(noop.path)
+
+
+def test_restore_swaps_back(snapshots):
+    with snapshots.build() as first:
+        write(first.path, "data", "one")
+    with snapshots.build() as second:
+        write(second.path, "data", "two")
+
+    snapshots.restore(first.name)
+    assert snapshots.current_name() == first.name
+    assert read(snapshots.current(), "data") == "one"
+    current = [v["name"] for v in snapshots.versions() if v["current"]]
+    assert current == [first.name]
+
+    with pytest.raises(KeyError):
+        snapshots.restore("v0")
+
+
+def test_only_one_build_at_a_time(snapshots):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        with snapshots.build():
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=slow_build)
+    thread.start()
+    started.wait(5)
+    try:
+        with pytest.raises(IndexBusy):
+            with snapshots.build():
+                pass
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_gc_keeps_the_newest_retired_versions(snapshots):
+    names = []
+    for _ in range(3):
+        with snapshots.build() as build:
+            pass
+        names.append(build.name)
+    # keep=1: the live version plus one retired version survive
+    assert sorted(v["name"] for v in snapshots.versions()) == sorted(names[1:])
+    assert not os.path.exists(os.path.join(snapshots.root, names[0]))
+
+
+def test_legacy_index_is_served_until_the_first_build(tmp_path):
+    legacy = tmp_path / "chroma_db"
+    legacy.mkdir()
+    (legacy / "data").write_text("legacy")
+    snapshots = IndexSnapshots(str(tmp_path / "versions"), legacy_dir=str(legacy))
+    assert snapshots.current() == str(legacy)
+    with snapshots.build() as build:
+        assert read(build.path, "data") == "legacy"
+    assert snapshots.current() == build.path
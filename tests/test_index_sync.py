@@ -0,0 +1,93 @@
+from conftest import product
+from rag_common.index_sync import sync_documents, plan_sync, apply_changes
+
+
+def catalog():
+    return [product(1, "Navy Cardigan"), product(2, "Grey Sweater", category="Sweater"), product(3, "White Polo", category="Polo")]
+
+
+def indexed_ids(store):
+    return sorted(store.get()["ids"])
+
+
+def test_first_sync_adds_everything(store):
+    counts = sync_documents(store, catalog())
+    assert counts == {"added": 3, "updated": 0, "unchanged": 0, "deleted": 0}
+    assert indexed_ids(store) == ["1", "2", "3"]
+
+
+def test_resync_only_writes_what_changed(store, embeddings):
+    sync_documents(store, catalog())
+    embeddings.calls = 0
+
+    docs = catalog()
+    docs[0] = product(1, "Navy Cardigan", color="Black")  # changed
+    del docs[2]  # removed
+    docs.append(product(4, "Linen Inner", category="Inner"))  # new
+
+    counts = sync_documents(store, docs, batch_size=1)
+    assert counts == {"added": 1, "updated": 1, "unchanged": 1, "deleted": 1}
+    assert embeddings.calls == 2
+    assert indexed_ids(store) == ["1", "2", "4"]
+    assert "Black" in store.get(ids=["1"])["documents"][0]
+
+
+def test_entries_with_random_ids_are_cleaned_up(store):
+    # What the old full rebuild left behind
+    store.add_documents(catalog(), ids=["a1", "b2", "c3"])
+    counts = sync_documents(store, catalog())
+    assert counts == {"added": 3, "updated": 0, "unchanged": 0, "deleted": 3}
+    assert indexed_ids(store) == ["1", "2", "3"]
+
+
+def test_metadata_change_counts_as_update(store):
+    sync_documents(store, catalog())
+    docs = catalog()
+    docs[1].metadata["gender"] = "Unisex"
+    assert sync_documents(store, docs)["updated"] == 1
+
+
+def test_plan_sync_matches_sync_without_writing(store):
+    sync_documents(store, catalog())
+    docs = catalog()[:2] + [product(5, "Red Cardigan")]
+    docs[1] = product(2, "Grey Sweater", category="Sweater", color="Grey")
+
+    plan = plan_sync(store, docs)
+    assert plan == {"added": 1, "updated": 1, "unchanged": 1, "deleted": 1}
+    assert indexed_ids(store) == ["1", "2", "3"]
+
+    docs = catalog()[:2] + [product(5, "Red Cardigan")]
+    docs[1] = product(2, "Grey Sweater", category="Sweater", color="Grey")
+    assert sync_documents(store, docs) == plan
+
+
+def test_progress_reports_every_batch(store):
+    calls = []
+    sync_documents(store, iter(catalog()), batch_size=2, progress=lambda done, total: calls.append((done, total)), total=3)
+    assert calls == [(0, 3), (2, 3), (3, 3)]
+
+
+def test_apply_changes_leaves_other_products_alone(store):
+    sync_documents(store, catalog())
+    counts = apply_changes(store, [product(2, "Grey Sweater", category="Sweater"), product(6, "Pink Polo", category="Polo")], deleted_ids=[3])
+    assert counts == {"added": 1, "updated": 0, "unchanged": 1, "deleted": 1}
+    assert indexed_ids(store) == ["1", "2", "6"]
+
+
+def test_documents_are_read_and_written_a_batch_at_a_time(store):
+    read, writes = [], []
+    add_documents = store.add_documents
+
+    def stream():
+        for doc in catalog():
+            read.append(doc.metadata["id"])
+            yield doc
+
+    def record(documents, ids):
+        writes.append((ids, list(read)))
+        return add_documents(documents=documents, ids=ids)
+
+    store.add_documents = record
+    sync_documents(store, stream(), batch_size=2)
+    # The first batch is written before the last product is read
+    assert writes == [(["1", "2"], [1, 2]), (["3"], [1, 2, 3])]
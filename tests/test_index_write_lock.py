@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import pytest
+from django.conf import settings
+
+from conftest import ROOT
+from rag_common.vector_store import index_write_lock, fcntl
+
+# ReindexQueue is plain Python in the Django app; it reads settings once,
+# at import, with a default for each
+if not settings.configured:
+    settings.configure()
+sys.path.insert(0, os.path.join(ROOT, "frontend_django"))
+from chat_app.reindex_queue import ReindexQueue  # noqa: E402
+
+
+def _write_under_lock(directory, log, name):
+    with index_write_lock(directory):
+        with open(log, "a") as f:
+            f.write(f"{name} start\n")
+        time.sleep(0.05)
+        with open(log, "a") as f:
+            f.write(f"{name} end\n")
+
+
+def _assert_not_interleaved(log):
+    lines = open(log).read().split()
+    pairs = list(zip(lines[0::4], lines[1::4], lines[2::4], lines[3::4]))
+    assert all(name == again and start == "start" and end == "end"
+               for name, start, again, end in pairs), lines
+
+
+def test_threads_write_one_at_a_time(tmp_path):
+    log = str(tmp_path / "log")
+    threads = [threading.Thread(target=_write_under_lock, args=(str(tmp_path / "index"), log, f"t{i}")) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _assert_not_interleaved(log)
+    assert len(open(log).readlines()) == 8
+
+
+@pytest.mark.skipif(fcntl is None, reason="the write lock only holds within one process without fcntl")
+def test_processes_write_one_at_a_time(tmp_path):
+    log = str(tmp_path / "log")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_write_under_lock, args=(str(tmp_path / "index"), log, f"p{i}")) for i in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(10)
+    assert all(process.exitcode == 0 for process in processes)
+    _assert_not_interleaved(log)
+    assert os.path.exists(str(tmp_path / "index") + ".lock")
+
+
+def test_lock_is_released_when_the_write_fails(tmp_path):
+    directory = str(tmp_path / "index")
+    with pytest.raises(RuntimeError):
+        with index_write_lock(directory):
+            raise RuntimeError("embedding failed")
+    acquired = threading.Event()
+
+    def write():
+        with index_write_lock(directory):
+            acquired.set()
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    assert acquired.wait(2)
+
+
+def test_failed_batch_is_retried_and_newer_edits_win():
+    calls = []
+    done = threading.Event()
+
+    def flush(upsert_ids, deleted_ids):
+        calls.append((sorted(upsert_ids), sorted(deleted_ids)))
+        if len(calls) == 1:
+            # A product is deleted while the first attempt is failing
+            queue.enqueue(2, deleted=True)
+            raise RuntimeError("index locked")
+        done.set()
+        return {"added": len(upsert_ids)}
+
+    queue = ReindexQueue(flush, debounce=0.01, max_wait=0.1, retry_delay=0.05)
+    queue.enqueue(1)
+    queue.enqueue(2)
+    assert done.wait(5)
+    assert calls == [([1, 2], []), ([1], [2])]
+    deadline = time.monotonic() + 5
+    while queue.stats()["flushes"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = queue.stats()
+    assert (stats["retries"], stats["flushes"], stats["last_error"]) == (1, 2, None)
+    assert stats["depth"] == 0
@@ -0,0 +1,124 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from rag_common.ingest_jobs import ACTIVE_FILE, IngestJobs, fcntl
+
+
+def wait_for(jobs, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} never reached {status}: {jobs.get(job_id)}")
+
+
+class Gate:
+    """A run() that blocks until released, counting its runs."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.runs = 0
+
+    def __call__(self, job):
+        self.runs += 1
+        job.progress(1, 2)
+        self.release.wait(5)
+        return {"added": 2}
+
+
+def test_triggers_while_running_queue_one_follow_up(tmp_path):
+    run = Gate()
+    jobs = IngestJobs(run, state_dir=str(tmp_path))
+    first, coalesced = jobs.submit()
+    assert not coalesced
+    wait_for(jobs, first["id"], "running")
+
+    second, coalesced = jobs.submit()
+    assert (second["status"], coalesced) == ("queued", False)
+    third, coalesced = jobs.submit()
+    assert (third["id"], third["triggers"], coalesced) == (second["id"], 2, True)
+
+    run.release.set()
+    done = wait_for(jobs, second["id"], "succeeded")
+    assert (done["result"], done["triggers"], run.runs) == ({"added": 2}, 2, 2)
+    assert [job["id"] for job in jobs.recent()] == [second["id"], first["id"]]
+
+
+def test_a_failed_run_is_reported(tmp_path):
+    def run(job):
+        raise RuntimeError("embedding failed")
+
+    jobs = IngestJobs(run, state_dir=str(tmp_path))
+    job, _ = jobs.submit()
+    failed = wait_for(jobs, job["id"], "failed")
+    assert (failed["phase"], failed["error"]) == ("failed", "embedding failed")
+    # Another worker reads the state file
+    assert IngestJobs(run, state_dir=str(tmp_path)).get(job["id"])["status"] == "failed"
+
+
+def _submit_from_another_worker(state_dir, log, conn):
+    def run(job):
+        with open(log, "a") as f:
+            f.write(f"worker {job.id}\n")
+        return {"added": 1}
+
+    jobs = IngestJobs(run, state_dir=state_dir)
+    job, coalesced = jobs.submit()
+    conn.send((job, coalesced))
+    conn.send(wait_for(jobs, job["id"], "succeeded", timeout=10))
+
+
+@pytest.mark.skipif(fcntl is None, reason="jobs are only coalesced within one process without fcntl")
+def test_triggers_are_coalesced_across_workers(tmp_path):
+    state_dir, log = str(tmp_path), str(tmp_path / "log")
+    release = threading.Event()
+
+    def run(job):
+        release.wait(5)
+        with open(log, "a") as f:
+            f.write(f"main {job.id}\n")
+        return {"added": 1}
+
+    jobs = IngestJobs(run, state_dir=state_dir)
+    first, _ = jobs.submit()
+    wait_for(jobs, first["id"], "running")
+
+    context = multiprocessing.get_context("fork")
+    conn, child_conn = context.Pipe()
+    worker = context.Process(target=_submit_from_another_worker, args=(state_dir, log, child_conn))
+    worker.start()
+    queued, coalesced = conn.recv()
+    assert (queued["status"], coalesced) == ("queued", False)
+
+    # This worker joins the other worker's queued job rather than adding one
+    joined, coalesced = jobs.submit()
+    assert (joined["id"], joined["triggers"], coalesced) == (queued["id"], 2, True)
+
+    release.set()
+    assert conn.poll(10)
+    done = conn.recv()
+    worker.join(5)
+    assert (done["status"], done["triggers"]) == ("succeeded", 2)
+    # The queued job waited for the running one
+    assert open(log).read().split("\n")[:2] == [f"main {first['id']}", f"worker {queued['id']}"]
+
+
+@pytest.mark.skipif(fcntl is None, reason="jobs are only coalesced within one process without fcntl")
+def test_jobs_of_a_dead_worker_are_forgotten(tmp_path):
+    worker = multiprocessing.get_context("fork").Process(target=os._exit, args=(0,))
+    worker.start()
+    worker.join()
+    with open(tmp_path / ACTIVE_FILE, "w") as f:
+        json.dump({"running": None, "queued": {"id": "lost", "pid": worker.pid, "triggers": 1}}, f)
+
+    jobs = IngestJobs(lambda job: {"added": 0}, state_dir=str(tmp_path))
+    job, coalesced = jobs.submit()
+    assert job["id"] != "lost" and not coalesced
+    wait_for(jobs, job["id"], "succeeded")
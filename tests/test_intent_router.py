@@ -0,0 +1,84 @@
+import pytest
+
+from rag_common.intent_router import IntentRouter, K_COMPARE, K_DEFAULT, K_SPECIFIC
+
+CATALOG = [
+    {"id": 1, "name": "Polo Shirt", "gender": "Men", "category": "Polo", "material": "Cotton", "size": "M, L", "color": "White"},
+    {"id": 2, "name": "Polo Shirt Slim", "gender": "Men", "category": "Polo", "material": "Pique", "size": "S", "color": ""},
+    {"id": 3, "name": "Navy Cardigan", "gender": "Women", "category": "Cardigan", "material": "Wool", "size": "All Size", "color": "Navy"},
+]
+LIVE = {1: {"price": 25, "stock": 4}, 2: {"price": 30, "stock": 0}, 3: {"price": 40, "stock": 2}}
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(lambda: CATALOG, LIVE.get, not_found="Not found.")
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What colors does the Polo Shirt come in?", "**Polo Shirt** comes in: White."),
+    ("navy cardigan size?", "**Navy Cardigan** is available in sizes: All Size."),
+    ("what is the Navy Cardigan made of", "**Navy Cardigan** is made of Wool."),
+    ("berapa harga navy cardigan", "**Navy Cardigan** costs $40."),
+    ("Is the polo shirt slim in stock?", "**Polo Shirt Slim** is currently out of stock."),
+    ("polo shirt stock", "**Polo Shirt** has 4 in stock."),
+])
+def test_single_attribute_lookups_are_answered_from_the_catalog(router, question, answer):
+    route = router.route(question)
+    assert route.intent == "attribute" and route.answer == answer and route.k is None
+
+
+def test_longest_name_wins(router):
+    assert router.route("Polo Shirt Slim price").sources == [2]
+
+
+def test_missing_attribute_goes_to_the_chain(router):
+    # No color on file: the chain answers instead of an empty lookup
+    route = router.route("what color is the polo shirt slim")
+    assert route == ("open", None, None, K_SPECIFIC)
+
+
+def test_listing_applies_the_filters(router):
+    route = router.route("list all products", matches=lambda p: p["gender"] == "Men")
+    assert route.intent == "list" and route.sources == [1, 2]
+    assert route.answer.endswith("- Polo Shirt\n- Polo Shirt Slim")
+    empty = router.route("daftar produk", matches=lambda p: False)
+    assert (empty.answer, empty.sources) == ("Not found.", [])
+
+
+def test_listing_with_an_attribute_needs_the_llm(router):
+    assert router.route("list all products with their prices").intent == "open"
+
+
+@pytest.mark.parametrize("question, k", [
+    ("something warm for winter", K_DEFAULT),
+    ("tell me about the navy cardigan", K_SPECIFIC),
+    ("polo shirt or navy cardigan?", K_COMPARE),
+    ("compare the navy cardigan price with others", K_COMPARE),
+])
+def test_open_questions_get_a_k(router, question, k):
+    assert router.route(question) == ("open", None, None, k)
+
+
+def test_catalog_is_reloaded_after_max_age(monkeypatch):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return CATALOG
+
+    router = IntentRouter(loader, LIVE.get, max_age=60)
+    router.route("hi")
+    router.route("hi")
+    assert len(loads) == 1
+    router._loaded_at -= 61
+    router.route("hi")
+    assert len(loads) == 2
+
+
+def test_stats_per_intent(router):
+    router.record("list", 0.002)
+    router.record("list", 0.004)
+    router.route("hi")
+    stats = router.stats()
+    assert (stats["catalog_products"], stats["list_requests"], stats["list_mean_ms"]) == (3, 2, 3.0)
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+
+from rag_common.llm_provider import FakeChatModel, ResilientChatModel
+
+
+class Model:
+    """
+    Answers with its name after `delay` seconds, or raises if `fail`.
+    Streams yield the name, then "!".
+    """
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.closed = False
+
+    def _check(self):
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+
+    def invoke(self, input, config=None):
+        time.sleep(self.delay)
+        self._check()
+        return self.name
+
+    async def ainvoke(self, input, config=None):
+        await asyncio.sleep(self.delay)
+        self._check()
+        return self.name
+
+    def stream(self, input, config=None):
+        time.sleep(self.delay)
+        self._check()
+        yield self.name
+        yield "!"
+
+    async def astream(self, input, config=None):
+        await asyncio.sleep(self.delay)
+        self._check()
+        try:
+            yield self.name
+            await asyncio.sleep(self.delay)
+            yield "!"
+        finally:
+            self.closed = True
+
+
+def resilient(primary, fallback=None, **kwargs):
+    kwargs.setdefault("hedge_after", 0.05)
+    kwargs.setdefault("min_hedge_after", 0.0)
+    return ResilientChatModel(primary, fallback, **kwargs)
+
+
+def test_fast_primary_answers_without_a_hedge():
+    llm = resilient(Model("primary"), Model("fallback"))
+    assert llm.invoke("hi") == "primary"
+    stats = llm.stats()
+    assert (stats["primary_wins"], stats["hedged"], stats["fallbacks"]) == (1, 0, 0)
+
+
+def test_failed_primary_falls_back():
+    llm = resilient(Model("primary", fail=True), Model("fallback"), hedge=False)
+    assert llm.invoke("hi") == "fallback"
+    assert list(llm.stream("hi")) == ["fallback", "!"]
+    assert llm.stats()["fallbacks"] == 2
+
+
+def test_slow_primary_is_hedged_and_censored():
+    llm = resilient(Model("primary", delay=0.5), Model("fallback"))
+    assert llm.invoke("hi") == "fallback"
+    stats = llm.stats()
+    assert (stats["hedged"], stats["hedge_wins"], stats["censored"]) == (1, 1, 1)
+    # The loser is recorded as taking at least as long as it was waited for
+    assert list(llm._samples["invoke"])[0] >= 0.05
+
+
+def test_hedge_threshold_follows_the_p95_once_there_are_enough_samples():
+    llm = resilient(Model("primary"), Model("fallback"), hedge_after=8.0, min_samples=20)
+    assert llm._hedge_after("invoke") == 8.0
+    llm._samples["invoke"].extend([0.1] * 19 + [5.0])
+    assert llm._hedge_after("invoke") == 0.1
+
+
+def test_deadline_raises_timeout():
+    llm = resilient(Model("primary", delay=0.5), deadline=0.1)
+    with pytest.raises(TimeoutError):
+        llm.invoke("hi")
+    assert llm.stats()["timeouts"] == 1
+
+
+def test_last_error_is_raised_when_both_fail():
+    llm = resilient(Model("primary", fail=True), Model("fallback", fail=True))
+    with pytest.raises(RuntimeError, match="fallback is down"):
+        llm.invoke("hi")
+    assert llm.stats()["errors"] == 1
+
+
+def test_async_hedge_and_fallback():
+    async def run():
+        hedged = resilient(Model("primary", delay=0.5), Model("fallback"))
+        assert await hedged.ainvoke("hi") == "fallback"
+        failing = resilient(Model("primary", fail=True), Model("fallback"))
+        assert [chunk async for chunk in failing.astream("hi")] == ["fallback", "!"]
+        return hedged.stats(), failing.stats()
+
+    hedged, failing = asyncio.run(run())
+    assert (hedged["hedge_wins"], hedged["censored"]) == (1, 1)
+    assert failing["fallbacks"] == 1
+
+
+class Gated(Model):
+    """
+    Streams only once `gate` is set; the other model sets it on its way to
+    its first chunk, so both have one when the race looks at them.
+    """
+
+    def __init__(self, name, gate, opens=False):
+        super().__init__(name)
+        self.gate = gate
+        self.opens = opens
+
+    async def astream(self, input, config=None):
+        if self.opens:
+            self.gate.set()
+        else:
+            await self.gate.wait()
+        async for chunk in super().astream(input, config):
+            yield chunk
+
+
+def test_async_stream_that_loses_the_race_is_closed():
+    async def run():
+        gate = asyncio.Event()
+        primary, fallback = Gated("primary", gate), Gated("fallback", gate, opens=True)
+        llm = resilient(primary, fallback, hedge_after=0.01)
+        chunks = [chunk async for chunk in llm.astream("hi")]
+        await asyncio.sleep(0.05)  # let the loser's aclose() run
+        # Checked before asyncio.run() would finalize it anyway
+        return chunks, llm.stats(), primary.closed and fallback.closed
+
+    chunks, stats, both_closed = asyncio.run(run())
+    assert chunks[1] == "!" and chunks[0] in {"primary", "fallback"}
+    assert stats["hedged"] == 1
+    assert both_closed
+
+
+def test_fake_chat_model_lists_products_from_the_prompt():
+    model = FakeChatModel()
+    answer = model.invoke("Context:\nProduct Name: Navy Cardigan. \nProduct Name: Red Polo. \n")
+    assert answer.content == "- Navy Cardigan\n- Red Polo"
+    assert model.invoke("nothing here").content == model.not_found
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+from rag_common.model_cache import is_cached, use_offline_cache
+
+COMMIT = "c9745ed1d9f207416be6d2e6f8de32d1f16199bf"
+OTHER = "8b3219a92973c328a8e22fadcfa821b5dc75636a"
+
+
+def download(cache_dir, repo_id, commit, branch="main"):
+    # What the hub client leaves behind
+    repo_dir = cache_dir / ("models--" + repo_id.replace("/", "--"))
+    snapshot = repo_dir / "snapshots" / commit
+    snapshot.mkdir(parents=True)
+    (snapshot / "config.json").write_text("{}")
+    (repo_dir / "refs").mkdir(exist_ok=True)
+    (repo_dir / "refs" / branch).write_text(commit)
+
+
+def test_only_the_exact_repo_counts(tmp_path):
+    assert not is_cached(str(tmp_path / "missing"), "sentence-transformers/all-MiniLM-L6-v2")
+    download(tmp_path, "sentence-transformers/all-MiniLM-L6-v2", COMMIT)
+    assert is_cached(str(tmp_path), "sentence-transformers/all-MiniLM-L6-v2")
+    # A model whose name contains this one is a different model
+    assert not is_cached(str(tmp_path), "sentence-transformers/all-MiniLM-L6")
+    assert not is_cached(str(tmp_path), "other-org/all-MiniLM-L6-v2")
+
+
+def test_empty_snapshots_do_not_count(tmp_path):
+    (tmp_path / "models--org--model" / "snapshots" / COMMIT).mkdir(parents=True)
+    assert not is_cached(str(tmp_path), "org/model", COMMIT)
+
+
+def test_a_pinned_revision_needs_its_own_snapshot(tmp_path):
+    download(tmp_path, "org/model", OTHER)
+    assert not is_cached(str(tmp_path), "org/model", COMMIT)
+    download(tmp_path, "org/model", COMMIT, branch="v2")
+    assert is_cached(str(tmp_path), "org/model", COMMIT)
+    # Branches and tags resolve through refs/
+    assert is_cached(str(tmp_path), "org/model", "v2")
+    assert is_cached(str(tmp_path), "org/model", "main")
+    assert not is_cached(str(tmp_path), "org/model", "v3")
+
+
+@pytest.fixture
+def hub_env(monkeypatch):
+    for name in ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE"):
+        monkeypatch.delenv(name, raising=False)
+    # Switched off again for the rest of the session
+    constants = sys.modules.get("huggingface_hub.constants")
+    if constants is not None:
+        monkeypatch.setattr(constants, "HF_HUB_OFFLINE", constants.HF_HUB_OFFLINE)
+
+
+def test_auto_stays_online_until_the_pinned_revision_is_cached(tmp_path, hub_env):
+    download(tmp_path, "org/model", OTHER)
+    assert not use_offline_cache(str(tmp_path), "org/model", "auto", revision=COMMIT)
+    assert "HF_HUB_OFFLINE" not in os.environ
+    assert use_offline_cache(str(tmp_path), "org/model", "auto")
+    assert os.environ["HF_HUB_OFFLINE"] == os.environ["TRANSFORMERS_OFFLINE"] == "1"
+
+
+def test_explicit_modes_ignore_the_cache(tmp_path, hub_env):
+    assert not use_offline_cache(str(tmp_path), "org/model", "False")
+    assert use_offline_cache(str(tmp_path), "org/model", True)
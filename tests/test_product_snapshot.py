@@ -0,0 +1,84 @@
+from rag_common.product_snapshot import LiveVersion, ProductSnapshot
+
+
+class Table:
+    """
+    Product rows with a count of how each read was made.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.full_loads = 0
+        self.row_loads = []
+
+    def load(self, ids=None):
+        if ids is None:
+            self.full_loads += 1
+            return dict(self.rows)
+        self.row_loads.append(list(ids))
+        return {pid: self.rows[pid] for pid in ids if pid in self.rows}
+
+
+def live(price, stock=1):
+    return {"price": price, "stock": stock}
+
+
+def test_another_workers_save_rereads_only_that_row(tmp_path):
+    table = Table({1: live(10), 2: live(20)})
+    path = str(tmp_path / "live_version")
+    snapshot = ProductSnapshot(table.load, version=LiveVersion(path), load_rows=table.load)
+    assert snapshot.get(1) == live(10)
+
+    # The writer is another process: its own LiveVersion on the same file
+    table.rows[2] = live(25)
+    LiveVersion(path).bump([2])
+    assert snapshot.get(2) == live(25)
+    del table.rows[1]
+    LiveVersion(path).bump([1])
+    assert snapshot.get(1) is None
+    assert table.full_loads == 1
+    assert table.row_loads == [[2], [1]]
+
+
+def test_bump_without_ids_reloads_everything(tmp_path):
+    table = Table({1: live(10)})
+    version = LiveVersion(str(tmp_path / "live_version"))
+    snapshot = ProductSnapshot(table.load, version=version, load_rows=table.load)
+    snapshot.get(1)
+    table.rows[1] = live(5)
+    version.bump()
+    assert snapshot.get(1) == live(5)
+    assert table.full_loads == 2 and table.row_loads == []
+
+
+def test_reader_behind_the_log_reloads_everything(tmp_path):
+    path = str(tmp_path / "live_version")
+    table = Table({pid: live(pid) for pid in range(5)})
+    snapshot = ProductSnapshot(table.load, version=LiveVersion(path), load_rows=table.load)
+    snapshot.get(0)
+
+    writer = LiveVersion(path, keep=2)
+    for pid in range(4):
+        table.rows[pid] = live(pid + 100)
+        writer.bump([pid])
+    assert writer.changed_since(snapshot._loaded_version)[1] is None
+    assert [snapshot.get(pid)["price"] for pid in range(4)] == [100, 101, 102, 103]
+    assert table.full_loads == 2
+
+
+def test_changed_since_lists_each_id_once(tmp_path):
+    version = LiveVersion(str(tmp_path / "live_version"))
+    start = version.current()
+    version.bump([3])
+    version.bump([4, 3])
+    assert version.changed_since(start) == (version.current(), [3, 4])
+    assert version.changed_since(version.current()) == (version.current(), [])
+
+
+def test_plain_version_file_is_read_without_a_log(tmp_path):
+    path = tmp_path / "live_version"
+    path.write_text("42")
+    version = LiveVersion(str(path))
+    assert version.current() == 42
+    assert version.changed_since(41) == (42, None)
+    assert version.bump([1]) > 42
@@ -0,0 +1,68 @@
+import pytest
+
+from rag_common.product_snapshot import ProductSnapshot
+from rag_common.query_filters import parse_filters, build_where, filters_key
+
+GENDERS = ["Men", "Women", "Unisex"]
+CATEGORIES = ["Sweater", "Cardigan", "Inner", "Polo"]
+
+
+def parse(question):
+    return parse_filters(question, GENDERS, CATEGORIES)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("women's cardigans", {"gender": ["Women", "Unisex"], "category": "Cardigan"}),
+    ("unisex polo shirts", {"gender": ["Unisex"], "category": "Polo"}),
+    ("kardigan wanita", {"gender": ["Women", "Unisex"], "category": "Cardigan"}),
+    ("sweaters under $50", {"category": "Sweater", "max_price": 50.0}),
+    ("something over 20 and in stock", {"min_price": 20.0, "in_stock": True}),
+    ("between 20 and 40", {"min_price": 20.0, "max_price": 40.0}),
+    ("$40 - $20 polos", {"category": "Polo", "min_price": 20.0, "max_price": 40.0}),
+    ("di bawah 150rb", {"max_price": 150000.0}),
+    # A bare range is a size or quantity, not a price
+    ("sizes 2-3", {}),
+    # Both genders named: no gender constraint
+    ("for men and women", {}),
+    ("what do you sell?", {}),
+])
+def test_parse_filters(question, expected):
+    assert parse(question) == expected
+
+
+def test_filters_key_is_order_independent():
+    assert filters_key({"category": "Polo", "max_price": 5.0}) == filters_key({"max_price": 5.0, "category": "Polo"})
+    assert filters_key({}) is None
+
+
+@pytest.fixture
+def snapshot():
+    live = {1: {"price": 10, "stock": 0}, 2: {"price": 30, "stock": 5}, 3: {"price": 60, "stock": 2}}
+    return ProductSnapshot(lambda: live)
+
+
+def test_build_where_without_filters(snapshot):
+    assert build_where({}, snapshot) == (None, True)
+
+
+def test_build_where_single_clause(snapshot):
+    assert build_where({"category": "Polo"}, snapshot) == ({"category": "Polo"}, True)
+
+
+def test_build_where_combines_metadata_and_live_fields(snapshot):
+    where, has_candidates = build_where(parse("women's cardigans under $50 in stock"), snapshot)
+    assert has_candidates
+    assert where == {"$and": [
+        {"gender": {"$in": ["Women", "Unisex"]}},
+        {"category": "Cardigan"},
+        {"id": {"$in": [2]}},
+    ]}
+
+
+def test_build_where_price_range_inclusive(snapshot):
+    where, _ = build_where({"min_price": 10.0, "max_price": 30.0}, snapshot)
+    assert sorted(where["id"]["$in"]) == [1, 2]
+
+
+def test_build_where_reports_no_candidates(snapshot):
+    assert build_where({"max_price": 5.0}, snapshot) == (None, False)
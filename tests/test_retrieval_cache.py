@@ -0,0 +1,100 @@
+import os
+
+from langchain_core.documents import Document
+
+from rag_common.answer_cache import AnswerCache, normalize_question
+from rag_common.retrieval_cache import IndexVersion, RetrievalCache
+
+DOCS = [Document(page_content="Navy Cardigan", metadata={"id": 1})]
+
+
+def test_key_normalizes_question_and_where_order():
+    cache = RetrievalCache(IndexVersion(), normalize=normalize_question)
+    cache.put("Navy cardigans?", {"gender": "Women", "category": "Cardigan"}, 6, DOCS)
+    assert cache.get("navy   cardigans", {"category": "Cardigan", "gender": "Women"}, 6) == DOCS
+
+
+def test_key_includes_where_and_k():
+    cache = RetrievalCache(IndexVersion())
+    cache.put("cardigans", None, 6, DOCS)
+    assert cache.get("cardigans", None, 3) is None
+    assert cache.get("cardigans", {"category": "Cardigan"}, 6) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_returns_a_copy():
+    cache = RetrievalCache(IndexVersion())
+    cache.put("cardigans", None, 6, DOCS)
+    cache.get("cardigans", None, 6).clear()
+    assert cache.get("cardigans", None, 6) == DOCS
+
+
+def test_lru_eviction():
+    cache = RetrievalCache(IndexVersion(), max_size=2)
+    cache.put("a", None, 6, DOCS)
+    cache.put("b", None, 6, DOCS)
+    cache.get("a", None, 6)
+    cache.put("c", None, 6, DOCS)
+    assert cache.get("b", None, 6) is None
+    assert cache.get("a", None, 6) == DOCS
+
+
+def test_bump_invalidates():
+    version = IndexVersion()
+    cache = RetrievalCache(version)
+    cache.put("cardigans", None, 6, DOCS)
+    version.bump()
+    assert cache.get("cardigans", None, 6) is None
+
+
+def test_docs_from_an_older_index_are_not_stored():
+    version = IndexVersion()
+    cache = RetrievalCache(version)
+    built_at = version.bump()
+    # The chain that retrieved these is still serving while its replacement builds
+    version.bump()
+    cache.put("cardigans", None, 6, DOCS, version=built_at)
+    assert cache.get("cardigans", None, 6) is None
+    cache.put("cardigans", None, 6, DOCS, version=version.current())
+    assert cache.get("cardigans", None, 6) == DOCS
+
+
+def test_file_version_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "index_version")
+    # Two instances on one file stand in for two workers
+    mine, theirs = IndexVersion(path), IndexVersion(path)
+    cache = RetrievalCache(mine)
+    cache.put("cardigans", None, 6, DOCS)
+    assert cache.get("cardigans", None, 6) == DOCS
+
+    bumped = theirs.bump()
+    assert mine.current() == bumped
+    assert cache.get("cardigans", None, 6) is None
+
+
+def test_bump_moves_past_a_version_from_the_future(tmp_path):
+    path = tmp_path / "index_version"
+    path.write_text(str(2 ** 62))
+    assert IndexVersion(str(path)).bump() == 2 ** 62 + 1
+
+
+def test_missing_or_garbled_file_keeps_last_value(tmp_path):
+    path = str(tmp_path / "index_version")
+    version = IndexVersion(path)
+    assert version.current() == 0
+    value = version.bump()
+    with open(path, "w") as f:
+        f.write("not a number")
+    os.utime(path, ns=(1, 1))
+    assert version.current() == value
+
+
+def test_answer_cache_drops_entries_when_a_version_moves():
+    index, live = IndexVersion(), IndexVersion()
+    cache = AnswerCache(versions=(index, live))
+    cache.put("navy cardigans", {"answer": "x", "sources": [1]}, [1.0, 0.0])
+    assert cache.get_exact("Navy cardigans?") is not None
+
+    live.bump()
+    assert cache.get_exact("navy cardigans") is None
+    assert cache.get_similar([1.0, 0.0]) is None
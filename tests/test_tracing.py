@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from rag_common import tracing
+from rag_common.tracing import Tracer
+
+
+def outcomes(tracer):
+    return {outcome: count for (_, _, outcome), count in tracer._requests.items()}
+
+
+def test_request_records_stages_and_errors():
+    tracer = Tracer()
+    with tracer.request("a", "/chat", "hi") as trace:
+        with tracing.stage("embed"):
+            pass
+    with pytest.raises(ValueError):
+        with tracer.request("b", "/chat", "hi"):
+            raise ValueError("llm down")
+    assert set(trace.stages) == {"embed", "total"}
+    assert outcomes(tracer) == {"ok": 1, "error": 1}
+    assert tracer.slowest(5)[0]["request_id"] in {"a", "b"}
+    assert tracing.current() is None
+
+
+def test_cancelled_request_is_finished_as_cancelled():
+    tracer = Tracer()
+    started = asyncio.Event()
+
+    async def handler():
+        with tracer.request("a", "/chat", "hi"):
+            started.set()
+            await asyncio.sleep(10)
+
+    async def disconnect():
+        task = asyncio.create_task(handler())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(disconnect())
+    assert outcomes(tracer) == {"cancelled": 1}
+    assert tracer.slowest(1)[0]["cancelled"] is True
+    assert 'outcome="cancelled"} 1' in tracer.prometheus()
+
+
+def test_stream_closed_early_is_finished_as_cancelled():
+    tracer = Tracer()
+
+    def events():
+        with tracer.request("a", "/chat/stream", "hi"):
+            for token in ["a", "b", "c"]:
+                yield token
+
+    stream = events()
+    assert next(stream) == "a"
+    stream.close()  # what the server does when the client goes away
+    assert outcomes(tracer) == {"cancelled": 1}
+    assert "total" in tracer._recent[0].stages